@@ -0,0 +1,268 @@
+# /attachments/app/core/blob_store.py
+# Armazenamento de anexos endereçado por conteúdo (SHA-256).
+# O arquivo físico fica uma única vez em <blobs>/ab/<sha256>; cada anexo de OS
+# (/files/{os_id}/{att_id}.ext) é um hardlink para ele, então a mesma foto em
+# várias OS ocupa espaço uma vez só e as URLs continuam as mesmas.
+#
+# <blobs> fica FORA da raiz servida em /files (senão os blobs seriam
+# listáveis pelo hash): LOOPOS_BLOBS_DIR ou, por padrão, a pasta irmã
+# "<raiz>_blobs" (mesmo sistema de arquivos, para o hardlink funcionar).
+#
+#   <blobs>/ab/<sha256>           conteúdo
+#   <blobs>/ab/<sha256>.refs      quantos anexos apontam para ele
+#   <blobs>/refs/{os_id}/{nome}   sha256 de cada anexo (gravado no upload)
+#
+# Sem suporte a hardlink, o anexo não é copiado: só a referência existe e
+# AttachmentFiles (o mount de /files) serve o blob no lugar dele.
+#
+# Funções síncronas: devem rodar fora do event loop (run_in_threadpool).
+
+import hashlib
+import os
+import shutil
+import uuid
+from pathlib import Path
+from typing import BinaryIO, List, Optional
+
+from starlette.staticfiles import StaticFiles
+
+from app.core.log import get_logger
+from app.core.storage import locked
+
+BLOBS_DIRNAME = "_blobs"
+REFS_DIRNAME = "refs"
+_CHUNK = 1024 * 1024
+
+log = get_logger("blobs")
+
+
+def _link_lock():
+    # Serializa link/remoção entre threads E workers: sem isso um release() em
+    # outro processo apaga o blob entre o exists() e o os.link() deste upload
+    return locked(BLOBS_DIRNAME)
+
+
+def blobs_dir(root: Path) -> Path:
+    """Diretório dos blobs para a raiz de anexos root (fora dela)"""
+    configured = os.getenv("LOOPOS_BLOBS_DIR")
+    if configured:
+        return Path(configured)
+    return root.parent / f"{root.name}{BLOBS_DIRNAME}"
+
+
+def blob_path(root: Path, digest: str) -> Path:
+    return blobs_dir(root) / digest[:2] / digest
+
+
+def _ref_path(root: Path, path: Path) -> Path:
+    return blobs_dir(root) / REFS_DIRNAME / path.relative_to(root)
+
+
+def _counter(blob: Path) -> Path:
+    return blob.with_name(f"{blob.name}.refs")
+
+
+def _refcount(blob: Path) -> int:
+    """Anexos que apontam para blob (blobs antigos, sem contador: hardlinks além dele)"""
+    try:
+        return int(_counter(blob).read_text())
+    except (FileNotFoundError, ValueError):
+        pass
+    try:
+        return blob.stat().st_nlink - 1
+    except FileNotFoundError:
+        return 0
+
+
+def _set_refcount(blob: Path, count: int):
+    counter = _counter(blob)
+    tmp = counter.with_name(f".{uuid.uuid4().hex}.tmp")
+    tmp.write_text(str(count))
+    tmp.replace(counter)
+
+
+def _read_ref(ref: Path) -> Optional[str]:
+    try:
+        return ref.read_text().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def save_upload(root: Path, src: BinaryIO, dest: Path) -> str:
+    """
+    Grava o stream como anexo em dest, deduplicando pelo SHA-256; retorna o hash.
+
+    O conteúdo vai primeiro para um temporário (hash calculado durante a cópia);
+    se o blob já existir o temporário é descartado. dest vira um hardlink para o
+    blob (ou só a referência, se o sistema de arquivos não suportar hardlinks).
+    """
+    tmp_dir = blobs_dir(root) / "tmp"
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    tmp = tmp_dir / uuid.uuid4().hex
+    h = hashlib.sha256()
+    try:
+        with open(tmp, "wb") as out:
+            while True:
+                chunk = src.read(_CHUNK)
+                if not chunk:
+                    break
+                h.update(chunk)
+                out.write(chunk)
+        digest = h.hexdigest()
+        blob = blob_path(root, digest)
+        ref = _ref_path(root, dest)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        ref.parent.mkdir(parents=True, exist_ok=True)
+        with _link_lock():
+            if not blob.exists():
+                blob.parent.mkdir(parents=True, exist_ok=True)
+                tmp.replace(blob)
+            count = _refcount(blob)
+            try:
+                os.link(blob, dest)
+            except FileNotFoundError:
+                # Blob sumiu por fora do lock: o temporário ainda tem o conteúdo
+                tmp.replace(blob)
+                os.link(blob, dest)
+            except OSError:
+                pass  # sem hardlink: /files serve o blob pela referência
+            ref.write_text(digest)
+            _set_refcount(blob, count + 1)
+        return digest
+    finally:
+        # Só descartado depois que dest já aponta para o conteúdo
+        try:
+            tmp.unlink()
+        except OSError:
+            pass
+
+
+def _file_digest(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(_CHUNK)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def release(root: Path, path: Path):
+    """Remove um anexo publicado e o blob, se nenhum outro anexo apontar para ele"""
+    ref = _ref_path(root, path)
+    digest = _read_ref(ref)
+    if digest is None:
+        # Anexo gravado antes das referências: nunca entrou no contador de
+        # nenhum blob (mesmo com o mesmo conteúdo), então só sai o arquivo
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+        return
+    blob = blob_path(root, digest)
+    with _link_lock():
+        count = _refcount(blob)
+        for p in (path, ref):
+            try:
+                p.unlink()
+            except FileNotFoundError:
+                pass
+        if count <= 1:
+            for p in (blob, _counter(blob)):
+                try:
+                    p.unlink()
+                except FileNotFoundError:
+                    pass
+        else:
+            _set_refcount(blob, count - 1)
+
+
+def resolve(root: Path, relative: str) -> Optional[Path]:
+    """Blob de um anexo publicado só por referência (None se não houver)"""
+    refs = blobs_dir(root) / REFS_DIRNAME
+    ref = Path(os.path.normpath(refs / relative))
+    if os.path.commonpath([ref, refs]) != str(refs):
+        return None
+    digest = _read_ref(ref)
+    return blob_path(root, digest) if digest else None
+
+
+def attachment_names(root: Path, os_id: str, att_id: str) -> List[str]:
+    """Nomes de arquivo do anexo (com hardlink em root/{os_id} ou só referência)"""
+    names = {p.name for p in (root / os_id).glob(f"{att_id}.*")}
+    names |= {p.name for p in (blobs_dir(root) / REFS_DIRNAME / os_id).glob(f"{att_id}.*")}
+    return sorted(names)
+
+
+def find_attachment(root: Path, os_id: str, att_id: str) -> Optional[Path]:
+    """Caminho com o conteúdo do anexo (o próprio arquivo ou o blob referenciado)"""
+    for name in attachment_names(root, os_id, att_id):
+        path = root / os_id / name
+        if path.exists():
+            return path
+        blob = resolve(root, f"{os_id}/{name}")
+        if blob is not None and blob.exists():
+            return blob
+    return None
+
+
+def _write_legacy_refs(root: Path, old: Path):
+    # Anexos da versão anterior são hardlinks sem referência: grava a referência
+    # (pelo inode, sem reler o conteúdo) para que release() desconte o blob
+    digests = {}
+    for blob in old.glob("??/*"):
+        if blob.is_file() and not blob.name.endswith(".refs"):
+            digests[blob.stat().st_ino] = blob.name
+    if not digests:
+        return
+    for path in root.rglob("*"):
+        if old in path.parents or not path.is_file():
+            continue
+        digest = digests.get(path.stat().st_ino)
+        ref = _ref_path(root, path)
+        if digest and not ref.exists():
+            ref.parent.mkdir(parents=True, exist_ok=True)
+            ref.write_text(digest)
+
+
+def migrate_legacy(root: Path):
+    """Move <raiz>/_blobs (versão anterior, dentro de /files) para blobs_dir(root)"""
+    old = root / BLOBS_DIRNAME
+    if not old.is_dir():
+        return
+    new = blobs_dir(root)
+    with _link_lock():
+        if not old.is_dir():
+            return
+        _write_legacy_refs(root, old)
+        if not new.exists():
+            new.parent.mkdir(parents=True, exist_ok=True)
+            shutil.move(str(old), str(new))
+        else:
+            for f in old.rglob("*"):
+                target = new / f.relative_to(old)
+                if f.is_file() and not target.exists():
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    shutil.move(str(f), str(target))
+            shutil.rmtree(old, ignore_errors=True)
+    log.info("blobs movidos para fora de /files", extra={"from": str(old), "to": str(new)})
+
+
+class AttachmentFiles(StaticFiles):
+    """/files: arquivos da raiz de anexos e, sem hardlink, o blob referenciado"""
+
+    def __init__(self, *, directory: Path, **kwargs):
+        super().__init__(directory=directory, **kwargs)
+        self.root = Path(directory)
+
+    def lookup_path(self, path: str):
+        full_path, stat_result = super().lookup_path(path)
+        if stat_result is None and not path.startswith(("/", "\\")):
+            blob = resolve(self.root, path)
+            if blob is not None:
+                try:
+                    return str(blob), os.stat(blob)
+                except FileNotFoundError:
+                    pass
+        return full_path, stat_result
@@ -0,0 +1,345 @@
+# /attachments/app/core/changes.py
+# Sequência global de mudanças para sync incremental (/api/changes).
+# Cada escrita em users, plants, os ou assignments registra (seq, tipo, id, op)
+# em data/changes.journal (uma linha JSON por mudança). Em memória fica só a
+# última mudança de cada registro, na ordem de seq, então "o que mudou desde
+# N" custa O(mudanças) e não O(base).
+#
+# A compactação regrava o arquivo com uma linha por registro e descarta as
+# tombstones (remoções) mais antigas além de LOOPOS_CHANGES_TOMBSTONES
+# (padrão 10000); clientes com `since` anterior ao descartado recebem reset.
+# A tombstone de usuários e OS guarda os campos do registro apagado que o RBAC
+# usa ("before"), para /api/changes só devolver a remoção a quem podia vê-lo.
+#
+# Vários workers compartilham o arquivo: record() trava data/.locks/
+# changes.journal.lock, lê o que os outros anexaram (a seq é global) e só
+# então numera as suas mudanças. Leituras conferem por stat se o arquivo
+# cresceu; mudanças de outros workers são publicadas no hub local (com os
+# registros obtidos pelos loaders de register_loader) e avisadas a quem se
+# registrou em on_external_change (caches locais, ex.: diretório de usuários);
+# watch() faz essa checagem periódica enquanto houver conexões SSE/WebSocket
+# ou callbacks registrados.
+
+import asyncio
+import json
+import os
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from app.core import events, metrics
+from app.core.log import get_logger
+from app.core.storage import data_path, locked
+
+log = get_logger("changes")
+
+KINDS = ("users", "plants", "os", "assignments")
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return max(1, int(os.getenv(name, default)))
+    except ValueError:
+        return default
+
+
+# tipo -> função(ids) -> {id: registro no formato da API}, para publicar
+# mudanças feitas por outros workers (registrado por os_api e routes/plants)
+_LOADERS: Dict[str, Callable[[List[str]], Dict[str, dict]]] = {}
+
+# tipo -> funções(ids) chamadas quando outro worker grava registros desse tipo
+# (put ou delete), antes dos loaders; ex.: invalidar um cache local
+_EXTERNAL_CALLBACKS: Dict[str, List[Callable[[List[str]], None]]] = {}
+
+# Campos do registro apagado guardados na tombstone (os que app/core/rbac.py usa)
+_TOMBSTONE_FIELDS = {
+    "users": ("role", "plantIds"),
+    "os": ("plantId", "technicianId", "supervisorId"),
+}
+
+
+def _tombstone_before(kind: str, record: Optional[dict]) -> Optional[dict]:
+    fields = _TOMBSTONE_FIELDS.get(kind)
+    if not fields or not record:
+        return None
+    return {f: record.get(f) for f in fields}
+
+
+class ChangeLog:
+    def __init__(self, name: str = "changes.journal", max_tombstones: Optional[int] = None):
+        self.name = name
+        self.path = data_path(name)
+        self.max_tombstones = max_tombstones or _env_int("LOOPOS_CHANGES_TOMBSTONES", 10000)
+        self._reset()
+        self._lock = threading.Lock()
+
+    def _reset(self):
+        self._latest: Dict[Tuple[str, str], Tuple[int, str]] = {}  # (tipo, id) -> (seq, op), em ordem de seq
+        self._before: Dict[Tuple[str, str], dict] = {}  # tombstones: campos do registro apagado
+        self._seq = 0
+        self._floor = 0       # maior seq de tombstone já descartada
+        self._tombstones = 0
+        self._lines = 0       # linhas no arquivo (para decidir a compactação)
+        self._ino = None      # inode do arquivo lido até _offset
+        self._offset = 0
+        self._loaded = False
+
+    # ---------- carga ----------
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_ino, st.st_size
+
+    def _ensure_loaded(self):
+        if self._loaded and self._stat() == (self._ino, self._offset):
+            return
+        with self._lock, locked(self.name):
+            external = self._refresh()
+        self._publish_external(external)
+
+    def _refresh(self) -> List[Tuple[int, str, str, str]]:
+        """
+        Lê o que ainda não foi lido do arquivo (tudo, se ele foi recriado pela
+        compactação de outro processo). Chamar com os dois locks. Retorna as
+        mudanças novas de outros processos: (seq, tipo, id, op).
+        """
+        st = self._stat()
+        if st is None:
+            if not self._loaded:
+                self.path.touch()
+                st = self._stat()
+            else:
+                return []
+        # Só o que vier depois desta seq é novidade (None: carga inicial)
+        after = self._seq if self._loaded else None
+        if self._loaded and (st[0] != self._ino or st[1] < self._offset):
+            # Compactado por outro worker: relê o arquivo inteiro
+            self._reset()
+        new: List[Tuple[int, str, str, str]] = []
+        with self.path.open("rb") as f:
+            f.seek(self._offset)
+            good = self._offset
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break
+                try:
+                    e = json.loads(raw)
+                except ValueError:
+                    break
+                good += len(raw)
+                self._lines += 1
+                if "floor" in e:
+                    self._floor = max(self._floor, e["floor"])
+                else:
+                    self._remember(e["seq"], e["kind"], e["id"], e["op"], e.get("before"))
+                    if after is not None and e["seq"] > after:
+                        new.append((e["seq"], e["kind"], e["id"], e["op"]))
+            size = f.seek(0, os.SEEK_END)
+        if good < size:
+            # Última linha incompleta (queda no meio da escrita; com o lock
+            # entre processos, ninguém está escrevendo agora)
+            with self.path.open("r+b") as f:
+                f.truncate(good)
+        self._ino, self._offset = self._stat()[0], good
+        self._seq = max(self._seq, self._floor)
+        self._loaded = True
+        return new
+
+    def _publish_external(self, external: List[Tuple[int, str, str, str]]):
+        # Fora dos locks: os loaders leem os stores (que têm locks próprios)
+        touched: Dict[str, List[str]] = {}
+        by_kind: Dict[str, List[str]] = {}
+        for _, kind, item_id, op in external:
+            touched.setdefault(kind, []).append(item_id)
+            if op == "put":
+                by_kind.setdefault(kind, []).append(item_id)
+        for kind, ids in touched.items():
+            for callback in _EXTERNAL_CALLBACKS.get(kind, ()):
+                try:
+                    callback(ids)
+                except Exception:
+                    log.exception("erro ao avisar mudança de outro worker", extra={"kind": kind})
+        data: Dict[str, Dict[str, dict]] = {}
+        for kind, ids in by_kind.items():
+            loader = _LOADERS.get(kind)
+            if loader is not None:
+                try:
+                    data[kind] = loader(ids)
+                except Exception:
+                    log.exception("erro ao carregar registros de outro worker", extra={"kind": kind})
+        for seq, kind, item_id, op in external:
+            events.publish(kind, item_id, op, seq, data.get(kind, {}).get(item_id))
+
+    def refresh(self):
+        """Lê e publica as mudanças gravadas por outros processos"""
+        self._ensure_loaded()
+
+    def _remember(self, seq: int, kind: str, item_id: str, op: str, before: Optional[dict] = None):
+        key = (kind, item_id)
+        old = self._latest.pop(key, None)
+        if old is not None and old[1] == "delete":
+            self._tombstones -= 1
+        self._latest[key] = (seq, op)
+        if op == "delete":
+            self._tombstones += 1
+        if before is not None:
+            self._before[key] = before
+        else:
+            self._before.pop(key, None)
+        self._seq = max(self._seq, seq)
+
+    # ---------- escrita ----------
+
+    def record(self, kind: str, ids: Iterable[str], op: str = "put", data: Optional[Dict[str, dict]] = None) -> int:
+        """
+        Registra mudanças (op "put" ou "delete") e retorna a seq atual.
+
+        `data` (id -> registro no formato da API) segue junto nos eventos
+        publicados em app/core/events.py; numa remoção é o registro apagado e
+        só decide quem recebe a tombstone.
+        """
+        assert kind in KINDS and op in ("put", "delete"), (kind, op)
+        published = []
+        with self._lock, locked(self.name):
+            external = self._refresh()
+            lines = []
+            for item_id in ids:
+                before = _tombstone_before(kind, (data or {}).get(item_id)) if op == "delete" else None
+                self._remember(self._seq + 1, kind, item_id, op, before)
+                published.append((item_id, self._seq))
+                lines.append(self._line(self._seq, kind, item_id, op))
+            if lines:
+                with self.path.open("ab") as f:
+                    f.write(("\n".join(lines) + "\n").encode("utf-8"))
+                    f.flush()
+                    os.fsync(f.fileno())
+                    self._offset = f.tell()
+                self._lines += len(lines)
+                if self._lines > 2 * len(self._latest) + 1000:
+                    self._compact()
+            seq = self._seq
+        self._publish_external(external)
+        for item_id, item_seq in published:
+            events.publish(kind, item_id, op, item_seq, (data or {}).get(item_id))
+        return seq
+
+    def _line(self, seq: int, kind: str, item_id: str, op: str) -> str:
+        entry = {"seq": seq, "kind": kind, "id": item_id, "op": op}
+        before = self._before.get((kind, item_id))
+        if before is not None:
+            entry["before"] = before
+        return json.dumps(entry, ensure_ascii=False, separators=(",", ":"))
+
+    def _compact(self):
+        """Regrava o log com a última mudança de cada registro (chamar com o lock)"""
+        excess = self._tombstones - self.max_tombstones
+        if excess > 0:
+            for key, (seq, op) in list(self._latest.items()):
+                if excess == 0:
+                    break
+                if op == "delete":
+                    del self._latest[key]
+                    self._before.pop(key, None)
+                    self._floor = max(self._floor, seq)
+                    self._tombstones -= 1
+                    excess -= 1
+
+        out = [json.dumps({"floor": self._floor})]
+        out += [self._line(seq, kind, item_id, op) for (kind, item_id), (seq, op) in self._latest.items()]
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        with tmp.open("wb") as f:
+            f.write(("\n".join(out) + "\n").encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self._lines = len(out)
+        self._ino, self._offset = self._stat()
+
+
+    # ---------- leitura ----------
+
+    def current(self) -> int:
+        self._ensure_loaded()
+        return self._seq
+
+    def since(self, seq: Optional[int]) -> Tuple[int, bool, Dict[str, Dict[str, str]]]:
+        """
+        Mudanças posteriores a `seq`: (seq atual, reset, {tipo: {id: op}}).
+
+        reset=True quando `seq` é ausente, anterior a tombstones já
+        descartadas ou posterior à seq atual (log recriado): o cliente deve
+        recarregar tudo.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            current = self._seq
+            if seq is None or seq < self._floor or seq > current:
+                return current, True, {}
+            changed: Dict[str, Dict[str, str]] = {k: {} for k in KINDS}
+            for (kind, item_id) in reversed(self._latest):
+                entry_seq, op = self._latest[(kind, item_id)]
+                if entry_seq <= seq:
+                    break
+                changed[kind][item_id] = op
+            return current, False, changed
+
+    def deleted_records(self, kind: str, ids: Iterable[str]) -> Dict[str, dict]:
+        """Campos guardados nas tombstones de `kind` (só os ids que têm)"""
+        self._ensure_loaded()
+        with self._lock:
+            return {i: self._before[(kind, i)] for i in ids if (kind, i) in self._before}
+
+
+_log = ChangeLog()
+
+metrics.collector(
+    "loopos_change_seq", "Última seq da sequência global de mudanças",
+    lambda: {(): _log.current()},
+)
+
+
+def register_loader(kind: str, loader: Callable[[List[str]], Dict[str, dict]]):
+    """Como obter os registros de `kind` para eventos de mudanças de outros workers"""
+    _LOADERS[kind] = loader
+
+
+def on_external_change(kind: str, callback: Callable[[List[str]], None]):
+    """Chama callback(ids) quando outro worker gravar registros de `kind`"""
+    _EXTERNAL_CALLBACKS.setdefault(kind, []).append(callback)
+
+
+async def watch(interval: Optional[float] = None):
+    """
+    Loop (task do lifespan) que publica mudanças de outros workers enquanto
+    houver conexões SSE/WebSocket ou callbacks de on_external_change. Com um
+    só processo, é só um stat por volta.
+    """
+    if interval is None:
+        interval = _env_int("LOOPOS_CHANGES_POLL_MS", 500) / 1000
+    while True:
+        await asyncio.sleep(interval)
+        if events.hub.subscriber_count() or _EXTERNAL_CALLBACKS:
+            try:
+                await run_in_threadpool(_log.refresh)
+            except Exception:
+                log.exception("erro ao acompanhar changes.journal")
+
+
+def record(kind: str, ids: Iterable[str], op: str = "put", data: Optional[Dict[str, dict]] = None) -> int:
+    return _log.record(kind, ids, op, data)
+
+
+def current_seq() -> int:
+    return _log.current()
+
+
+def changes_since(seq: Optional[int]) -> Tuple[int, bool, Dict[str, Dict[str, str]]]:
+    return _log.since(seq)
+
+
+def deleted_records(kind: str, ids: Iterable[str]) -> Dict[str, dict]:
+    return _log.deleted_records(kind, ids)
@@ -0,0 +1,233 @@
+# /attachments/app/core/compression.py
+# Compressão das respostas (gzip e, se instalado, brotli) para quem acessa
+# por 3G/4G nas usinas.
+#
+#   LOOPOS_COMPRESSION          codificações aceitas, em ordem de preferência
+#                               (padrão "br,gzip"; "off" desliga)
+#   LOOPOS_COMPRESS_MIN_BYTES   corpo mínimo para comprimir (padrão 1024)
+#   LOOPOS_GZIP_LEVEL           1-9 (padrão 6)
+#   LOOPOS_BROTLI_QUALITY       0-11 (padrão 5)
+#   LOOPOS_COMPRESS_CACHE_MB    cache de corpos já comprimidos (padrão 32; 0 desliga)
+#
+# O cache é endereçado pelo conteúdo (hash do corpo + codificação): listagens
+# repetidas com os mesmos dados reaproveitam o corpo comprimido em vez de
+# comprimir de novo. Usar o hash, e não a sequência de mudanças, mantém o
+# cache correto mesmo quando os dados mudam por fora (usuários no Supabase).
+#
+# Só respostas completas (um único http.response.body) de tipos textuais são
+# comprimidas; streams (SSE, arquivos) e imagens passam direto. Também passam
+# direto respostas que não são 200 (304, 206, erros) e as com Content-Range:
+# o intervalo se refere ao corpo original. Um ETag forte vira fraco (W/) no
+# corpo comprimido, que não é byte a byte o mesmo representado por ele.
+
+import gzip
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from app.core import metrics
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - depende do ambiente
+    brotli = None
+
+_COMPRESSIBLE = ("application/json", "text/", "application/javascript", "application/xml", "image/svg+xml")
+
+# Corpos maiores que isso são comprimidos no threadpool (não travam o event loop)
+_THREADPOOL_BYTES = 256 * 1024
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def _encodings() -> Tuple[str, ...]:
+    raw = os.getenv("LOOPOS_COMPRESSION", "br,gzip").strip().lower()
+    if raw in ("", "off", "0", "none"):
+        return ()
+    names = [n.strip() for n in raw.split(",") if n.strip()]
+    return tuple(n for n in names if n == "gzip" or (n == "br" and brotli is not None))
+
+
+def _choose(accept: str, enabled: Tuple[str, ...]) -> Optional[str]:
+    """Codificação a usar segundo o Accept-Encoding do cliente (None = sem compressão)"""
+    weights = {}
+    for part in accept.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if token:
+            weights[token] = q
+    best, best_q = None, 0.0
+    for enc in enabled:
+        q = weights.get(enc, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = enc, q
+    return best
+
+
+class _CompressedCache:
+    """LRU limitado por bytes: (hash do corpo, codificação) -> corpo comprimido"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._items: "OrderedDict[Tuple[bytes, str], bytes]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "bytes_in": 0, "bytes_out": 0}
+
+    def get(self, key) -> Optional[bytes]:
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+                self.stats["hits"] += 1
+            else:
+                self.stats["misses"] += 1
+            return value
+
+    def put(self, key, value: bytes):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._items[key] = value
+            self._size += len(value)
+            while self._size > self.max_bytes:
+                _, dropped = self._items.popitem(last=False)
+                self._size -= len(dropped)
+
+    def count(self, bytes_in: int, bytes_out: int):
+        with self._lock:
+            self.stats["bytes_in"] += bytes_in
+            self.stats["bytes_out"] += bytes_out
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {**self.stats, "entries": len(self._items), "bytes_cached": self._size}
+
+
+_cache = _CompressedCache(_env_int("LOOPOS_COMPRESS_CACHE_MB", 32) * 1024 * 1024)
+
+metrics.collector(
+    "loopos_compression",
+    "Compressão de respostas (hits/misses do cache, bytes antes/depois, entradas)",
+    lambda: {(k,): v for k, v in _cache.snapshot().items()},
+    labels=("stat",),
+)
+
+
+def _compress(body: bytes, encoding: str, gzip_level: int, br_quality: int) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=br_quality)
+    return gzip.compress(body, compresslevel=gzip_level, mtime=0)
+
+
+def _weak_etag(value: bytes) -> bytes:
+    return value if value.startswith(b"W/") else b"W/" + value
+
+
+class CompressionMiddleware:
+    """Middleware ASGI: comprime respostas completas acima do tamanho mínimo"""
+
+    def __init__(self, app):
+        self.app = app
+        self.encodings = _encodings()
+        self.min_bytes = _env_int("LOOPOS_COMPRESS_MIN_BYTES", 1024)
+        self.gzip_level = _env_int("LOOPOS_GZIP_LEVEL", 6)
+        self.br_quality = _env_int("LOOPOS_BROTLI_QUALITY", 5)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.encodings:
+            return await self.app(scope, receive, send)
+        accept = ""
+        for name, value in scope.get("headers", ()):
+            if name == b"accept-encoding":
+                accept = value.decode("latin-1")
+                break
+        encoding = _choose(accept, self.encodings) if accept else None
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        start = None      # http.response.start retido até sabermos o corpo
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start, passthrough
+            if passthrough:
+                return await send(message)
+            if message["type"] == "http.response.start":
+                headers = message.get("headers", [])
+                ctype = b""
+                passthrough = message.get("status", 200) != 200
+                for name, value in headers:
+                    if name == b"content-type":
+                        ctype = value
+                    elif name in (b"content-encoding", b"content-range"):
+                        passthrough = True
+                ctype = ctype.decode("latin-1").lower()
+                if not ctype.startswith(_COMPRESSIBLE) or ctype.startswith("text/event-stream"):
+                    passthrough = True
+                if passthrough:
+                    return await send(message)
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                return await send(message)
+
+            body = message.get("body", b"")
+            if message.get("more_body", False) or len(body) < self.min_bytes:
+                # Stream ou corpo pequeno: segue sem compressão
+                passthrough = True
+                await send(self._with_vary(start))
+                return await send(message)
+
+            key = (hashlib.blake2b(body, digest_size=16).digest(), encoding)
+            compressed = _cache.get(key)
+            if compressed is None:
+                if len(body) > _THREADPOOL_BYTES:
+                    compressed = await run_in_threadpool(_compress, body, encoding, self.gzip_level, self.br_quality)
+                else:
+                    compressed = _compress(body, encoding, self.gzip_level, self.br_quality)
+                _cache.put(key, compressed)
+            _cache.count(len(body), len(compressed))
+
+            headers = [
+                (n, _weak_etag(v) if n == b"etag" else v)
+                for n, v in start.get("headers", []) if n != b"content-length"
+            ]
+            headers += [
+                (b"content-encoding", encoding.encode()),
+                (b"content-length", str(len(compressed)).encode()),
+            ]
+            await send(self._with_vary({**start, "headers": headers}))
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
+
+    @staticmethod
+    def _with_vary(start: dict) -> dict:
+        headers = list(start.get("headers", []))
+        for i, (name, value) in enumerate(headers):
+            if name == b"vary":
+                if b"accept-encoding" not in value.lower():
+                    headers[i] = (name, value + b", Accept-Encoding")
+                return {**start, "headers": headers}
+        headers.append((b"vary", b"Accept-Encoding"))
+        return {**start, "headers": headers}
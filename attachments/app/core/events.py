@@ -0,0 +1,158 @@
+# /attachments/app/core/events.py
+# Hub pub/sub em processo para empurrar mudanças aos clientes (SSE/WebSocket).
+# changes.record publica um evento por registro alterado; cada conexão tem uma
+# fila limitada (LOOPOS_EVENTS_QUEUE, padrão 100) e só recebe o que o seu ator
+# pode ver (regras de app/core/rbac.py).
+#
+# Sem o registro não há como aplicar o RBAC: o evento só vai para Admin
+# (falha fechada). Tombstones de OS/usuários vão para quem já recebeu aquele id
+# nesta conexão, ou para quem podia ver o registro removido (`data` passado ao
+# record de uma remoção serve só para esse filtro; o cliente recebe só o id).
+#
+# Backpressure: se a fila de um cliente lento enche, os eventos pendentes são
+# descartados e ele recebe um único {"type": "resync", "since": <seq>} — basta
+# chamar GET /api/changes?since=<seq> para se atualizar. Novos eventos voltam a
+# ser entregues depois que o resync é consumido.
+
+import asyncio
+import os
+import threading
+from typing import Dict, Optional, Set
+
+from app.core import metrics
+from app.core.rbac import can_view_os, can_view_plant, can_view_user
+
+
+def _queue_size() -> int:
+    try:
+        return max(1, int(os.getenv("LOOPOS_EVENTS_QUEUE", "100")))
+    except ValueError:
+        return 100
+
+
+def _can_view(actor: Dict, kind: str, record: dict) -> bool:
+    if kind == "os":
+        return can_view_os(actor, record)
+    if kind == "users":
+        return can_view_user(actor, record)
+    return False
+
+
+def _visible(actor: Dict, event: dict, known: Set[str], before: Optional[dict] = None) -> bool:
+    kind, data = event["kind"], event.get("data")
+    if kind in ("plants", "assignments"):
+        return can_view_plant(actor, event["id"])  # o id é o da usina, com ou sem registro
+    if actor.get("role") == "Admin":
+        return True
+    if event["op"] == "delete":
+        return event["id"] in known or (before is not None and _can_view(actor, kind, before))
+    if data is None:
+        return False
+    return _can_view(actor, kind, data)
+
+
+def can_view_tombstone(actor: Dict, kind: str, item_id: str, before: Optional[dict] = None) -> bool:
+    """Mesma regra das tombstones do stream, sem histórico de conexão (ex.: /api/changes)"""
+    known = {actor.get("id")} if kind == "users" else set()
+    record = {**before, "id": item_id} if before is not None else None
+    return _visible(actor, {"kind": kind, "id": item_id, "op": "delete"}, known, record)
+
+
+class Subscriber:
+    def __init__(self, actor: Dict, maxsize: int):
+        self.actor = actor
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.loop = asyncio.get_running_loop()
+        self.delivered_seq = 0   # seq do último evento entregue ao cliente
+        self.overflowed = False  # resync pendente: descarta eventos até ser consumido
+        self.dropped = 0
+        # tipo -> ids de OS/usuários entregues (filtro das tombstones); o próprio ator sempre
+        self.known: Dict[str, Set[str]] = {"users": {actor.get("id")}}
+
+    async def get(self) -> dict:
+        event = await self.queue.get()
+        if event.get("type") == "resync":
+            self.overflowed = False
+        else:
+            self.delivered_seq = event["seq"]
+        return event
+
+
+class EventHub:
+    def __init__(self, queue_size: Optional[int] = None):
+        self.queue_size = queue_size or _queue_size()
+        self._subs: Set[Subscriber] = set()
+        self._lock = threading.Lock()
+        self.published = 0
+
+    def subscribe(self, actor: Dict) -> Subscriber:
+        """Registra uma conexão (chamar de dentro do event loop que vai consumir)"""
+        sub = Subscriber(actor, self.queue_size)
+        with self._lock:
+            self._subs.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber):
+        with self._lock:
+            self._subs.discard(sub)
+
+    def subscriber_count(self) -> int:
+        return len(self._subs)
+
+    def publish(self, event: dict, before: Optional[dict] = None):
+        """Distribui um evento; pode ser chamado de qualquer thread"""
+        with self._lock:
+            subs = list(self._subs)
+        self.published += 1
+        for sub in subs:
+            try:
+                sub.loop.call_soon_threadsafe(self._offer, sub, event, before)
+            except RuntimeError:
+                # Loop já fechado (conexão encerrada no shutdown)
+                self.unsubscribe(sub)
+
+    def _offer(self, sub: Subscriber, event: dict, before: Optional[dict] = None):
+        # Roda no event loop do assinante
+        kind, item_id = event["kind"], event["id"]
+        if kind == "users" and item_id == sub.actor.get("id") and event.get("data"):
+            # Mudança no próprio ator (papel, usinas): atualiza o filtro da conexão
+            sub.actor = {**sub.actor, **event["data"]}
+        known = sub.known.setdefault(kind, set())
+        visible = _visible(sub.actor, event, known, before)
+        if event["op"] == "put" and visible:
+            known.add(item_id)
+        elif event["op"] == "delete" or event.get("data") is not None:
+            known.discard(item_id)  # removido ou saiu da visão (sem registro não se sabe)
+        if sub.overflowed or not visible:
+            if sub.overflowed:
+                sub.dropped += 1
+            return
+        try:
+            sub.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            dropped = sub.queue.qsize() + 1
+            while not sub.queue.empty():
+                sub.queue.get_nowait()
+            sub.queue.put_nowait({"type": "resync", "since": sub.delivered_seq})
+            sub.overflowed = True
+            sub.dropped += dropped
+
+
+hub = EventHub()
+
+metrics.collector(
+    "loopos_event_subscribers", "Conexões SSE/WebSocket abertas",
+    lambda: {(): hub.subscriber_count()},
+)
+metrics.collector(
+    "loopos_events_published_total", "Eventos publicados no hub",
+    lambda: {(): hub.published}, kind="counter",
+)
+
+
+def publish(kind: str, item_id: str, op: str, seq: int, data: Optional[dict] = None):
+    """data de uma remoção (registro antes de apagar) só filtra quem recebe a tombstone"""
+    if op == "delete":
+        hub.publish({"type": "change", "seq": seq, "kind": kind, "id": item_id, "op": op, "data": None}, before=data)
+    else:
+        hub.publish({"type": "change", "seq": seq, "kind": kind, "id": item_id, "op": op, "data": data})
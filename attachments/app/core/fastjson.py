@@ -0,0 +1,67 @@
+# /attachments/app/core/fastjson.py
+# Serialização JSON rápida para respostas grandes e para os arquivos de data/.
+#
+# Usa orjson quando instalado (requirements.txt) e cai para o json da stdlib
+# caso contrário — mesma saída (UTF-8, sem escapar acentos), só mais lenta.
+# As listagens devolvem FastJSONResponse com dicts já no formato do schema
+# (record_projector), sem o jsonable_encoder + revalidação do response_model.
+
+import json
+from collections.abc import Mapping
+from typing import Any, Callable, Type
+
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depende do ambiente
+    orjson = None
+
+
+def _default(value: Any):
+    # Visões congeladas do storage (MappingProxyType/tuple) e modelos Pydantic
+    if isinstance(value, Mapping):
+        return dict(value)
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(data: Any, indent: bool = False) -> bytes:
+    """JSON em UTF-8; indent=True usa 2 espaços (formato legível de data/*.json)"""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(data, default=_default, option=option)
+    if indent:
+        text = json.dumps(data, ensure_ascii=False, indent=2, default=_default)
+    else:
+        text = json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=_default)
+    return text.encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    """Resposta JSON serializada direto com dumps (sem jsonable_encoder)"""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def record_projector(model: Type[BaseModel]) -> Callable[[Mapping], dict]:
+    """
+    Função que leva um registro já validado na escrita ao formato de resposta
+    de `model`: só os campos do schema, com os defaults para os ausentes.
+    """
+    fields = tuple(model.model_fields)
+    defaults = {
+        name: f.get_default(call_default_factory=True)
+        for name, f in model.model_fields.items()
+        if not f.is_required()
+    }
+
+    def project(record: Mapping) -> dict:
+        return {k: record[k] if k in record else defaults.get(k) for k in fields}
+
+    return project
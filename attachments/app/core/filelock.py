@@ -0,0 +1,90 @@
+# /attachments/app/core/filelock.py
+# Lock entre threads E processos (vários workers do uvicorn no mesmo data/).
+#
+# Cada lock é um arquivo em data/.locks/ travado com fcntl.flock (Linux/macOS)
+# ou msvcrt.locking (Windows). É reentrante na mesma thread: save_json pode ser
+# chamado de dentro de um storage.locked(...) que já segura o mesmo documento.
+#
+# LOOPOS_FILE_LOCKS=0 desliga a parte entre processos (fica só o lock de
+# threads, como antes) — para sistemas de arquivos sem suporte a flock.
+
+import os
+import threading
+from pathlib import Path
+
+from app.core.metrics import STORAGE_DURATION
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+_ENABLED = os.getenv("LOOPOS_FILE_LOCKS", "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+def _lock_fd(fd: int):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return
+    while True:
+        try:
+            msvcrt.locking(fd, msvcrt.LK_LOCK, 1)  # tenta por ~10 s e levanta OSError
+            return
+        except OSError:
+            continue
+
+
+def _unlock_fd(fd: int):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+class ProcessLock:
+    """Lock exclusivo, reentrante por thread, também entre processos"""
+
+    def __init__(self, path: Path, name: str = ""):
+        self.path = path
+        self.name = name or path.stem
+        self._rlock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+
+    def acquire(self):
+        self._rlock.acquire()
+        if self._depth == 0 and _ENABLED:
+            try:
+                with STORAGE_DURATION.time("lock_wait", self.name):
+                    self.path.parent.mkdir(parents=True, exist_ok=True)
+                    # Aberto a cada aquisição: um fd herdado via fork compartilharia o lock
+                    fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                    try:
+                        _lock_fd(fd)
+                    except BaseException:
+                        os.close(fd)
+                        raise
+                self._fd = fd
+            except BaseException:
+                self._rlock.release()
+                raise
+        self._depth += 1
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0 and self._fd is not None:
+            fd, self._fd = self._fd, None
+            try:
+                _unlock_fd(fd)
+            finally:
+                os.close(fd)
+        self._rlock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
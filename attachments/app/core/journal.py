@@ -0,0 +1,141 @@
+# /attachments/app/core/journal.py
+# Journal append-only (write-ahead log) sobre um snapshot JSON.
+# Cada escrita vira uma linha JSON anexada ao log (O(1) de I/O); de tempos em
+# tempos o estado é compactado no snapshot e o log é trocado por um vazio.
+#
+# Com vários processos no mesmo data/, as escritas seguram o lock do documento
+# (storage.locked) e cada processo acompanha o log pelo (inode, offset) já
+# lido: tail() traz só o que outro processo anexou; um inode novo significa
+# que houve compactação e o estado deve ser recarregado.
+
+import json
+import os
+from typing import Any, Iterable, List, Optional, Tuple
+
+from app.core.log import get_logger
+from app.core.metrics import STORAGE_DURATION
+from app.core.storage import data_path, locked, save_json
+
+log = get_logger("journal")
+
+
+class Journal:
+    """
+    Log de operações + snapshot.
+
+    O snapshot continua sendo o arquivo JSON de sempre (ex.: os.json); o log
+    fica ao lado (os.json.journal) com uma operação por linha.
+    """
+
+    def __init__(self, name: str, compact_every: int = 500):
+        self.name = name
+        self.snapshot_path = data_path(name)
+        self.log_path = data_path(name + ".journal")
+        self.compact_every = compact_every
+        self.pending = 0  # operações no log ainda não compactadas
+        self._ino = None  # inode do log lido até _offset
+        self._offset = 0
+
+    def locked(self):
+        """Lock do documento (entre threads e processos)"""
+        return locked(self.name)
+
+    def _log_stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.log_path)
+        except OSError:
+            return None
+        return st.st_ino, st.st_size
+
+    def load(self, default: Any) -> Tuple[Any, List[dict]]:
+        """
+        Lê o snapshot e as operações pendentes do log.
+
+        Uma última linha incompleta (queda no meio de uma escrita) é descartada
+        e removida do arquivo, deixando o log consistente para novos appends.
+        """
+        with self.locked():
+            snapshot = default
+            p = self.snapshot_path
+            if p.exists() and p.stat().st_size > 0:
+                with p.open("r", encoding="utf-8") as f:
+                    snapshot = json.load(f)
+
+            if not self.log_path.exists():
+                self.log_path.touch()  # inode estável para quem acompanha o log
+            entries, good = self._read_from(0)
+            size = self.log_path.stat().st_size
+            if good < size:
+                log.warning("journal com linha incompleta descartada", extra={"file": self.log_path.name, "bytes": size - good})
+                with self.log_path.open("r+b") as f:
+                    f.truncate(good)
+            self._ino, self._offset = self._log_stat()[0], good
+            self.pending = len(entries)
+            return snapshot, entries
+
+    def _read_from(self, offset: int) -> Tuple[List[dict], int]:
+        """Entradas completas a partir de offset e o offset após a última delas"""
+        entries: List[dict] = []
+        with self.log_path.open("rb") as f:
+            f.seek(offset)
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break
+                try:
+                    entries.append(json.loads(raw))
+                except ValueError:
+                    break
+                offset += len(raw)
+        return entries, offset
+
+    def stale(self) -> bool:
+        """True se outro processo mexeu no log desde a última leitura (só um stat)"""
+        return self._log_stat() != (self._ino, self._offset)
+
+    def tail(self) -> Optional[List[dict]]:
+        """
+        Operações anexadas por outros processos desde a última leitura, ou None
+        se o log foi compactado (recarregue com load). Chamar com o lock.
+        """
+        st = self._log_stat()
+        if st is None or st[0] != self._ino or st[1] < self._offset:
+            return None
+        if st[1] == self._offset:
+            return []
+        entries, self._offset = self._read_from(self._offset)
+        self.pending += len(entries)
+        return entries
+
+    def append(self, entries: Iterable[dict]):
+        """Anexa operações ao log em uma única escrita, com fsync (chamar após tail, com o lock)"""
+        lines = [json.dumps(e, ensure_ascii=False, separators=(",", ":")) for e in entries]
+        if not lines:
+            return
+        data = ("\n".join(lines) + "\n").encode("utf-8")
+        with self.locked(), STORAGE_DURATION.time("journal_append", self.name):
+            with self.log_path.open("ab") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+                self._offset = f.tell()
+            self.pending += len(lines)
+
+    def should_compact(self) -> bool:
+        return self.pending >= self.compact_every
+
+    def compact(self, snapshot: Any):
+        """
+        Grava o estado completo no snapshot e troca o log por um vazio.
+
+        Se o processo cair entre as duas etapas, o log é reaplicado sobre um
+        snapshot que já o contém — por isso as operações devem ser idempotentes.
+        """
+        with self.locked():
+            save_json(self.name, snapshot)
+            tmp = self.log_path.with_suffix(self.log_path.suffix + ".tmp")
+            with tmp.open("wb") as f:
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.log_path)  # inode novo: os outros processos recarregam
+            self._ino, self._offset = self._log_stat()[0], 0
+            self.pending = 0
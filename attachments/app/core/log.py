@@ -0,0 +1,67 @@
+# /attachments/app/core/log.py
+# Logging da aplicação (loggers "loopos.*").
+#   LOOPOS_LOG_LEVEL   DEBUG, INFO (padrão), WARNING, ERROR
+#   LOOPOS_LOG_FORMAT  text (padrão) ou json — uma linha JSON por evento
+#
+# Campos estruturados vão em extra={...} e saem como chave=valor (text) ou
+# como chaves do objeto (json). Use log.debug("msg", extra=...) com argumentos
+# baratos: com o nível desligado a chamada retorna antes de formatar qualquer
+# coisa. Para montar algo caro, teste log.isEnabledFor(logging.DEBUG) antes.
+
+import json
+import logging
+import os
+
+ROOT = "loopos"
+
+# Atributos padrão de LogRecord (o resto veio de extra=)
+_STANDARD = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+def _extras(record: logging.LogRecord) -> dict:
+    return {k: v for k, v in vars(record).items() if k not in _STANDARD}
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        extras = _extras(record)
+        if extras:
+            line += " " + " ".join(f"{k}={v}" for k, v in extras.items())
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        out = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            **_extras(record),
+        }
+        if record.exc_info:
+            out["exc"] = self.formatException(record.exc_info)
+        return json.dumps(out, ensure_ascii=False, default=str)
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(f"{ROOT}.{name}")
+
+
+def configure():
+    """Configura o logger raiz "loopos" a partir do ambiente (idempotente)"""
+    logger = logging.getLogger(ROOT)
+    try:
+        logger.setLevel(os.getenv("LOOPOS_LOG_LEVEL", "INFO").upper())
+    except ValueError:
+        logger.setLevel(logging.INFO)
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        fmt = os.getenv("LOOPOS_LOG_FORMAT", "text").lower()
+        handler.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+        logger.addHandler(handler)
+        logger.propagate = False
@@ -0,0 +1,211 @@
+# /attachments/app/core/metrics.py
+# Métricas em memória no formato de texto do Prometheus (GET /api/metrics),
+# sem dependência externa. Cada processo (worker) expõe os próprios valores.
+#
+#   loopos_http_requests_total{method,route,status}
+#   loopos_http_request_duration_seconds{method,route}     (histograma)
+#   loopos_http_requests_in_flight
+#   loopos_storage_duration_seconds{op,name}               (histograma)
+#   loopos_supabase_requests_total{method,table,status}
+#   loopos_supabase_request_duration_seconds{method,table} (histograma)
+# e valores lidos na hora da coleta (cache de storage, sync de usinas, ...).
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Sequence, Tuple
+
+_DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _fmt_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        '%s="%s"' % (n, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for n, v in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            yield self.name, _fmt_labels(self.labels, labels), value
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1.0):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = _DEFAULT_BUCKETS):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [contagem por bucket (não cumulativa) + overflow, soma, total]
+        self._values: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            v = self._values.get(labels)
+            if v is None:
+                v = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            v[0][i] += 1
+            v[1] += value
+            v[2] += 1
+
+    @contextmanager
+    def time(self, *labels: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, *labels)
+
+    def samples(self):
+        with self._lock:
+            items = [(k, list(v[0]), v[1], v[2]) for k, v in self._values.items()]
+        names = self.labels + ("le",)
+        for labels, counts, total, count in items:
+            acc = 0
+            for bound, c in zip(self.buckets, counts):
+                acc += c
+                yield self.name + "_bucket", _fmt_labels(names, labels + (repr(bound),)), acc
+            yield self.name + "_bucket", _fmt_labels(names, labels + ("+Inf",)), count
+            yield self.name + "_sum", _fmt_labels(self.labels, labels), total
+            yield self.name + "_count", _fmt_labels(self.labels, labels), count
+
+
+_REGISTRY: List = []
+_COLLECTORS: List[Tuple[str, str, str, Callable[[], Dict[Tuple[str, ...], float]], Tuple[str, ...]]] = []
+
+
+def _register(metric):
+    _REGISTRY.append(metric)
+    return metric
+
+
+def collector(name: str, help: str, fn: Callable[[], Dict[Tuple[str, ...], float]], labels: Sequence[str] = (), kind: str = "gauge"):
+    """Registra valores calculados na hora da coleta: fn() -> {labels: valor}"""
+    _COLLECTORS.append((name, help, kind, fn, tuple(labels)))
+
+
+HTTP_REQUESTS = _register(Counter("loopos_http_requests_total", "Requisições HTTP atendidas", ("method", "route", "status")))
+HTTP_DURATION = _register(Histogram("loopos_http_request_duration_seconds", "Latência das requisições HTTP", ("method", "route")))
+HTTP_IN_FLIGHT = _register(Gauge("loopos_http_requests_in_flight", "Requisições HTTP em andamento"))
+STORAGE_DURATION = _register(Histogram("loopos_storage_duration_seconds", "Tempo de leitura/escrita no armazenamento local", ("op", "name")))
+SUPABASE_REQUESTS = _register(Counter("loopos_supabase_requests_total", "Chamadas HTTP ao Supabase", ("method", "table", "status")))
+SUPABASE_DURATION = _register(Histogram("loopos_supabase_request_duration_seconds", "Latência das chamadas ao Supabase", ("method", "table")))
+
+
+def render() -> str:
+    """Todas as métricas no formato de exposição de texto do Prometheus"""
+    out: List[str] = []
+    for m in _REGISTRY:
+        out.append(f"# HELP {m.name} {m.help}")
+        out.append(f"# TYPE {m.name} {m.kind}")
+        out.extend(f"{name}{labels} {value}" for name, labels, value in m.samples())
+    for name, help, kind, fn, label_names in _COLLECTORS:
+        try:
+            values = fn()
+        except Exception:
+            continue
+        out.append(f"# HELP {name} {help}")
+        out.append(f"# TYPE {name} {kind}")
+        out.extend(f"{name}{_fmt_labels(label_names, labels)} {value}" for labels, value in values.items())
+    return "\n".join(out) + "\n"
+
+
+# ---------- HTTP (middleware ASGI) ----------
+
+class MetricsMiddleware:
+    """
+    Mede cada requisição HTTP. Middleware ASGI puro (não BaseHTTPMiddleware),
+    para não bufferizar respostas em streaming (SSE). A rota é o template
+    (/api/os/{os_id}), não o caminho, para manter a cardinalidade baixa.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - t0
+            HTTP_IN_FLIGHT.dec()
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            method = scope["method"]
+            HTTP_REQUESTS.inc(method, route, str(status[0]))
+            HTTP_DURATION.observe(elapsed, method, route)
+
+
+# ---------- Supabase (event hooks do httpx) ----------
+
+def _table(request) -> str:
+    # /rest/v1/<tabela>, /auth/v1/..., /storage/v1/...
+    parts = request.url.path.strip("/").split("/")
+    if len(parts) >= 3 and parts[0] == "rest":
+        return parts[2]
+    return parts[0] if parts and parts[0] else "other"
+
+
+def _on_request(request):
+    request.extensions["loopos_t0"] = time.perf_counter()
+
+
+def _on_response(response):
+    request = response.request
+    table = _table(request)
+    SUPABASE_REQUESTS.inc(request.method, table, str(response.status_code))
+    t0 = request.extensions.get("loopos_t0")
+    if t0 is not None:
+        SUPABASE_DURATION.observe(time.perf_counter() - t0, request.method, table)
+
+
+async def _on_request_async(request):
+    _on_request(request)
+
+
+async def _on_response_async(response):
+    _on_response(response)
+
+
+def supabase_hooks(asynchronous: bool = False) -> dict:
+    """event_hooks para o httpx.Client/AsyncClient usado pelo supabase-py"""
+    if asynchronous:
+        return {"request": [_on_request_async], "response": [_on_response_async]}
+    return {"request": [_on_request], "response": [_on_response]}
@@ -0,0 +1,220 @@
+# /attachments/app/core/os_store.py
+# Repositório de OS em memória, persistido em journal (os.json + os.json.journal).
+# Escritas de uma OS só anexam uma linha ao log; o os.json é regravado apenas
+# na compactação periódica. Índices hash por id, plantId, technicianId,
+# supervisorId e status são mantidos incrementalmente a cada escrita.
+#
+# Com vários workers, cada processo tem sua cópia em memória: toda leitura
+# confere (um stat) se outro processo anexou ao journal e reaplica só o final;
+# escritas seguram o lock do documento entre processos (locked()).
+
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.core.journal import Journal
+from app.core.storage import backend
+
+# Campos com índice secundário (valor -> ids)
+INDEXED_FIELDS = ("plantId", "technicianId", "supervisorId", "status")
+
+
+def _compact_every() -> int:
+    try:
+        return max(1, int(os.getenv("LOOPOS_OS_COMPACT_EVERY", "500")))
+    except ValueError:
+        return 500
+
+
+class OSStore:
+    """Mantém as OS em memória, na ordem de criação, com journal em disco"""
+
+    def __init__(self, name: str = "os.json", compact_every: Optional[int] = None):
+        if compact_every is None:
+            compact_every = _compact_every()
+        if backend() == "sqlite":
+            # Cada put vira um UPSERT de uma linha na tabela os
+            from app.core.sqlite_storage import SqliteOSJournal
+            self._journal = SqliteOSJournal(name, compact_every)
+        else:
+            self._journal = Journal(name, compact_every)
+        self._items: Dict[str, dict] = {}  # ordem de criação (mais antiga primeiro)
+        self._seq: Dict[str, int] = {}     # id -> posição na ordem de criação
+        self._order: List[str] = []        # posição -> id (inverso de _seq)
+        self._next_seq = 0
+        self._indexes: Dict[str, Dict[Any, Set[str]]] = {f: {} for f in INDEXED_FIELDS}
+        self._loaded = False
+        self.lock = threading.RLock()
+
+    # ---------- carga / recuperação ----------
+
+    def _ensure_loaded(self):
+        if self._loaded and not self._journal.stale():
+            return
+        with self.lock, self._journal.locked():
+            self._refresh()
+
+    def _refresh(self):
+        """Carrega o estado ou aplica o que outros processos gravaram (com os locks)"""
+        if self._loaded:
+            entries = self._journal.tail()
+            if entries is not None:
+                for e in entries:
+                    self._apply(e)
+                return
+            # Log compactado por outro processo: reaplica snapshot + log. Só há
+            # "put" (idempotente) e itens iguais são ignorados, então o estado
+            # atual não precisa ser descartado (leitores nunca o veem vazio).
+        snapshot, entries = self._journal.load([])
+        # Snapshot está do mais novo para o mais antigo (formato do os.json)
+        for item in reversed(snapshot):
+            self._apply({"op": "put", "item": item})
+        for e in entries:
+            self._apply(e)
+        self._loaded = True
+        if self._journal.should_compact():
+            self._compact()
+
+    @contextmanager
+    def locked(self):
+        """
+        Lock do store entre threads e processos, com o estado já atualizado:
+        use em verificações seguidas de escrita (ex.: "id já existe?" + put).
+        """
+        with self.lock, self._journal.locked():
+            self._refresh()
+            yield
+
+    def _apply(self, entry: dict):
+        if entry.get("op") == "put":
+            item = entry["item"]
+            os_id = item["id"]
+            old = self._items.get(os_id)
+            if old == item:
+                return
+            if old is None:
+                self._seq[os_id] = self._next_seq
+                self._order.append(os_id)
+                self._next_seq += 1
+            else:
+                self._unindex(old)
+            self._items[os_id] = item
+            self._index(item)
+
+    def _index(self, item: dict):
+        for field in INDEXED_FIELDS:
+            self._indexes[field].setdefault(item.get(field), set()).add(item["id"])
+
+    def _unindex(self, item: dict):
+        for field in INDEXED_FIELDS:
+            bucket = self._indexes[field].get(item.get(field))
+            if bucket is not None:
+                bucket.discard(item["id"])
+                if not bucket:
+                    del self._indexes[field][item.get(field)]
+
+    def _compact(self):
+        self._journal.compact(self.all())
+
+    # ---------- leitura ----------
+
+    def all(self) -> List[dict]:
+        """Todas as OS, da mais nova para a mais antiga (mesma ordem do os.json)"""
+        self._ensure_loaded()
+        return list(reversed(list(self._items.values())))
+
+    def get(self, os_id: str) -> Optional[dict]:
+        self._ensure_loaded()
+        return self._items.get(os_id)
+
+    def get_many(self, ids: Iterable[str]) -> List[dict]:
+        """OS dos ids informados que existirem (uma única checagem do journal)"""
+        self._ensure_loaded()
+        return [o for o in map(self._items.get, ids) if o is not None]
+
+    def ids_by(self, field: str, value: Any) -> Set[str]:
+        """Ids das OS com field == value (O(1) pelo índice; não alterar o retorno)"""
+        self._ensure_loaded()
+        if field == "id":
+            return {value} if value in self._items else set()
+        return self._indexes[field].get(value, set())
+
+    def find(self, **filters: Any) -> List[dict]:
+        """
+        OS que satisfazem todos os filtros de igualdade, da mais nova para a mais antiga.
+
+        Os filtros devem ser campos indexados (INDEXED_FIELDS ou id); valores
+        None são ignorados. Sem filtros, equivale a all().
+        """
+        self._ensure_loaded()
+        active = {f: v for f, v in filters.items() if v is not None}
+        if not active:
+            return self.all()
+        sets = sorted((self.ids_by(f, v) for f, v in active.items()), key=len)
+        ids: Iterable[str] = sets[0].intersection(*sets[1:]) if len(sets) > 1 else sets[0]
+        return [self._items[i] for i in sorted(ids, key=self._seq.__getitem__, reverse=True)]
+
+    def scan(
+        self,
+        *,
+        before: Optional[int] = None,
+        limit: Optional[int] = None,
+        predicate: Optional[Callable[[dict], bool]] = None,
+        **filters: Any,
+    ) -> Tuple[List[dict], Optional[int]]:
+        """
+        Página de OS (mais nova primeiro) anteriores à posição `before`.
+
+        Filtros de igualdade usam os índices; `predicate` filtra o restante.
+        Retorna (itens, cursor) onde cursor é a posição a passar em `before`
+        para a próxima página, ou None quando não há mais itens.
+        """
+        self._ensure_loaded()
+        with self.lock:
+            start = self._next_seq if before is None else min(before, self._next_seq)
+            active = {f: v for f, v in filters.items() if v is not None}
+            if active:
+                sets = sorted((self.ids_by(f, v) for f, v in active.items()), key=len)
+                ids = sets[0].intersection(*sets[1:]) if len(sets) > 1 else sets[0]
+                seqs = sorted((self._seq[i] for i in ids if self._seq[i] < start), reverse=True)
+            else:
+                seqs = range(start - 1, -1, -1)
+
+            page: List[dict] = []
+            for seq in seqs:
+                item = self._items[self._order[seq]]
+                if predicate is not None and not predicate(item):
+                    continue
+                if limit is not None and len(page) == limit:
+                    return page, self._seq[page[-1]["id"]]
+                page.append(item)
+            return page, None
+
+    def __contains__(self, os_id: str) -> bool:
+        return self.get(os_id) is not None
+
+    def __len__(self) -> int:
+        self._ensure_loaded()
+        return len(self._items)
+
+    # ---------- escrita ----------
+
+    def put(self, item: dict):
+        """Cria ou substitui uma OS (uma linha no journal)"""
+        with self.locked():
+            entry = {"op": "put", "item": item}
+            self._journal.append([entry])
+            self._apply(entry)
+            if self._journal.should_compact():
+                self._compact()
+
+    def put_many(self, items: List[dict]):
+        """Cria ou substitui várias OS com uma única escrita no journal"""
+        with self.locked():
+            entries = [{"op": "put", "item": item} for item in items]
+            self._journal.append(entries)
+            for e in entries:
+                self._apply(e)
+            if self._journal.should_compact():
+                self._compact()
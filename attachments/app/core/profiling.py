@@ -0,0 +1,192 @@
+# /attachments/app/core/profiling.py
+# Profiling sob demanda de uma requisição (amostragem, sem dependências).
+#
+# Com o header "X-Profile: 1" e um ator autorizado (Admin, ver app/main.py),
+# uma thread amostra as pilhas de execução a cada LOOPOS_PROFILE_INTERVAL_MS
+# (padrão 1 ms; na prática limitado pelo switch interval do GIL, ~5 ms)
+# enquanto a requisição roda. O resultado vai para LOOPOS_PROFILE_DIR (padrão
+# data/profiles) no formato "folded" (pilha;separada;por;ponto-e-vírgula N),
+# aceito por flamegraph.pl e pelo speedscope, e o id volta no header
+# X-Profile-Id. Só os LOOPOS_PROFILE_KEEP (padrão 50) mais recentes são mantidos.
+#
+# Amostras da thread do event loop só contam quando a pilha passa por esta
+# requisição; threads do threadpool ociosas são ignoradas. Com outras
+# requisições rodando em paralelo no mesmo worker, as threads do threadpool
+# delas também aparecem — perfile num worker sem muita carga.
+
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Awaitable, Callable, List, Optional
+
+from app.core.log import get_logger
+from app.core.storage import data_path
+
+log = get_logger("profiling")
+
+HEADER = "x-profile"
+ID_HEADER = "X-Profile-Id"
+
+# Pilhas cujo frame mais interno está nestes módulos são threads esperando
+_IDLE_FILES = ("threading.py", "selectors.py", "queue.py")
+
+_write_lock = threading.Lock()
+
+
+def _env_number(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def profile_dir() -> Path:
+    return Path(os.getenv("LOOPOS_PROFILE_DIR") or data_path("profiles"))
+
+
+def _keep() -> int:
+    return max(1, int(_env_number("LOOPOS_PROFILE_KEEP", 50)))
+
+
+def _label(code) -> str:
+    # Nome do frame no formato folded: sem ";" nem espaços extras
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+
+
+class Sampler(threading.Thread):
+    """Amostra as pilhas de todas as threads até stop()"""
+
+    def __init__(self, anchor, interval: float):
+        super().__init__(name="loopos-profiler", daemon=True)
+        self.anchor = anchor              # frame da requisição na thread do event loop
+        self.loop_thread = threading.get_ident()
+        self.interval = interval
+        self.counts: Counter = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        me = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            self.samples += 1
+            for tid, frame in sys._current_frames().items():
+                if tid == me:
+                    continue
+                if os.path.basename(frame.f_code.co_filename) in _IDLE_FILES:
+                    continue
+                codes, on_request = [], False
+                f = frame
+                while f is not None:
+                    on_request = on_request or f is self.anchor
+                    codes.append(f.f_code)
+                    f = f.f_back
+                if tid == self.loop_thread and not on_request:
+                    continue  # event loop atendendo outra requisição
+                codes.reverse()
+                self.counts[(names.get(tid, str(tid)), tuple(codes))] += 1
+            frame = f = None  # não segura frames entre amostras
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def folded(self) -> str:
+        lines = []
+        for (thread_name, codes), n in self.counts.most_common():
+            stack = ";".join([thread_name.replace(";", ":")] + [_label(c) for c in codes])
+            lines.append(f"{stack} {n}")
+        return "\n".join(lines) + "\n"
+
+
+def _save(profile_id: str, folded: str, meta: dict):
+    d = profile_dir()
+    with _write_lock:
+        d.mkdir(parents=True, exist_ok=True)
+        (d / f"{profile_id}.folded").write_text(folded, encoding="utf-8")
+        (d / f"{profile_id}.json").write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
+        # Ring buffer: ids começam pelo timestamp, então a ordem é cronológica
+        metas = sorted(d.glob("*.json"))
+        for old in metas[:-_keep()]:
+            old.unlink(missing_ok=True)
+            old.with_suffix(".folded").unlink(missing_ok=True)
+
+
+def list_profiles() -> List[dict]:
+    """Metadados dos perfis guardados, do mais recente para o mais antigo"""
+    out = []
+    for p in sorted(profile_dir().glob("*.json"), reverse=True):
+        try:
+            out.append(json.loads(p.read_text(encoding="utf-8")))
+        except (OSError, ValueError):
+            continue
+    return out
+
+
+def load_profile(profile_id: str) -> Optional[str]:
+    """Conteúdo folded do perfil, ou None (ids inválidos também dão None)"""
+    if not profile_id or not all(c.isalnum() or c == "-" for c in profile_id):
+        return None
+    p = profile_dir() / f"{profile_id}.folded"
+    return p.read_text(encoding="utf-8") if p.exists() else None
+
+
+class ProfilingMiddleware:
+    """
+    Middleware ASGI: perfila a requisição quando ela traz X-Profile: 1 e
+    `authorize(scope)` confirma o ator. Sem o header o custo é um lookup.
+    """
+
+    def __init__(self, app, authorize: Callable[[dict], Awaitable[Optional[dict]]]):
+        self.app = app
+        self.authorize = authorize
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or (HEADER.encode(), b"1") not in scope.get("headers", ()):
+            return await self.app(scope, receive, send)
+        actor = await self.authorize(scope)
+        if actor is None:
+            return await self.app(scope, receive, send)
+
+        profile_id = f"{datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S%f')}-{uuid.uuid4().hex[:8]}"
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                message = {**message, "headers": list(message.get("headers", [])) + [
+                    (ID_HEADER.lower().encode(), profile_id.encode()),
+                ]}
+            await send(message)
+
+        sampler = Sampler(sys._getframe(), _env_number("LOOPOS_PROFILE_INTERVAL_MS", 1) / 1000)
+        t0 = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            sampler.stop()
+            elapsed = time.perf_counter() - t0
+            meta = {
+                "id": profile_id,
+                "method": scope["method"],
+                "path": scope["path"],
+                "query": scope.get("query_string", b"").decode("latin-1"),
+                "status": status[0],
+                "duration_ms": round(elapsed * 1000, 3),
+                "samples": sampler.samples,
+                "interval_ms": round(sampler.interval * 1000, 3),
+                "actor": actor.get("id"),
+                "created_at": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            }
+            try:
+                _save(profile_id, sampler.folded(), meta)
+                log.info("requisição perfilada", extra={"profile_id": profile_id, "path": scope["path"], "duration_ms": meta["duration_ms"]})
+            except OSError as e:
+                log.warning("falha ao gravar perfil", extra={"profile_id": profile_id, "error": str(e)})
@@ -1,6 +1,11 @@
 # LOOPOS/attachments/app/core/rbac.py
+import logging
 from typing import List, Dict
 
+from app.core.log import get_logger
+
+log = get_logger("rbac")
+
 #Role = str  # usando seus literais em pt-br
 
 def _overlap(a: List[str], b: List[str]) -> bool:
@@ -13,12 +18,6 @@ def can_view_user(actor: Dict, target: Dict) -> bool:
         return True
     
     ar, tr = actor["role"], target["role"]
-
-    # ✅ DEBUG AQUI:
-    if target.get("name") == "Marcelo":
-        print(f"🔍 DEBUG can_view_user:")
-        print(f"  Actor: {actor.get('name')} ({ar}) plantIds={actor.get('plantIds', [])}")
-        print(f"  Target: {target.get('name')} ({tr}) plantIds={target.get('plantIds', [])}")
     
     if ar == "Admin": 
         return True
@@ -35,14 +34,11 @@ def can_view_user(actor: Dict, target: Dict) -> bool:
             actor_plants = actor.get("plantIds",[])
             target_plants = target.get("plantIds",[])
             result = _overlap(actor_plants, target_plants)
-            
-            # ✅ ADICIONE ISTO:
-            if target.get("name") == "Marcelo":
-                print(f"  Supervisor vendo Técnico:")
-                print(f"    actor_plants = {actor_plants}")
-                print(f"    target_plants = {target_plants}")
-                print(f"    _overlap result = {result}")
-            
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("can_view_user supervisor -> subordinado", extra={
+                    "actor": actor["id"], "target": target["id"],
+                    "actor_plants": actor_plants, "target_plants": target_plants, "result": result,
+                })
             return result
         if tr == "Supervisor":
             return _overlap(actor.get("plantIds",[]), target.get("plantIds",[]))
@@ -89,9 +85,104 @@ def can_view_plant(actor: Dict, plant_id: str) -> bool:
     return plant_id in (actor.get("plantIds") or [])
 
 
+def can_view_os(actor: Dict, os_item: Dict) -> bool:
+    if actor["role"] in {"Admin","Operador"}:
+        return True
+    if actor["id"] in (os_item.get("technicianId"), os_item.get("supervisorId")):
+        return True
+    if actor["role"] == "Técnico":
+        return False
+    return os_item.get("plantId") in (actor.get("plantIds") or [])
+
+
 def can_edit_plant(actor: Dict, plant_id: str) -> bool:
     if actor["role"] in {"Admin","Operador"}: 
         return True
     if actor["role"] in {"Coordenador","Supervisor"}:
         return plant_id in (actor.get("plantIds") or [])
-    return False
\ No newline at end of file
+    return False
+
+# -------------------- AVALIAÇÃO EM LOTE --------------------
+# Mesmas regras de can_view_user/can_edit_user, compiladas em tabelas
+# (papel do ator -> papel do alvo -> decisão). A sobreposição de usinas é
+# resolvida por um índice usina -> usuários montado uma vez por versão da lista.
+
+_ALL, _NONE, _OVERLAP = "all", "none", "overlap"
+
+# papel do ator -> (decisões por papel do alvo, decisão padrão)
+_VIEW_RULES = {
+    "Admin": ({}, _ALL),
+    "Operador": ({r: _ALL for r in ("Operador","Técnico","Auxiliar","Supervisor","Coordenador","Admin")}, _NONE),
+    "Coordenador": ({"Admin": _NONE, "Supervisor": _OVERLAP, "Técnico": _OVERLAP, "Auxiliar": _OVERLAP}, _ALL),
+    "Supervisor": ({"Técnico": _OVERLAP, "Auxiliar": _OVERLAP, "Supervisor": _OVERLAP}, _NONE),
+    "Técnico": ({"Auxiliar": _OVERLAP}, _NONE),
+    "Auxiliar": ({"Técnico": _OVERLAP}, _NONE),
+}
+
+_EDIT_RULES = {
+    "Admin": ({}, _ALL),
+    "Operador": ({"Operador": _ALL, "Técnico": _ALL, "Auxiliar": _ALL}, _NONE),
+    "Coordenador": ({"Supervisor": _OVERLAP, "Técnico": _OVERLAP, "Auxiliar": _OVERLAP}, _NONE),
+    "Supervisor": ({"Técnico": _OVERLAP, "Auxiliar": _OVERLAP}, _NONE),
+    "Técnico": ({"Auxiliar": _OVERLAP}, _NONE),
+}
+
+
+class RBACIndex:
+    """Índices de uma lista de usuários para filtrar visibilidade/edição em uma passada"""
+
+    def __init__(self, users: List[Dict]):
+        self.users = users
+        self.by_plant: Dict[str, set] = {}
+        for u in users:
+            for pid in u.get("plantIds") or ():
+                self.by_plant.setdefault(pid, set()).add(u["id"])
+
+    def _colleagues(self, actor: Dict) -> set:
+        """Ids dos usuários que compartilham ao menos uma usina com o ator"""
+        ids: set = set()
+        for pid in set(actor.get("plantIds") or ()):
+            ids |= self.by_plant.get(pid, set())
+        return ids
+
+    def _filter(self, actor: Dict, rules: Dict) -> List[Dict]:
+        by_role, default = rules.get(actor["role"], ({}, _NONE))
+        colleagues = None
+        result = []
+        for u in self.users:
+            if u["id"] == actor["id"]:
+                result.append(u)
+                continue
+            decision = by_role.get(u["role"], default)
+            if decision == _ALL:
+                result.append(u)
+            elif decision == _OVERLAP:
+                if colleagues is None:
+                    colleagues = self._colleagues(actor)
+                if u["id"] in colleagues:
+                    result.append(u)
+        return result
+
+    def visible_users(self, actor: Dict) -> List[Dict]:
+        """Equivale a [u for u in users if can_view_user(actor, u)]"""
+        return self._filter(actor, _VIEW_RULES)
+
+    def editable_users(self, actor: Dict) -> List[Dict]:
+        """Equivale a [u for u in users if can_edit_user(actor, u)]"""
+        return self._filter(actor, _EDIT_RULES)
+
+
+_index_cache: tuple = (None, None)
+
+
+def rbac_index_for(users: List[Dict]) -> RBACIndex:
+    """
+    RBACIndex da lista informada, reaproveitado enquanto a mesma lista for
+    passada (o diretório de usuários cria uma lista nova a cada recarga).
+    """
+    global _index_cache
+    cached_users, index = _index_cache
+    if cached_users is not users:
+        index = RBACIndex(users)
+        _index_cache = (users, index)
+    return index
@@ -1,7 +1,7 @@
 # /attachments/app/core/schemas.py
 # Esquemas Pydantic para requests/responses da API.
 
-from typing import List, Optional, Literal
+from typing import Dict, List, Optional, Literal
 from pydantic import BaseModel, Field
 
 # -------------------- USERS --------------------
@@ -76,4 +76,26 @@ class AssignmentsPayload(BaseModel):
     coordinatorId: Optional[str] = None
     supervisorIds: List[str] = Field(default_factory=list)
     technicianIds: List[str] = Field(default_factory=list)
-    assistantIds: List[str] = Field(default_factory=list)
\ No newline at end of file
+    assistantIds: List[str] = Field(default_factory=list)
+
+
+class AssignmentsBatchItem(AssignmentsPayload):
+    plantId: str
+
+
+# -------------------- BATCH --------------------
+class BatchItemResult(BaseModel):
+    id: str
+    status: int  # código HTTP que a operação individual teria retornado
+    detail: Optional[str] = None
+
+
+# -------------------- CHANGES --------------------
+class ChangesOut(BaseModel):
+    seq: int            # passar como ?since= na próxima chamada
+    reset: bool         # True: conteúdo completo, o cliente deve descartar o que tem
+    users: List[UserOut] = []
+    plants: List[PlantOut] = []
+    os: List[dict] = []  # mesmo formato de GET /api/os
+    assignments: Dict[str, AssignmentsPayload] = {}
+    deleted: Dict[str, List[str]] = {}  # tipo -> ids removidos (tombstones)
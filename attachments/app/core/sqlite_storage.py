@@ -0,0 +1,532 @@
+# /attachments/app/core/sqlite_storage.py
+# Backend SQLite (modo WAL) para os mesmos documentos de storage.py.
+# Ativado com LOOPOS_STORAGE=sqlite; as rotas continuam usando load_json/save_json
+# e recebem exatamente o mesmo formato de antes.
+#
+# Cada registro é guardado inteiro na coluna `doc` (fonte do formato da resposta)
+# e os campos consultáveis ficam em colunas/tabelas próprias com índices.
+#
+# O ganho é de durabilidade (transações, sem reescrever o arquivo inteiro a
+# cada gravação) e de consulta fora do app (sqlite3, relatórios, usando os
+# índices); as rotas continuam lendo o documento inteiro, como no JSON:
+#   - load_doc é cacheado por documento e só refaz o SELECT quando a versão em
+#     doc_versions muda (incrementada na mesma transação de cada gravação,
+#     inclusive de outros workers);
+#   - save_doc compara pelo id com as linhas da última gravação (sem reler a
+#     tabela) e só grava as alteradas;
+#   - a ordem do documento fica em `position`/`seq` com intervalos: remover um
+#     registro não renumera os seguintes, e um novo entra entre os vizinhos.
+#
+# Migração única dos arquivos JSON atuais:
+#   cd attachments && python -m app.core.sqlite_storage migrate
+
+import json
+import os
+import pickle
+import sqlite3
+import sys
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.core import fastjson
+from app.core.metrics import STORAGE_DURATION
+from app.core.storage import _freeze, data_path, locked
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id        TEXT PRIMARY KEY,
+    username  TEXT,
+    role      TEXT,
+    position  INTEGER NOT NULL,
+    doc       TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_users_username ON users (lower(username));
+CREATE INDEX IF NOT EXISTS idx_users_role ON users (role);
+
+CREATE TABLE IF NOT EXISTS user_plants (
+    user_id   TEXT NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    plant_id  TEXT NOT NULL,
+    PRIMARY KEY (user_id, plant_id)
+);
+CREATE INDEX IF NOT EXISTS idx_user_plants_plant ON user_plants (plant_id);
+
+CREATE TABLE IF NOT EXISTS plants (
+    id        TEXT PRIMARY KEY,
+    client    TEXT,
+    name      TEXT,
+    position  INTEGER NOT NULL,
+    doc       TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_plants_client ON plants (client);
+
+CREATE TABLE IF NOT EXISTS assignments (
+    plant_id  TEXT PRIMARY KEY,
+    position  INTEGER NOT NULL,
+    doc       TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS assignment_members (
+    plant_id  TEXT NOT NULL REFERENCES assignments (plant_id) ON DELETE CASCADE,
+    role_type TEXT NOT NULL,
+    user_id   TEXT NOT NULL,
+    PRIMARY KEY (plant_id, role_type, user_id)
+);
+CREATE INDEX IF NOT EXISTS idx_assignment_members_user ON assignment_members (user_id);
+
+CREATE TABLE IF NOT EXISTS os (
+    id            TEXT PRIMARY KEY,
+    seq           INTEGER NOT NULL,
+    plant_id      TEXT,
+    technician_id TEXT,
+    supervisor_id TEXT,
+    status        TEXT,
+    priority      TEXT,
+    start_date    TEXT,
+    doc           TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_os_seq ON os (seq);
+CREATE INDEX IF NOT EXISTS idx_os_plant ON os (plant_id);
+CREATE INDEX IF NOT EXISTS idx_os_technician ON os (technician_id);
+CREATE INDEX IF NOT EXISTS idx_os_supervisor ON os (supervisor_id);
+CREATE INDEX IF NOT EXISTS idx_os_status ON os (status);
+
+-- Versão de cada documento (invalida o cache de load_doc em todos os processos)
+CREATE TABLE IF NOT EXISTS doc_versions (
+    name      TEXT PRIMARY KEY,
+    version   INTEGER NOT NULL
+);
+
+-- Ids de OS gravadas, em ordem: outros processos (workers) leem daqui o que mudou
+CREATE TABLE IF NOT EXISTS os_changes (
+    version   INTEGER PRIMARY KEY AUTOINCREMENT,
+    id        TEXT NOT NULL
+);
+"""
+
+# Quantas linhas de os_changes manter (quem ficar mais atrás recarrega tudo)
+_OS_CHANGES_KEEP = 10000
+
+# Documento JSON -> tabela principal
+_TABLES = {
+    "users.json": "users",
+    "plants.json": "plants",
+    "assignments.json": "assignments",
+    "os.json": "os",
+}
+
+_ASSIGNMENT_ROLES = {
+    "supervisorIds": "supervisor",
+    "technicianIds": "technician",
+    "assistantIds": "assistant",
+}
+
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized = set()
+
+# (banco, documento) -> (versão, pickle do documento, visão congelada ou None)
+_docs: Dict[Tuple[Path, str], tuple] = {}
+# (banco, documento) -> (versão, {id: (posição, doc)}) da última gravação deste processo
+_rows: Dict[Tuple[Path, str], tuple] = {}
+_cache_lock = threading.Lock()
+
+
+def db_path() -> Path:
+    return Path(os.getenv("LOOPOS_SQLITE_PATH") or data_path("loopos.db"))
+
+
+def _connect() -> sqlite3.Connection:
+    """Conexão por thread (sqlite3 não compartilha conexões entre threads)"""
+    path = db_path()
+    conn = getattr(_local, "conn", None)
+    if conn is not None and getattr(_local, "path", None) == path:
+        return conn
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    with _init_lock:
+        if path not in _initialized:
+            conn.executescript(_SCHEMA)
+            _initialized.add(path)
+    _local.conn, _local.path = conn, path
+    return conn
+
+
+def handles(name: str) -> bool:
+    """True se o documento tem tabela própria no SQLite"""
+    return name in _TABLES
+
+
+def _dumps(value: Any) -> str:
+    # Mesmo texto compacto do json.dumps(ensure_ascii=False); orjson quando instalado
+    return fastjson.dumps(value).decode("utf-8")
+
+
+# ==================== LEITURA ====================
+
+def _version(conn: sqlite3.Connection, name: str) -> int:
+    row = conn.execute("SELECT version FROM doc_versions WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else 0
+
+
+def _bump(conn: sqlite3.Connection, name: str) -> int:
+    """Nova versão do documento (dentro da transação de escrita)"""
+    conn.execute(
+        "INSERT INTO doc_versions VALUES (?, 1) ON CONFLICT (name) DO UPDATE SET version = version + 1", (name,)
+    )
+    return _version(conn, name)
+
+
+def _read_doc(conn: sqlite3.Connection, name: str) -> Any:
+    """Reconstrói o documento JSON (mesma forma do arquivo); None se vazio"""
+    if name == "assignments.json":
+        rows = conn.execute("SELECT plant_id, doc FROM assignments ORDER BY position").fetchall()
+        return {pid: json.loads(doc) for pid, doc in rows} if rows else None
+    if name == "os.json":
+        # os.json é do mais novo para o mais antigo
+        rows = conn.execute("SELECT doc FROM os ORDER BY seq DESC").fetchall()
+    else:
+        rows = conn.execute(f"SELECT doc FROM {_TABLES[name]} ORDER BY position").fetchall()
+    return [json.loads(doc) for (doc,) in rows] if rows else None
+
+
+def _cached(name: str) -> tuple:
+    """Entrada do cache na versão atual do banco (relê as tabelas só se mudou)"""
+    conn = _connect()
+    key = (db_path(), name)
+    # Versão e linhas lidas no mesmo snapshot (SqliteOSJournal.load já abre o seu)
+    own = not conn.in_transaction
+    if own:
+        conn.execute("BEGIN")
+    try:
+        version = _version(conn, name)
+        entry = _docs.get(key)
+        if entry is None or entry[0] != version:
+            entry = (version, pickle.dumps(_read_doc(conn, name), pickle.HIGHEST_PROTOCOL), None)
+            with _cache_lock:
+                _docs[key] = entry
+    finally:
+        if own:
+            conn.execute("COMMIT")
+    return key, entry
+
+
+def load_doc(name: str, default: Any):
+    """Documento JSON (cópia privada, pode ser alterada pelo chamador)"""
+    _, entry = _cached(name)
+    data = pickle.loads(entry[1])
+    return default if data is None else data
+
+
+def load_doc_frozen(name: str, default: Any):
+    """Documento como visão somente leitura compartilhada (ver storage.load_json_frozen)"""
+    key, entry = _cached(name)
+    if entry[2] is None:
+        entry = (entry[0], entry[1], _freeze(pickle.loads(entry[1])))
+        with _cache_lock:
+            current = _docs.get(key)
+            if current is not None and current[0] == entry[0]:
+                _docs[key] = entry
+    return default if entry[2] is None else entry[2]
+
+
+# ==================== ESCRITA ====================
+
+def _user_row(u: dict, pos: int) -> tuple:
+    return (u["id"], u.get("username"), u.get("role"), pos, _dumps(u))
+
+
+def _plant_row(p: dict, pos: int) -> tuple:
+    return (p["id"], p.get("client"), p.get("name"), pos, _dumps(p))
+
+
+def _os_row(o: dict, seq: int) -> tuple:
+    return (
+        o["id"], seq, o.get("plantId"), o.get("technicianId"), o.get("supervisorId"),
+        o.get("status"), o.get("priority"), o.get("startDate"), _dumps(o),
+    )
+
+
+# tabela -> (coluna de ordenação, índice dela na tupla da linha)
+_ORDER = {
+    "users": ("position", 3),
+    "plants": ("position", 3),
+    "assignments": ("position", 1),
+    "os": ("seq", 1),
+}
+
+# Intervalo mínimo entre vizinhos antes de renumerar tudo
+_MIN_GAP = 1e-6
+
+
+def _positions(ids: List[str], old: Dict[str, float]) -> List[float]:
+    """
+    Posições para a nova ordem dos ids. Quem continua em ordem crescente mantém
+    a posição (remover um registro não mexe nos outros); novos e movidos ficam
+    entre os vizinhos mantidos.
+    """
+    n = len(ids)
+    kept: List[Optional[float]] = [None] * n
+    prev = None
+    for i, rid in enumerate(ids):
+        p = old.get(rid)
+        if p is not None and (prev is None or p > prev):
+            kept[i] = prev = p
+
+    out: List[float] = []
+    lo = None
+    i = 0
+    while i < n:
+        if kept[i] is not None:
+            lo = kept[i]
+            out.append(lo)
+            i += 1
+            continue
+        j = i
+        while j < n and kept[j] is None:
+            j += 1
+        hi = kept[j] if j < n else None
+        count = j - i
+        if lo is None and hi is None:
+            run = list(range(count))
+        elif hi is None:
+            run = [lo + k + 1 for k in range(count)]
+        elif lo is None:
+            run = [hi - count + k for k in range(count)]
+        else:
+            step = (hi - lo) / (count + 1)
+            if step < _MIN_GAP:
+                return list(range(n))
+            run = [lo + step * (k + 1) for k in range(count)]
+        out.extend(run)
+        lo = run[-1]
+        i = j
+    # Inteiros continuam inteiros (a coluna é INTEGER; frações ficam REAL)
+    return [int(p) if float(p).is_integer() else p for p in out]
+
+
+def _existing(conn: sqlite3.Connection, name: str, table: str, key: str) -> Dict[str, tuple]:
+    """{id: (posição, doc)} atual: da última gravação deste processo ou do banco"""
+    order_col, _ = _ORDER[table]
+    cached = _rows.get((db_path(), name))
+    if cached is not None and cached[0] == _version(conn, name):
+        return cached[1]
+    return {rid: (pos, doc) for rid, pos, doc in conn.execute(f"SELECT {key}, {order_col}, doc FROM {table}")}
+
+
+def _sync_rows(conn: sqlite3.Connection, table: str, key: str, existing: Dict[str, tuple],
+               rows: List[tuple]) -> List[tuple]:
+    """
+    Aplica a lista completa de linhas à tabela tocando só o que mudou.
+    rows: tuplas na ordem das colunas, com o id na primeira posição e doc na última.
+    Retorna as linhas inseridas/alteradas.
+    """
+    _, order_idx = _ORDER[table]
+    new_ids = {r[0] for r in rows}
+    removed = [(rid,) for rid in existing if rid not in new_ids]
+    if removed:
+        conn.executemany(f"DELETE FROM {table} WHERE {key} = ?", removed)
+    changed = [r for r in rows if existing.get(r[0]) != (r[order_idx], r[-1])]
+    if changed:
+        marks = ",".join("?" * len(changed[0]))
+        conn.executemany(f"INSERT OR REPLACE INTO {table} VALUES ({marks})", changed)
+    return changed
+
+
+def save_doc(name: str, data: Any):
+    """Grava o documento inteiro numa transação, atualizando só as linhas alteradas"""
+    table = _TABLES[name]
+    key = "plant_id" if table == "assignments" else "id"
+    _, order_idx = _ORDER[table]
+    conn = _connect()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        existing = _existing(conn, name, table, key)
+        old = {rid: pos for rid, (pos, _) in existing.items()}
+        if name == "users.json":
+            items = list(data or [])
+            pos = _positions([u["id"] for u in items], old)
+            rows = [_user_row(u, p) for u, p in zip(items, pos)]
+            for r in _sync_rows(conn, table, key, existing, rows):
+                user = json.loads(r[-1])
+                conn.execute("DELETE FROM user_plants WHERE user_id = ?", (r[0],))
+                conn.executemany(
+                    "INSERT OR IGNORE INTO user_plants VALUES (?, ?)",
+                    [(r[0], pid) for pid in user.get("plantIds") or []],
+                )
+        elif name == "plants.json":
+            items = list(data or [])
+            pos = _positions([p["id"] for p in items], old)
+            rows = [_plant_row(p, i) for p, i in zip(items, pos)]
+            _sync_rows(conn, table, key, existing, rows)
+        elif name == "assignments.json":
+            items = list((data or {}).items())
+            pos = _positions([pid for pid, _ in items], old)
+            rows = [(pid, i, _dumps(a)) for (pid, a), i in zip(items, pos)]
+            for pid, _, doc in _sync_rows(conn, table, key, existing, rows):
+                _write_members(conn, pid, json.loads(doc))
+        else:  # os.json: do mais novo para o mais antigo, seq crescente do mais antigo
+            items = list(reversed(data or []))
+            pos = _positions([o["id"] for o in items], old)
+            rows = [_os_row(o, i) for o, i in zip(items, pos)]
+            _sync_rows(conn, table, key, existing, rows)
+        version = _bump(conn, name)
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    with _cache_lock:
+        _rows[(db_path(), name)] = (version, {r[0]: (r[order_idx], r[-1]) for r in rows})
+
+
+def _write_members(conn: sqlite3.Connection, plant_id: str, a: dict):
+    conn.execute("DELETE FROM assignment_members WHERE plant_id = ?", (plant_id,))
+    members = []
+    if a.get("coordinatorId"):
+        members.append((plant_id, "coordinator", a["coordinatorId"]))
+    for field, role_type in _ASSIGNMENT_ROLES.items():
+        members.extend((plant_id, role_type, uid) for uid in a.get(field) or [])
+    conn.executemany("INSERT OR IGNORE INTO assignment_members VALUES (?, ?, ?)", members)
+
+
+# ==================== OS (journal do OSStore) ====================
+
+class SqliteOSJournal:
+    """
+    Mesmo contrato do Journal usado pelo OSStore, mas cada operação é um
+    UPSERT de uma linha na tabela os — não há log nem compactação. A tabela
+    os_changes faz o papel do final do log para os outros processos.
+    """
+
+    def __init__(self, name: str = "os.json", compact_every: int = 0):
+        self.name = name
+        self.pending = 0
+        self._version = 0  # última linha de os_changes já aplicada
+
+    def locked(self):
+        return locked(self.name)
+
+    def _max_version(self, conn: sqlite3.Connection) -> int:
+        return conn.execute("SELECT COALESCE(MAX(version), 0) FROM os_changes").fetchone()[0]
+
+    def load(self, default: Any) -> Tuple[Any, List[dict]]:
+        conn = _connect()
+        conn.execute("BEGIN")
+        try:
+            self._version = self._max_version(conn)
+            return load_doc(self.name, default), []
+        finally:
+            conn.execute("COMMIT")
+
+    def stale(self) -> bool:
+        return self._max_version(_connect()) != self._version
+
+    def tail(self) -> Optional[List[dict]]:
+        """OS gravadas por outros processos, ou None se já saíram de os_changes"""
+        conn = _connect()
+        rows = conn.execute(
+            "SELECT version, id FROM os_changes WHERE version > ? ORDER BY version", (self._version,)
+        ).fetchall()
+        if not rows:
+            return []
+        if rows[0][0] != self._version + 1:
+            first = conn.execute("SELECT MIN(version) FROM os_changes").fetchone()[0]
+            if first is not None and first > self._version + 1:
+                return None
+        ids = list({rid: None for _, rid in rows})
+        docs = []
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            docs += conn.execute(
+                f"SELECT seq, doc FROM os WHERE id IN ({','.join('?' * len(chunk))})", chunk
+            ).fetchall()
+        self._version = rows[-1][0]
+        return [{"op": "put", "item": json.loads(doc)} for _, doc in sorted(docs)]
+
+    def append(self, entries: Iterable[dict]):
+        with STORAGE_DURATION.time("journal_append", self.name):
+            self._append(entries)
+
+    def _append(self, entries: Iterable[dict]):
+        conn = _connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for e in entries:
+                if e.get("op") != "put":
+                    continue
+                item = e["item"]
+                row = conn.execute("SELECT seq FROM os WHERE id = ?", (item["id"],)).fetchone()
+                if row is not None:
+                    seq = row[0]
+                else:
+                    seq = conn.execute("SELECT COALESCE(MAX(seq) + 1, 0) FROM os").fetchone()[0]
+                conn.execute(
+                    "INSERT OR REPLACE INTO os VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", _os_row(item, seq)
+                )
+                conn.execute("INSERT INTO os_changes (id) VALUES (?)", (item["id"],))
+            _bump(conn, self.name)
+            version = self._max_version(conn)
+            conn.execute("DELETE FROM os_changes WHERE version <= ?", (version - _OS_CHANGES_KEEP,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        # Chamado com o lock do documento e após tail(): nada de outro processo no meio
+        self._version = version
+
+    def should_compact(self) -> bool:
+        return False
+
+    def compact(self, snapshot: Any):
+        pass
+
+
+# ==================== MIGRAÇÃO ====================
+
+def migrate(force: bool = False) -> Dict[str, int]:
+    """
+    Copia attachments/data/*.json (e o journal de OS pendente) para o SQLite.
+    Sem force, recusa sobrescrever tabelas que já têm dados.
+    """
+    from app.core.journal import Journal
+
+    conn = _connect()
+    if not force:
+        for table in _TABLES.values():
+            if conn.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone():
+                raise RuntimeError(f"tabela {table} já tem dados (use --force para sobrescrever)")
+
+    counts = {}
+    for name in ("users.json", "plants.json", "assignments.json"):
+        p = data_path(name)
+        default = {} if name == "assignments.json" else []
+        data = default
+        if p.exists() and p.stat().st_size > 0:
+            with p.open("r", encoding="utf-8") as f:
+                data = json.load(f)
+        save_doc(name, data)
+        counts[name] = len(data)
+
+    # OS: snapshot + operações ainda não compactadas do journal
+    snapshot, entries = Journal("os.json").load([])
+    items = {o["id"]: o for o in reversed(snapshot)}
+    for e in entries:
+        if e.get("op") == "put":
+            items[e["item"]["id"]] = e["item"]
+    save_doc("os.json", list(reversed(list(items.values()))))
+    counts["os.json"] = len(items)
+    return counts
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "migrate":
+        print("uso: python -m app.core.sqlite_storage migrate [--force]")
+        sys.exit(2)
+    try:
+        result = migrate(force="--force" in sys.argv[2:])
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    print(f"✅ Migração concluída em {db_path()}: {result}")
@@ -3,26 +3,86 @@
 # Os arquivos são salvos em /attachments/data para facilitar backup e migração.
 
 # Persistência em JSON com lock thread-safe e retry automático para Windows/Nextcloud
+# Leituras passam por um cache em memória invalidado por save_json e por stat
+# (mtime/tamanho/inode), para não reprocessar o JSON a cada requisição.
+#
+# Vários workers (uvicorn --workers N) podem servir o mesmo data/: os locks por
+# documento valem entre processos (app/core/filelock.py) e a assinatura do
+# stat muda a cada gravação (os.replace gera um inode novo), então o cache de
+# um worker é descartado quando outro grava. Read-modify-write de documentos
+# deve ficar dentro de `with locked(nome, ...)`.
 
 import json
+import os
+import pickle
 import threading
 import time
-from typing import Any
+from contextlib import ExitStack, contextmanager
+from types import MappingProxyType
+from typing import Any, Optional, Tuple
 from pathlib import Path
 
+from app.core import fastjson, metrics
+from app.core.filelock import ProcessLock
+from app.core.log import get_logger
+
+log = get_logger("storage")
 
 _LOCKS = {}
+_LOCKS_GUARD = threading.Lock()
+
+# Cache de leitura: nome -> (assinatura do stat, blob pickle, visão congelada)
+_CACHE = {}
+_CACHE_LOCK = threading.Lock()
+_CACHE_STATS = {"hits": 0, "misses": 0, "invalidations": 0}
 
-# Base em .../attachments/data (app/core -> app -> attachments)
-_BASE_DIR = Path(__file__).resolve().parents[2] / "data"
+# Base em .../attachments/data (app/core -> app -> attachments), ou
+# LOOPOS_DATA_DIR (benchmarks e testes usam um diretório descartável)
+_BASE_DIR = Path(os.getenv("LOOPOS_DATA_DIR") or Path(__file__).resolve().parents[2] / "data")
 _BASE_DIR.mkdir(parents=True, exist_ok=True)
 
+# Formato dos arquivos: indentado (legível, padrão) ou compacto com
+# LOOPOS_JSON_COMPACT=1 (menor e mais rápido de gravar; ver save_json)
+_COMPACT = os.getenv("LOOPOS_JSON_COMPACT", "0").strip().lower() in ("1", "true", "yes")
+
+# Backend de persistência: "json" (arquivos em data/, padrão) ou "sqlite"
+# (app/core/sqlite_storage.py). Documentos sem tabela no SQLite seguem em JSON.
+_BACKEND = os.getenv("LOOPOS_STORAGE", "json").strip().lower()
+
+
+def backend() -> str:
+    """Backend de persistência ativo ("json" ou "sqlite")"""
+    return _BACKEND
+
+
+def _sqlite_for(name: str):
+    """Módulo sqlite_storage se ele for responsável por este documento"""
+    if _BACKEND != "sqlite":
+        return None
+    from app.core import sqlite_storage
+    return sqlite_storage if sqlite_storage.handles(name) else None
 
-def _get_lock(name: str) -> threading.Lock:
-    """Obtém lock por arquivo (thread-safe)"""
-    if name not in _LOCKS:
-        _LOCKS[name] = threading.Lock()
-    return _LOCKS[name]
+
+def _get_lock(name: str) -> ProcessLock:
+    """Obtém lock por arquivo (entre threads e processos, reentrante)"""
+    lock = _LOCKS.get(name)
+    if lock is None:
+        with _LOCKS_GUARD:
+            lock = _LOCKS.setdefault(name, ProcessLock(_BASE_DIR / ".locks" / f"{name}.lock", name))
+    return lock
+
+
+@contextmanager
+def locked(*names: str):
+    """
+    Segura os locks de vários documentos (em ordem alfabética, sem deadlock)
+    durante um read-modify-write. O de "changes.journal" é exceção: só
+    app/core/changes.py o usa, sempre por último e sem pedir outros dentro.
+    """
+    with ExitStack() as stack:
+        for name in sorted(set(names)):
+            stack.enter_context(_get_lock(name))
+        yield
 
 
 def _path(name: str) -> Path:
@@ -30,27 +90,166 @@ def _path(name: str) -> Path:
     return _BASE_DIR / name
 
 
+def data_path(name: str) -> Path:
+    """Caminho de um arquivo dentro do diretório de dados (para journals etc.)"""
+    return _path(name)
+
+
+def _signature(p: Path) -> Optional[Tuple[int, int, int]]:
+    """Assinatura do arquivo no disco (mtime_ns, tamanho, inode) ou None se ausente"""
+    try:
+        st = p.stat()
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def _freeze(value: Any) -> Any:
+    """Converte dict/list em visões somente leitura (MappingProxyType/tuple)"""
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _cache_store(name: str, sig: Tuple[int, int, int], data: Any) -> bytes:
+    """Guarda um snapshot do documento; a visão congelada é criada sob demanda"""
+    blob = pickle.dumps(data, pickle.HIGHEST_PROTOCOL)
+    with _CACHE_LOCK:
+        _CACHE[name] = (sig, blob, None)
+    return blob
+
+
+def _cache_get(name: str, sig: Tuple[int, int, int]):
+    """Retorna a entrada do cache se ainda corresponde ao arquivo no disco"""
+    with _CACHE_LOCK:
+        entry = _CACHE.get(name)
+        if entry is not None and entry[0] == sig:
+            _CACHE_STATS["hits"] += 1
+            return entry
+        if entry is not None:
+            # Arquivo alterado por fora (Nextcloud, outro processo...)
+            del _CACHE[name]
+            _CACHE_STATS["invalidations"] += 1
+        _CACHE_STATS["misses"] += 1
+        return None
+
+
+def invalidate_cache(name: Optional[str] = None):
+    """Descarta o cache de um arquivo (ou de todos, se name=None)"""
+    with _CACHE_LOCK:
+        if name is None:
+            dropped = len(_CACHE)
+            _CACHE.clear()
+        else:
+            dropped = 1 if _CACHE.pop(name, None) is not None else 0
+        _CACHE_STATS["invalidations"] += dropped
+
+
+def cache_stats() -> dict:
+    """Contadores do cache de leitura (hits, misses, invalidations, entries)"""
+    with _CACHE_LOCK:
+        return {**_CACHE_STATS, "entries": len(_CACHE)}
+
+
+metrics.collector(
+    "loopos_storage_cache_events",
+    "Eventos do cache de leitura de JSON (hits, misses, invalidations, entries)",
+    lambda: {(k,): v for k, v in cache_stats().items()},
+    labels=("event",),
+)
+
+
+def _read_file(name: str, p: Path, sig: Tuple[int, int, int]):
+    """Lê e faz parse do arquivo, populando o cache. Retorna (data, blob) ou None"""
+    with metrics.STORAGE_DURATION.time("read", name), p.open("r", encoding="utf-8") as f:
+        data = json.load(f)
+    # Só cacheia se o arquivo não mudou durante a leitura
+    if _signature(p) == sig:
+        return data, _cache_store(name, sig, data)
+    return data, None
+
+
 def load_json(name: str, default: Any):
-    """Carrega JSON com fallback para valor padrão"""
+    """
+    Carrega JSON com fallback para valor padrão.
+
+    O retorno é sempre uma cópia privada do documento em cache: o chamador pode
+    alterá-la livremente sem afetar outras requisições.
+    """
+    sql = _sqlite_for(name)
+    if sql is not None:
+        with metrics.STORAGE_DURATION.time("read", name):
+            return sql.load_doc(name, default)
+    
     p = _path(name)
+    sig = _signature(p)
     
     # Arquivo inexistente ou vazio → default
-    if not p.exists() or p.stat().st_size == 0:
+    if sig is None or sig[1] == 0:
         return default
     
+    entry = _cache_get(name, sig)
+    if entry is not None:
+        return pickle.loads(entry[1])
+    
     try:
-        with p.open("r", encoding="utf-8") as f:
-            return json.load(f)
+        data, blob = _read_file(name, p, sig)
+        # Cópia independente da que ficou no cache
+        return pickle.loads(blob) if blob is not None else data
     except json.JSONDecodeError:
         # Conteúdo inválido → retorna default
-        print(f"⚠️ Arquivo corrompido: {name}, usando default")
+        log.warning("arquivo corrompido, usando default", extra={"file": name})
         return default
     except Exception as e:
-        print(f"⚠️ Erro ao carregar {name}: {e}")
+        log.warning("erro ao carregar arquivo, usando default", extra={"file": name, "error": str(e)})
         return default
 
 
-def save_json(name: str, data: Any, max_retries: int = 3):
+def load_json_frozen(name: str, default: Any):
+    """
+    Carrega JSON como visão somente leitura compartilhada (sem cópia).
+
+    Dicts viram MappingProxyType e listas viram tuplas; use em caminhos que só
+    leem os dados (listagens), evitando o custo da cópia de load_json.
+    """
+    sql = _sqlite_for(name)
+    if sql is not None:
+        with metrics.STORAGE_DURATION.time("read", name):
+            return sql.load_doc_frozen(name, default)
+    
+    p = _path(name)
+    sig = _signature(p)
+    if sig is None or sig[1] == 0:
+        return default
+    
+    entry = _cache_get(name, sig)
+    if entry is None:
+        try:
+            data, blob = _read_file(name, p, sig)
+        except json.JSONDecodeError:
+            log.warning("arquivo corrompido, usando default", extra={"file": name})
+            return default
+        except Exception as e:
+            log.warning("erro ao carregar arquivo, usando default", extra={"file": name, "error": str(e)})
+            return default
+        if blob is None:
+            return _freeze(data)
+        entry = (sig, blob, None)
+    
+    if entry[2] is not None:
+        return entry[2]
+    
+    frozen = _freeze(pickle.loads(entry[1]))
+    with _CACHE_LOCK:
+        current = _CACHE.get(name)
+        if current is not None and current[0] == entry[0]:
+            _CACHE[name] = (current[0], current[1], frozen)
+    return frozen
+
+
+def save_json(name: str, data: Any, max_retries: int = 3, compact: Optional[bool] = None):
     """
     Salva JSON com lock thread-safe e retry automático (Windows/Nextcloud)
     
@@ -58,27 +257,37 @@ def save_json(name: str, data: Any, max_retries: int = 3):
         name: Nome do arquivo JSON
         data: Dados a salvar
         max_retries: Número máximo de tentativas (padrão: 3)
+        compact: True grava sem indentação; None segue LOOPOS_JSON_COMPACT
     """
+    if compact is None:
+        compact = _COMPACT
+    sql = _sqlite_for(name)
+    if sql is not None:
+        with metrics.STORAGE_DURATION.time("write", name):
+            sql.save_doc(name, data)
+        return
+    
     p = _path(name)
     tmp = p.with_suffix(p.suffix + ".tmp")
     lock = _get_lock(name)
     
     for attempt in range(max_retries):
         try:
-            with lock:  # ✅ Thread-safe
-                # Escreve no arquivo temporário
-                with tmp.open("w", encoding="utf-8") as f:
-                    json.dump(data, f, ensure_ascii=False, indent=2)
+            with lock, metrics.STORAGE_DURATION.time("write", name):  # ✅ Thread-safe
+                # Escreve no arquivo temporário (orjson, se instalado)
+                with tmp.open("wb") as f:
+                    f.write(fastjson.dumps(data, indent=not compact))
                 
                 # Tenta renomear (atomic write)
                 tmp.replace(p)
+                invalidate_cache(name)
             
             return  # ✅ Sucesso!
         
         except PermissionError as e:
             if attempt < max_retries - 1:
                 # ✅ RETRY: Arquivo bloqueado, tenta novamente
-                print(f"⚠️ Arquivo bloqueado: {name} (tentativa {attempt + 1}/{max_retries})")
+                log.warning("arquivo bloqueado, tentando de novo", extra={"file": name, "attempt": attempt + 1, "max_retries": max_retries})
                 time.sleep(0.5)  # Espera 500ms (Nextcloud libera)
                 
                 # Limpa arquivo temp se estiver preso
@@ -91,9 +300,10 @@ def save_json(name: str, data: Any, max_retries: int = 3):
                 continue
             else:
                 # ✅ FALHA: Depois de N tentativas
-                print(f"❌ Falha permanente ao salvar {name}: {e}")
+                log.error("falha permanente ao salvar", extra={"file": name, "error": str(e)})
                 raise
         
         except Exception as e:
-            print(f"❌ Erro ao salvar {name}: {e}")
+            invalidate_cache(name)
+            log.error("erro ao salvar", extra={"file": name, "error": str(e)})
             raise
\ No newline at end of file
@@ -0,0 +1,200 @@
+# /attachments/app/core/supabase_async.py
+# Acesso assíncrono ao Supabase para rotas `async def`.
+# Um único AsyncClient por event loop, sobre um httpx.AsyncClient com pool de
+# conexões keep-alive: a concorrência fica limitada pelo pool (configurável),
+# e não pelas threads do threadpool do FastAPI.
+#
+# Variáveis de ambiente (opcionais):
+#   SUPABASE_MAX_CONNECTIONS      conexões simultâneas no pool (padrão 20)
+#   SUPABASE_MAX_KEEPALIVE        conexões ociosas mantidas abertas (padrão 10)
+#   SUPABASE_KEEPALIVE_EXPIRY     segundos até fechar uma conexão ociosa (padrão 30)
+#   SUPABASE_TIMEOUT              timeout de leitura/escrita em segundos (padrão 10)
+#   SUPABASE_CONNECT_TIMEOUT      timeout de conexão em segundos (padrão 5)
+#   SUPABASE_POOL_TIMEOUT         espera máxima por uma conexão livre (padrão 10)
+#
+# O supabase-py só é importado na criação do cliente; warm_up() faz isso (e a
+# primeira conexão) em segundo plano logo após o startup.
+
+import asyncio
+import os
+import uuid
+from typing import TYPE_CHECKING, Any, Callable, List, Optional
+
+import httpx
+
+from app.core import metrics
+from app.core.log import get_logger
+from app.core.supabase_client import settings
+from app.core.supabase_storage import _PAGE_SIZE, _users_out, _user_row, _user_assignment_rows
+
+if TYPE_CHECKING:
+    from supabase import AsyncClient
+
+log = get_logger("supabase")
+
+_client: Optional["AsyncClient"] = None
+_http: Optional[httpx.AsyncClient] = None
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_lock: Optional[asyncio.Lock] = None
+
+# ids por consulta `in.(...)` (mantém a URL curta)
+_IDS_PER_QUERY = 100
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def http_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=int(_env_float("SUPABASE_MAX_CONNECTIONS", 20)),
+        max_keepalive_connections=int(_env_float("SUPABASE_MAX_KEEPALIVE", 10)),
+        keepalive_expiry=_env_float("SUPABASE_KEEPALIVE_EXPIRY", 30),
+    )
+
+
+def http_timeout() -> httpx.Timeout:
+    return httpx.Timeout(
+        _env_float("SUPABASE_TIMEOUT", 10),
+        connect=_env_float("SUPABASE_CONNECT_TIMEOUT", 5),
+        pool=_env_float("SUPABASE_POOL_TIMEOUT", 10),
+    )
+
+
+def _import_sdk():
+    # Import pesado (~200 ms: supabase, postgrest, auth, storage, realtime)
+    from supabase import AsyncClientOptions, acreate_client
+    return AsyncClientOptions, acreate_client
+
+
+async def get_async_supabase() -> "AsyncClient":
+    """Retorna o cliente assíncrono compartilhado (criado no primeiro uso)"""
+    global _client, _http, _loop, _lock
+    loop = asyncio.get_running_loop()
+    if _client is not None and _loop is loop:
+        return _client
+    if _lock is None or _loop is not loop:
+        # Novo event loop (reload, testes): o pool antigo não pode ser reaproveitado
+        _lock, _loop, _client, _http = asyncio.Lock(), loop, None, None
+    async with _lock:
+        if _client is None:
+            url, key = settings()
+            AsyncClientOptions, acreate_client = _import_sdk()
+            _http = httpx.AsyncClient(
+                limits=http_limits(), timeout=http_timeout(), event_hooks=metrics.supabase_hooks(asynchronous=True)
+            )
+            _client = await acreate_client(url, key, options=AsyncClientOptions(httpx_client=_http))
+    return _client
+
+
+async def warm_up() -> bool:
+    """
+    Importa o supabase-py numa thread (sem travar o event loop) e cria o
+    cliente. Falhas só vão para o log: o primeiro uso tenta de novo.
+    """
+    try:
+        settings()
+        await asyncio.to_thread(_import_sdk)
+        await get_async_supabase()
+        return True
+    except ValueError as e:
+        log.warning("Supabase não configurado; rotas de usuários indisponíveis", extra={"error": str(e).splitlines()[0]})
+    except Exception:
+        log.exception("falha ao aquecer o cliente Supabase")
+    return False
+
+
+async def close_async_supabase():
+    """Fecha o pool HTTP (chamado no shutdown da aplicação)"""
+    global _client, _http
+    http, _client, _http = _http, None, None
+    if http is not None:
+        await http.aclose()
+
+
+async def _fetch_all(build: Callable[[], Any]) -> List[dict]:
+    """Versão assíncrona de supabase_storage._fetch_all (range() ordenado por id)"""
+    rows = []
+    start = 0
+    while True:
+        response = await build().order("id").range(start, start + _PAGE_SIZE - 1).execute()
+        page = response.data or []
+        rows.extend(page)
+        if len(page) < _PAGE_SIZE:
+            return rows
+        start += _PAGE_SIZE
+
+
+# ==================== USERS ====================
+
+async def load_users() -> List[dict]:
+    """Versão assíncrona de supabase_storage.load_users (as duas consultas em paralelo)"""
+    try:
+        client = await get_async_supabase()
+        users, assignments = await asyncio.gather(
+            _fetch_all(lambda: client.table("users").select("*")),
+            _fetch_all(lambda: client.table("plant_assignments").select("plant_id, user_id")),
+        )
+        return _users_out(users, assignments)
+    except Exception as e:
+        log.exception("erro ao carregar usuários")
+        return []
+
+
+async def load_users_by_ids(ids: List[str]) -> List[dict]:
+    """
+    Usuários dos ids informados, direto do Supabase (sem o cache do diretório).
+    Ao contrário de load_users, erros sobem: quem chama não pode tomar uma
+    falha por "usuário não existe".
+    """
+    client = await get_async_supabase()
+    users, assignments = [], []
+    for start in range(0, len(ids), _IDS_PER_QUERY):
+        chunk = ids[start:start + _IDS_PER_QUERY]
+        u, a = await asyncio.gather(
+            _fetch_all(lambda: client.table("users").select("*").in_("id", chunk)),
+            _fetch_all(lambda: client.table("plant_assignments").select("plant_id, user_id").in_("user_id", chunk)),
+        )
+        users += u
+        assignments += a
+    return _users_out(users, assignments)
+
+
+async def save_user(user: dict) -> dict:
+    """Versão assíncrona de supabase_storage.save_user"""
+    client = await get_async_supabase()
+    user_id = user.get("id")
+    plant_ids = user.get("plantIds", [])
+    user_data = _user_row(user)
+
+    if user_id:
+        response = await client.table("users").update(user_data).eq("id", user_id).execute()
+        saved = response.data[0] if response.data else user
+    else:
+        if "id" not in user_data:
+            user_data["id"] = str(uuid.uuid4())
+        response = await client.table("users").insert(user_data).execute()
+        saved = response.data[0] if response.data else user
+        user_id = saved["id"]
+
+    if plant_ids:
+        await client.table("plant_assignments").delete().eq("user_id", user_id).execute()
+        assignments_data = _user_assignment_rows(user_id, saved.get("role", ""), plant_ids)
+        if assignments_data:
+            await client.table("plant_assignments").insert(assignments_data).execute()
+
+    return saved
+
+
+async def delete_user(user_id: str) -> bool:
+    """Versão assíncrona de supabase_storage.delete_user"""
+    try:
+        client = await get_async_supabase()
+        await client.table("users").delete().eq("id", user_id).execute()
+        return True
+    except Exception as e:
+        log.warning("erro ao deletar usuário", extra={"user_id": user_id, "error": str(e)})
+        return False
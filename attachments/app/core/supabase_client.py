@@ -1,31 +1,68 @@
 # /attachments/app/core/supabase_client.py
 # Cliente Supabase para conexão com o banco de dados
+#
+# O cliente é criado no primeiro uso (get_supabase), não no import: o app sobe
+# mesmo sem SUPABASE_URL/SUPABASE_KEY (as rotas de JSON funcionam; as de
+# usuários falham com o erro abaixo) e cada worker não paga o import do
+# supabase-py antes de aceitar conexões. main.py pode aquecê-lo em segundo
+# plano (LOOPOS_SUPABASE_WARMUP).
 
 import os
-from supabase import create_client, Client
-from dotenv import load_dotenv
+import threading
 from pathlib import Path
+from typing import TYPE_CHECKING, Optional, Tuple
+
+import httpx
+from dotenv import load_dotenv
+
+from app.core import metrics
 
-# Carrega variáveis de ambiente
+if TYPE_CHECKING:
+    from supabase import Client
+
+# Carrega variáveis de ambiente (barato; as demais configurações LOOPOS_* também vêm daqui)
 env_path = Path(__file__).resolve().parents[3] / ".env"
 load_dotenv(env_path)
 
-# Configurações do Supabase
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+_client: Optional["Client"] = None
+_http = None
+_lock = threading.Lock()
+
+
+def settings() -> Tuple[str, str]:
+    """(SUPABASE_URL, SUPABASE_KEY) lidos do ambiente; ValueError se ausentes"""
+    url = os.getenv("SUPABASE_URL")
+    key = os.getenv("SUPABASE_KEY")
+    if not url or not key:
+        raise ValueError(
+            "SUPABASE_URL e SUPABASE_KEY devem estar configurados no arquivo .env\n"
+            "Crie um arquivo .env na raiz do projeto com:\n"
+            "SUPABASE_URL=https://seu-projeto.supabase.co\n"
+            "SUPABASE_KEY=sua-chave-anon-key"
+        )
+    return url, key
+
 
-if not SUPABASE_URL or not SUPABASE_KEY:
-    raise ValueError(
-        "SUPABASE_URL e SUPABASE_KEY devem estar configurados no arquivo .env\n"
-        "Crie um arquivo .env na raiz do projeto com:\n"
-        "SUPABASE_URL=https://seu-projeto.supabase.co\n"
-        "SUPABASE_KEY=sua-chave-anon-key"
-    )
+def get_supabase() -> "Client":
+    """Retorna o cliente Supabase (criado na primeira chamada)"""
+    global _client, _http
+    if _client is None:
+        with _lock:
+            if _client is None:
+                url, key = settings()
+                from supabase import ClientOptions, create_client
 
-# Cria o cliente Supabase
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+                # httpx próprio só para contar as chamadas em /api/metrics;
+                # timeout igual ao padrão do supabase-py para o PostgREST
+                _http = httpx.Client(timeout=120, event_hooks=metrics.supabase_hooks())
+                _client = create_client(url, key, options=ClientOptions(httpx_client=_http))
+    return _client
 
-def get_supabase() -> Client:
-    """Retorna o cliente Supabase"""
-    return supabase
 
+def reset_supabase():
+    """Descarta o cliente: o próximo get_supabase relê URL/chave do ambiente"""
+    global _client, _http
+    with _lock:
+        http, _client, _http = _http, None, None
+    if http is not None:
+        http.close()
@@ -1,58 +1,140 @@
 # /attachments/app/core/supabase_storage.py
 # Funções de persistência usando Supabase (substitui storage.py baseado em JSON)
 
-from typing import Any, List, Optional
-from supabase import Client
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
 from app.core.supabase_client import get_supabase
 import uuid
 
-def _get_client() -> Client:
+from app.core.log import get_logger
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+log = get_logger("supabase")
+
+# Ids por filtro in_() (mantém a URL abaixo do limite dos proxies)
+_IN_CHUNK = 200
+# Linhas por página (max-rows padrão do PostgREST no Supabase)
+_PAGE_SIZE = 1000
+
+def _get_client() -> "Client":
     """Retorna o cliente Supabase"""
     return get_supabase()
 
+def _fetch_all(build: Callable[[], Any]) -> List[dict]:
+    """
+    Executa a consulta paginando por range() até trazer todas as linhas.
+    Sempre termina a ordenação por id: sem ORDER BY total o Postgres não garante
+    a mesma ordem entre as páginas (linhas puladas ou repetidas).
+    """
+    rows = []
+    start = 0
+    while True:
+        response = build().order("id").range(start, start + _PAGE_SIZE - 1).execute()
+        page = response.data if response.data else []
+        rows.extend(page)
+        if len(page) < _PAGE_SIZE:
+            return rows
+        start += _PAGE_SIZE
+
+def _fetch_children(table: str, fk: str, ids: List[str], columns: str = "*", order: Optional[str] = None) -> Dict[str, List[dict]]:
+    """
+    Busca as linhas filhas de vários pais de uma vez e agrupa por fk.
+
+    Até _IN_CHUNK pais: uma consulta in_. Acima disso (cargas completas) a
+    tabela inteira é lida e filtrada aqui: uma requisição por _PAGE_SIZE linhas
+    filhas, em vez de uma consulta in_ a cada _IN_CHUNK pais.
+    """
+    grouped: Dict[str, List[dict]] = {i: [] for i in ids}
+    filtered = len(ids) <= _IN_CHUNK
+
+    def build():
+        q = _get_client().table(table).select(columns)
+        if filtered:
+            q = q.in_(fk, ids)
+        return q.order(order) if order else q
+
+    for row in _fetch_all(build):
+        if row[fk] in grouped:
+            grouped[row[fk]].append(row)
+    return grouped
+
 # ==================== USERS ====================
+# Conversões compartilhadas com a camada assíncrona (supabase_async.py)
+
+def _users_out(users: List[dict], assignments: List[dict]) -> List[dict]:
+    """Converte linhas de users para camelCase e preenche plantIds pelas atribuições"""
+    # Agrupa plantIds por user_id
+    user_plants = {}
+    for a in assignments:
+        user_id = a["user_id"]
+        plant_id = a["plant_id"]
+        if user_id not in user_plants:
+            user_plants[user_id] = []
+        user_plants[user_id].append(plant_id)
+    
+    # Converte para formato camelCase e adiciona plantIds
+    result = []
+    for user in users:
+        user_id = user["id"]
+        result.append({
+            "id": user_id,
+            "name": user["name"],
+            "username": user["username"],
+            "email": user.get("email"),
+            "phone": user.get("phone"),
+            "password": user.get("password"),  # Geralmente não retornado, mas mantido
+            "role": user["role"],
+            "can_login": user.get("can_login", True),
+            "supervisorId": user.get("supervisor_id"),
+            "plantIds": user_plants.get(user_id, []),
+        })
+    return result
+
+def _user_row(user: dict) -> dict:
+    """Converte camelCase para snake_case (sem plantIds e sem valores None)"""
+    user_data = {}
+    for key, value in user.items():
+        if value is None or key == "plantIds":
+            continue
+        if key == "supervisorId":
+            user_data["supervisor_id"] = value
+        else:
+            user_data[key] = value
+    return user_data
+
+def _user_assignment_rows(user_id: str, role: str, plant_ids: List[str]) -> List[dict]:
+    """Linhas de plant_assignments para os plantIds de um usuário"""
+    role = (role or "").upper()
+    
+    # Determina o role_type baseado no role do usuário
+    if role == "COORDINATOR" or role == "ADMIN":
+        role_type = "coordinator"
+    elif role == "SUPERVISOR":
+        role_type = "supervisor"
+    elif role == "TECHNICIAN" or role == "TÉCNICO":
+        role_type = "technician"
+    elif role == "ASSISTANT" or role == "AUXILIAR":
+        role_type = "assistant"
+    else:
+        return []
+    
+    return [
+        {"plant_id": plant_id, "user_id": user_id, "role_type": role_type}
+        for plant_id in plant_ids
+    ]
 
 def load_users() -> List[dict]:
     """Carrega todos os usuários do Supabase e adiciona plantIds baseado nas atribuições"""
     try:
-        response = _get_client().table("users").select("*").execute()
-        users = response.data if response.data else []
-        
-        # Carrega atribuições para preencher plantIds
-        assignments_response = _get_client().table("plant_assignments").select("plant_id, user_id").execute()
-        assignments = assignments_response.data if assignments_response.data else []
-        
-        # Agrupa plantIds por user_id
-        user_plants = {}
-        for a in assignments:
-            user_id = a["user_id"]
-            plant_id = a["plant_id"]
-            if user_id not in user_plants:
-                user_plants[user_id] = []
-            user_plants[user_id].append(plant_id)
+        users = _fetch_all(lambda: _get_client().table("users").select("*"))
         
-        # Converte para formato camelCase e adiciona plantIds
-        result = []
-        for user in users:
-            user_id = user["id"]
-            result.append({
-                "id": user_id,
-                "name": user["name"],
-                "username": user["username"],
-                "email": user.get("email"),
-                "phone": user.get("phone"),
-                "password": user.get("password"),  # Geralmente não retornado, mas mantido
-                "role": user["role"],
-                "can_login": user.get("can_login", True),
-                "supervisorId": user.get("supervisor_id"),
-                "plantIds": user_plants.get(user_id, []),
-            })
+        # Carrega atribuições para preencher plantIds (paginado: passa fácil do max-rows)
+        assignments = _fetch_all(lambda: _get_client().table("plant_assignments").select("plant_id, user_id"))
         
-        return result
+        return _users_out(users, assignments)
     except Exception as e:
-        print(f"⚠️ Erro ao carregar usuários: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("erro ao carregar usuários")
         return []
 
 def save_user(user: dict) -> dict:
@@ -61,15 +143,7 @@ def save_user(user: dict) -> dict:
     user_id = user.get("id")
     plant_ids = user.get("plantIds", [])  # Guarda plantIds antes de converter
     
-    # Converte camelCase para snake_case
-    user_data = {}
-    for key, value in user.items():
-        if value is None or key == "plantIds":
-            continue
-        if key == "supervisorId":
-            user_data["supervisor_id"] = value
-        else:
-            user_data[key] = value
+    user_data = _user_row(user)
     
     if user_id:
         # Atualiza usuário existente
@@ -89,31 +163,9 @@ def save_user(user: dict) -> dict:
         client.table("plant_assignments").delete().eq("user_id", user_id).execute()
         
         # Insere novas atribuições
-        assignments_data = []
-        role = saved.get("role", "").upper()
-        
-        # Determina o role_type baseado no role do usuário
-        if role == "COORDINATOR" or role == "ADMIN":
-            role_type = "coordinator"
-        elif role == "SUPERVISOR":
-            role_type = "supervisor"
-        elif role == "TECHNICIAN" or role == "TÉCNICO":
-            role_type = "technician"
-        elif role == "ASSISTANT" or role == "AUXILIAR":
-            role_type = "assistant"
-        else:
-            role_type = None
-        
-        if role_type:
-            for plant_id in plant_ids:
-                assignments_data.append({
-                    "plant_id": plant_id,
-                    "user_id": user_id,
-                    "role_type": role_type
-                })
-            
-            if assignments_data:
-                client.table("plant_assignments").insert(assignments_data).execute()
+        assignments_data = _user_assignment_rows(user_id, saved.get("role", ""), plant_ids)
+        if assignments_data:
+            client.table("plant_assignments").insert(assignments_data).execute()
     
     return saved
 
@@ -123,7 +175,7 @@ def delete_user(user_id: str) -> bool:
         _get_client().table("users").delete().eq("id", user_id).execute()
         return True
     except Exception as e:
-        print(f"⚠️ Erro ao deletar usuário: {e}")
+        log.warning("erro ao deletar usuário", extra={"user_id": user_id, "error": str(e)})
         return False
 
 # ==================== PLANTS ====================
@@ -131,27 +183,28 @@ def delete_user(user_id: str) -> bool:
 def load_plants() -> List[dict]:
     """Carrega todas as usinas do Supabase"""
     try:
-        response = _get_client().table("plants").select("*").execute()
-        plants = response.data if response.data else []
+        plants = _fetch_all(lambda: _get_client().table("plants").select("*"))
+        plant_ids = [p["id"] for p in plants]
+        
+        # Sub-usinas, ativos e atribuições de todas as usinas em lote
+        sub_plants = _fetch_children("sub_plants", "plant_id", plant_ids, order="sub_plant_number")
+        assets = _fetch_children("plant_assets", "plant_id", plant_ids, columns="id, plant_id, asset_name")
+        all_assignments = _fetch_children("plant_assignments", "plant_id", plant_ids)
         
-        # Carrega sub-usinas e ativos para cada usina
         for plant in plants:
             plant_id = plant["id"]
             
             # Sub-usinas
-            sub_response = _get_client().table("sub_plants").select("*").eq("plant_id", plant_id).order("sub_plant_number").execute()
             plant["subPlants"] = [
                 {"id": sp["sub_plant_number"], "inverterCount": sp["inverter_count"]}
-                for sp in (sub_response.data if sub_response.data else [])
+                for sp in sub_plants.get(plant_id, [])
             ]
             
             # Ativos
-            assets_response = _get_client().table("plant_assets").select("asset_name").eq("plant_id", plant_id).execute()
-            plant["assets"] = [a["asset_name"] for a in (assets_response.data if assets_response.data else [])]
+            plant["assets"] = [a["asset_name"] for a in assets.get(plant_id, [])]
             
             # Atribuições
-            assignments_response = _get_client().table("plant_assignments").select("*").eq("plant_id", plant_id).execute()
-            assignments = assignments_response.data if assignments_response.data else []
+            assignments = all_assignments.get(plant_id, [])
             
             plant["coordinatorId"] = next((a["user_id"] for a in assignments if a["role_type"] == "coordinator"), None)
             plant["supervisorIds"] = [a["user_id"] for a in assignments if a["role_type"] == "supervisor"]
@@ -160,7 +213,7 @@ def load_plants() -> List[dict]:
         
         return plants
     except Exception as e:
-        print(f"⚠️ Erro ao carregar usinas: {e}")
+        log.warning("erro ao carregar usinas", extra={"error": str(e)})
         return []
 
 def save_plant(plant: dict, assignments: Optional[dict] = None) -> dict:
@@ -259,19 +312,21 @@ def save_plant(plant: dict, assignments: Optional[dict] = None) -> dict:
 def load_os() -> List[dict]:
     """Carrega todas as OSs do Supabase"""
     try:
-        response = _get_client().table("os").select("*").order("created_at", desc=True).execute()
-        os_list = response.data if response.data else []
+        os_list = _fetch_all(lambda: _get_client().table("os").select("*").order("created_at", desc=True))
+        os_ids = [o["id"] for o in os_list]
+        
+        # Ativos, logs e anexos de todas as OSs em lote
+        assets = _fetch_children("os_assets", "os_id", os_ids, columns="id, os_id, asset_name")
+        logs = _fetch_children("os_logs", "os_id", os_ids, order="timestamp")
+        attachments = _fetch_children("os_image_attachments", "os_id", os_ids, order="uploaded_at")
         
-        # Carrega dados relacionados para cada OS
         for os_item in os_list:
             os_id = os_item["id"]
             
             # Ativos
-            assets_response = _get_client().table("os_assets").select("asset_name").eq("os_id", os_id).execute()
-            os_item["assets"] = [a["asset_name"] for a in (assets_response.data if assets_response.data else [])]
+            os_item["assets"] = [a["asset_name"] for a in assets.get(os_id, [])]
             
             # Logs
-            logs_response = _get_client().table("os_logs").select("*").eq("os_id", os_id).order("timestamp").execute()
             os_item["logs"] = [
                 {
                     "id": log["id"],
@@ -283,11 +338,10 @@ def load_os() -> List[dict]:
                         "to": log["status_to"]
                     } if log["status_from"] and log["status_to"] else None
                 }
-                for log in (logs_response.data if logs_response.data else [])
+                for log in logs.get(os_id, [])
             ]
             
             # Anexos de imagem
-            attachments_response = _get_client().table("os_image_attachments").select("*").eq("os_id", os_id).order("uploaded_at").execute()
             os_item["imageAttachments"] = [
                 {
                     "id": att["id"],
@@ -296,12 +350,12 @@ def load_os() -> List[dict]:
                     "uploadedBy": att["uploaded_by"],
                     "uploadedAt": att["uploaded_at"]
                 }
-                for att in (attachments_response.data if attachments_response.data else [])
+                for att in attachments.get(os_id, [])
             ]
         
         return os_list
     except Exception as e:
-        print(f"⚠️ Erro ao carregar OSs: {e}")
+        log.warning("erro ao carregar OSs", extra={"error": str(e)})
         return []
 
 def save_os(os_data: dict) -> dict:
@@ -376,7 +430,7 @@ def load_assignments(plant_id: str) -> dict:
         
         return result
     except Exception as e:
-        print(f"⚠️ Erro ao carregar atribuições: {e}")
+        log.warning("erro ao carregar atribuições", extra={"plant_id": plant_id, "error": str(e)})
         return {
             "coordinatorId": None,
             "supervisorIds": [],
@@ -1,76 +1,207 @@
 # /attachments/app/core/sync.py
-"""Módulo de sincronização entre users e plants assignments"""
+"""
+Módulo de sincronização entre users e plants assignments
 
-from app.core.storage import load_json, save_json
+Os usuários vêm do Supabase (quem chama passa a lista: diretório em cache nas
+rotas, supabase_storage.load_users() na linha de comando); users.json local
+não é a fonte de role/plantIds e não é lido aqui.
+"""
 
+import sys
+from typing import Dict, List, Optional
 
-def sync_assignments_from_users():
+from app.core.log import get_logger
+from app.core.storage import load_json, load_json_frozen, locked, save_json
+
+log = get_logger("sync")
+
+# Campo de assignments preenchido por cada papel (aceita inglês e português)
+_ROLE_FIELDS = {
+    "COORDINATOR": "coordinatorId",
+    "ADMIN": "coordinatorId",
+    "SUPERVISOR": "supervisorIds",
+    "TECHNICIAN": "technicianIds",
+    "TÉCNICO": "technicianIds",
+    "ASSISTANT": "assistantIds",
+    "AUXILIAR": "assistantIds",
+}
+
+_LIST_FIELDS = ("supervisorIds", "technicianIds", "assistantIds")
+
+# Documentos lidos/gravados juntos (lock entre threads e workers durante o read-modify-write)
+_DOCS = ("plants.json", "assignments.json")
+
+
+def _role_field(role: Optional[str]) -> Optional[str]:
+    return _ROLE_FIELDS.get((role or "").upper())
+
+
+def _empty_assignment() -> dict:
+    return {
+        'coordinatorId': '',
+        'supervisorIds': [],
+        'technicianIds': [],
+        'assistantIds': []
+    }
+
+
+def _derive_assignments(users: List[dict], plants: List[dict]) -> Dict[str, dict]:
+    """Assignments completos derivados de users.plantIds + role"""
+    assignments = {plant["id"]: _empty_assignment() for plant in plants}
+
+    for user in users:
+        field = _role_field(user.get('role'))
+        if field is None:
+            log.debug("role sem campo de assignments", extra={"user_id": user['id'], "role": user.get('role')})
+            continue
+        for plant_id in user.get('plantIds', []):
+            # ✅ Valida se plant_id existe
+            if plant_id not in assignments:
+                log.warning("plant_id inexistente em users.plantIds", extra={"user_id": user['id'], "plant_id": plant_id})
+                continue
+            if field == 'coordinatorId':
+                assignments[plant_id]['coordinatorId'] = user['id']
+            elif user['id'] not in assignments[plant_id][field]:
+                assignments[plant_id][field].append(user['id'])
+    return assignments
+
+
+def sync_assignments_from_users(users: List[dict]):
     """Reconstrói assignments.json baseado em users.plantIds (apenas se mudou)"""
     try:
-        users = load_json("users.json", [])
-        plants = load_json("plants.json", [])
-        
-        print(f"🔄 SYNC INICIADA - Usuários: {len(users)}, Plantas: {len(plants)}")
-        
-        # ✅ CARREGA assignments ATUAL
-        current_assignments = load_json("assignments.json", {})
-        
-        assignments = {}
-        
-        # Inicializa assignments para todas as plantas
-        plant_ids = {plant["id"] for plant in plants}
-        
-        for plant in plants:
-            assignments[plant["id"]] = {
-                'coordinatorId': '',
-                'supervisorIds': [],
-                'technicianIds': [],
-                'assistantIds': []
-            }
-        
-        # Preenche baseado em users.plantIds + role
-        for user in users:
-            role = user.get('role', '').upper()  # ✅ CONVERTE PARA UPPERCASE
-            
-            print(f"  - Processando {user.get('name')} (role: {user.get('role')} → {role}, plants: {user.get('plantIds', [])})")
-            
-            for plant_id in user.get('plantIds', []):
-                # ✅ Valida se plant_id existe
-                if plant_id not in plant_ids:
-                    print(f"    ⚠️ plant_id {plant_id} não existe!")
-                    continue
-                
-                # ✅ MATCHES AGORA: "Supervisor", "SUPERVISOR", "supervisor" todos funcionam
-                if role == 'COORDINATOR' or role == 'ADMIN':
-                    assignments[plant_id]['coordinatorId'] = user['id']
-                    print(f"    ✅ {user.get('name')} → COORDINATOR")
-                elif role == 'SUPERVISOR':
-                    if user['id'] not in assignments[plant_id]['supervisorIds']:
-                        assignments[plant_id]['supervisorIds'].append(user['id'])
-                    print(f"    ✅ {user.get('name')} → SUPERVISOR")
-                elif role == 'TECHNICIAN' or role == 'TÉCNICO':  # ✅ TAMBÉM ACEITA 'TÉCNICO' português
-                    if user['id'] not in assignments[plant_id]['technicianIds']:
-                        assignments[plant_id]['technicianIds'].append(user['id'])
-                    print(f"    ✅ {user.get('name')} → TECHNICIAN")
-                elif role == 'ASSISTANT' or role == 'AUXILIAR':  # ✅ TAMBÉM ACEITA 'AUXILIAR' português
-                    if user['id'] not in assignments[plant_id]['assistantIds']:
-                        assignments[plant_id]['assistantIds'].append(user['id'])
-                    print(f"    ✅ {user.get('name')} → ASSISTANT")
-                else:
-                    print(f"    ⚠️ Role desconhecido: {user.get('role')}")
-        
-        print(f"🔍 Novo assignments: {assignments}")
-        print(f"🔍 Assignments atual: {current_assignments}")
-        
-        # ✅ NOVO: Compara antes de salvar
-        if assignments != current_assignments:
-            save_json("assignments.json", assignments)
-            print("✅ assignments.json ATUALIZADO (mudanças detectadas)")
-        else:
-            # ✅ Sem mudanças = sem reescrever = sem reload
-            print("ℹ️  assignments.json já está sincronizado (nenhuma mudança)")
-        
+        with locked(*_DOCS):
+            plants = load_json("plants.json", [])
+
+            log.debug("sync completa", extra={"users": len(users), "plants": len(plants)})
+
+            assignments = _derive_assignments(users, plants)
+
+            # ✅ Compara antes de salvar
+            if assignments != load_json("assignments.json", {}):
+                save_json("assignments.json", assignments)
+                log.info("assignments.json atualizado pela sync completa")
+            else:
+                # ✅ Sem mudanças = sem reescrever = sem reload
+                log.debug("assignments.json já sincronizado")
+
     except Exception as e:
-        print(f"❌ Erro ao sincronizar assignments: {e}")
-        import traceback
-        traceback.print_exc()
\ No newline at end of file
+        log.exception("erro ao sincronizar assignments")
+
+
+def sync_user_assignments(user_id: str, before: Optional[dict], after: Optional[dict], users: List[dict]) -> List[str]:
+    """
+    Atualiza assignments.json só nas usinas afetadas pela mudança de um usuário.
+
+    before/after: estado do usuário antes e depois (None para criação/remoção);
+    apenas role e plantIds são usados. users: lista atual do Supabase, de onde
+    sai o substituto quando um coordenador deixa a usina. Retorna os ids das
+    usinas alteradas.
+    """
+    old_field = _role_field(before.get("role")) if before else None
+    new_field = _role_field(after.get("role")) if after else None
+    old_plants = set(before.get("plantIds") or []) if old_field else set()
+    new_plants = set(after.get("plantIds") or []) if new_field else set()
+
+    if old_field == new_field:
+        affected = old_plants ^ new_plants
+    else:
+        affected = old_plants | new_plants
+    if not affected:
+        return []
+
+    with locked(*_DOCS):
+        plant_ids = {p["id"] for p in load_json_frozen("plants.json", [])}
+        assignments = load_json("assignments.json", {})
+        changed = []
+
+        for plant_id in sorted(affected):
+            if plant_id not in plant_ids:
+                log.warning("plant_id inexistente em users.plantIds", extra={"user_id": user_id, "plant_id": plant_id})
+                continue
+            entry = assignments.setdefault(plant_id, _empty_assignment())
+            snapshot = {k: (list(v) if isinstance(v, list) else v) for k, v in entry.items()}
+
+            if plant_id in old_plants:
+                if old_field == "coordinatorId":
+                    if entry.get("coordinatorId") == user_id:
+                        entry["coordinatorId"] = _other_coordinator(users, plant_id, user_id)
+                elif user_id in entry.get(old_field, []):
+                    entry[old_field].remove(user_id)
+            if plant_id in new_plants:
+                if new_field == "coordinatorId":
+                    entry["coordinatorId"] = user_id
+                elif user_id not in entry.setdefault(new_field, []):
+                    entry[new_field].append(user_id)
+
+            if entry != snapshot:
+                changed.append(plant_id)
+
+        if changed:
+            save_json("assignments.json", assignments)
+            log.info("assignments.json atualizado", extra={"user_id": user_id, "plants": len(changed)})
+        return changed
+
+
+def _other_coordinator(users: List[dict], plant_id: str, leaving_id: str) -> str:
+    """Outro coordenador da usina (o último na ordem de users, como na sync completa)"""
+    coordinator = ''
+    for u in users:
+        if u["id"] != leaving_id and _role_field(u.get("role")) == "coordinatorId" and plant_id in (u.get("plantIds") or ()):
+            coordinator = u["id"]
+    return coordinator
+
+
+def check_assignments_consistency(users: List[dict], repair: bool = False) -> Dict[str, dict]:
+    """
+    Compara assignments.json com o derivado de users (lista do Supabase; ordem
+    das listas ignorada). Retorna {plant_id: {campo: {"missing": [...], "extra": [...]}}}
+    só para as usinas divergentes; com repair=True regrava o derivado.
+    """
+    with locked(*_DOCS):
+        expected = _derive_assignments(users, load_json("plants.json", []))
+        current = load_json("assignments.json", {})
+        report: Dict[str, dict] = {}
+
+        for plant_id in set(expected) | set(current):
+            exp = expected.get(plant_id)
+            cur = current.get(plant_id)
+            if exp is None or cur is None:
+                report[plant_id] = {"plant": {"missing": [plant_id] if cur is None else [], "extra": [plant_id] if exp is None else []}}
+                continue
+            diff = {}
+            if (exp.get("coordinatorId") or '') != (cur.get("coordinatorId") or ''):
+                diff["coordinatorId"] = {"missing": [exp["coordinatorId"]] if exp.get("coordinatorId") else [],
+                                         "extra": [cur["coordinatorId"]] if cur.get("coordinatorId") else []}
+            for field in _LIST_FIELDS:
+                e, c = set(exp.get(field) or []), set(cur.get(field) or [])
+                if e != c:
+                    diff[field] = {"missing": sorted(e - c), "extra": sorted(c - e)}
+            if diff:
+                report[plant_id] = diff
+
+        if repair and report:
+            save_json("assignments.json", expected)
+        return report
+
+
+if __name__ == "__main__":
+    # python -m app.core.sync check [--repair]
+    if len(sys.argv) < 2 or sys.argv[1] != "check":
+        print("uso: python -m app.core.sync check [--repair]")
+        sys.exit(2)
+    from app.core.supabase_storage import load_users
+
+    users = load_users()
+    if not users:
+        # load_users devolve [] em erro: reconstruir com isso apagaria todas as atribuições
+        print("❌ nenhum usuário carregado do Supabase (ver log); nada verificado")
+        sys.exit(2)
+    repair = "--repair" in sys.argv[2:]
+    result = check_assignments_consistency(users, repair=repair)
+    if not result:
+        print("✅ assignments.json consistente com os usuários do Supabase")
+    else:
+        for plant_id, diff in sorted(result.items()):
+            print(f"⚠️ {plant_id}: {diff}")
+        print("🔧 assignments.json reconstruído" if repair else "ℹ️  use --repair para reconstruir")
+        sys.exit(0 if repair else 1)
@@ -0,0 +1,77 @@
+# /attachments/app/core/thumbnails.py
+# Derivados redimensionados (miniatura / tamanho médio) dos anexos de imagem.
+# Gerados sob demanda na primeira requisição e guardados em
+# UPLOAD_ROOT/{os_id}/_derived/{att_id}-{variante}.jpg.
+#
+# Pillow é opcional: sem ele (ou para arquivos que não são imagem) o chamador
+# recebe None e serve o original. Falhas ficam marcadas em
+# _derived/{att_id}-{variante}.failed para não tentar (e logar) de novo a cada
+# requisição.
+
+from pathlib import Path
+from typing import Optional
+import uuid
+
+from app.core.log import get_logger
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow não instalado
+    Image = None
+
+# variante -> maior dimensão em pixels
+VARIANTS = {"thumb": 320, "medium": 1280}
+DERIVED_DIRNAME = "_derived"
+
+log = get_logger("thumbnails")
+
+
+def derived_path(os_dir: Path, att_id: str, variant: str) -> Path:
+    return os_dir / DERIVED_DIRNAME / f"{att_id}-{variant}.jpg"
+
+
+def _failed_marker(target: Path) -> Path:
+    return target.with_suffix(".failed")
+
+
+def ensure_derivative(original: Path, target: Path, variant: str) -> Optional[Path]:
+    """Gera (se ainda não existir) o derivado de original em target"""
+    if Image is None:
+        return None
+    mtime = original.stat().st_mtime
+    if target.exists() and target.stat().st_mtime >= mtime:
+        return target
+    marker = _failed_marker(target)
+    if marker.exists() and marker.stat().st_mtime >= mtime:
+        return None
+
+    size = VARIANTS[variant]
+    try:
+        with Image.open(original) as im:
+            im = ImageOps.exif_transpose(im)  # fotos de celular vêm rotacionadas via EXIF
+            im.thumbnail((size, size))
+            if im.mode not in ("RGB", "L"):
+                im = im.convert("RGB")
+            target.parent.mkdir(parents=True, exist_ok=True)
+            tmp = target.with_name(f".{uuid.uuid4().hex}.tmp")
+            im.save(tmp, "JPEG", quality=82, optimize=True, progressive=True)
+        tmp.replace(target)
+        return target
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        # Não é imagem, formato não suportado ou grande demais: serve o original
+        log.info("derivado indisponível, servindo o original", extra={"file": original.name, "variant": variant, "error": str(e)})
+        try:
+            marker.parent.mkdir(parents=True, exist_ok=True)
+            marker.touch()
+        except OSError:
+            pass
+        return None
+
+
+def remove_derivatives(os_dir: Path, att_id: str):
+    """Apaga todos os derivados de um anexo"""
+    for p in (os_dir / DERIVED_DIRNAME).glob(f"{att_id}-*"):
+        try:
+            p.unlink()
+        except OSError:
+            pass
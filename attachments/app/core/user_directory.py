@@ -0,0 +1,103 @@
+# /attachments/app/core/user_directory.py
+# Cache em memória dos usuários do Supabase com índices por id e por username
+# (case-insensitive). Recarrega após USER_DIRECTORY_TTL segundos (padrão 30) e
+# é invalidado a cada save_user/delete_user feito por este módulo e quando outro
+# worker grava usuários (changes.on_external_change, em routes/users.py).
+#
+# Uma invalidação durante uma carga em andamento (a escrita pode ter chegado
+# depois da leitura) não deixa o resultado valer pelo TTL: _generation muda e
+# a carga é usada só até a próxima consulta.
+#
+# Os dicts devolvidos são compartilhados entre requisições: não altere-os,
+# crie cópias ({**user, ...}).
+
+import asyncio
+import os
+import time
+from typing import Dict, List, Optional, Set
+
+from app.core import supabase_async
+
+
+def _ttl() -> float:
+    try:
+        return float(os.getenv("USER_DIRECTORY_TTL", "30"))
+    except ValueError:
+        return 30.0
+
+
+class UserDirectory:
+    def __init__(self, ttl: Optional[float] = None):
+        self.ttl = _ttl() if ttl is None else ttl
+        self._users: List[dict] = []
+        self._by_id: Dict[str, dict] = {}
+        self._by_username: Dict[str, Set[str]] = {}
+        self._loaded_at: Optional[float] = None
+        self._generation = 0
+        self._lock: Optional[asyncio.Lock] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _fresh(self) -> bool:
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl
+
+    def _get_lock(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._loop is not loop:
+            self._lock, self._loop = asyncio.Lock(), loop
+        return self._lock
+
+    async def _ensure_fresh(self):
+        if self._fresh():
+            return
+        # Uma única recarga mesmo com várias requisições esperando
+        async with self._get_lock():
+            if not self._fresh():
+                generation = self._generation
+                self._rebuild(await supabase_async.load_users(), generation)
+
+    def _rebuild(self, users: List[dict], generation: int):
+        by_id: Dict[str, dict] = {}
+        by_username: Dict[str, Set[str]] = {}
+        for u in users:
+            by_id[u["id"]] = u
+            by_username.setdefault((u.get("username") or "").lower(), set()).add(u["id"])
+        self._users, self._by_id, self._by_username = users, by_id, by_username
+        # load_users devolve [] em caso de erro: não prende a lista vazia pelo TTL
+        fresh = users and generation == self._generation
+        self._loaded_at = time.monotonic() if fresh else None
+
+    def invalidate(self):
+        self._generation += 1
+        self._loaded_at = None
+
+    # ---------- consultas ----------
+
+    async def all(self) -> List[dict]:
+        await self._ensure_fresh()
+        return self._users
+
+    async def get(self, user_id: str) -> Optional[dict]:
+        await self._ensure_fresh()
+        return self._by_id.get(user_id)
+
+    async def username_exists(self, username: str, *, skip_id: Optional[str] = None) -> bool:
+        await self._ensure_fresh()
+        ids = self._by_username.get(username.lower(), ())
+        return any(i != skip_id for i in ids)
+
+    # ---------- escrita (invalida o cache) ----------
+
+    async def save_user(self, user: dict) -> dict:
+        try:
+            return await supabase_async.save_user(user)
+        finally:
+            self.invalidate()
+
+    async def delete_user(self, user_id: str) -> bool:
+        try:
+            return await supabase_async.delete_user(user_id)
+        finally:
+            self.invalidate()
+
+
+directory = UserDirectory()
@@ -2,22 +2,110 @@
 # App FastAPI principal — adiciona rotas de usuários e usinas.
 # Mantém suas rotas existentes (OS, anexos etc) e inclui os novos routers.
 
-from fastapi import FastAPI, UploadFile, File, Form
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from starlette.concurrency import run_in_threadpool
 from typing import List
 from pathlib import Path
 from datetime import datetime
+import asyncio
 import os
+import re
+import signal
+import threading
 import uuid
 
 # Routers do pacote (ajuste conforme sua estrutura: app/routes/*.py)
 from app.core.schemas import UserCreate, UserOut
 from app.routes.users import router as users_router
 from app.routes.plants import router as plants_router
+from app.core.blob_store import AttachmentFiles, attachment_names, find_attachment, migrate_legacy, release, save_upload
+from app.core.thumbnails import VARIANTS, derived_path, ensure_derivative, remove_derivatives
+from app.core import supabase_async
+from app.core.supabase_async import close_async_supabase
+from app.core.user_directory import directory
+from app.core import changes, log, metrics
+from app.core.storage import data_path
+from app.core.compression import CompressionMiddleware
+from app.core.profiling import ProfilingMiddleware
+from app.routes.profiles import router as profiles_router, authorize_scope
+from contextlib import asynccontextmanager
+
+
+# Prontidão do worker (GET /api/ready): só após o startup e até o shutdown
+_state = {"ready": False}
+
+
+def _not_ready_on_exit() -> dict:
+    """
+    Marca o worker como não pronto já no SIGTERM/SIGINT.
+
+    O shutdown do lifespan só roda depois que as conexões terminam; sem isso o
+    /api/ready seguiria 200 durante todo o encerramento gracioso. O handler do
+    uvicorn (já instalado quando o lifespan começa) continua sendo chamado.
+    Retorna os handlers anteriores, para restaurar no shutdown.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return {}  # sinais só no thread principal (ex.: TestClient)
+    previous = {}
+
+    def handler(sig, frame):
+        _state["ready"] = False
+        chained = previous.get(sig)
+        if callable(chained):
+            chained(sig, frame)
+        elif chained == signal.SIG_DFL:
+            signal.signal(sig, signal.SIG_DFL)
+            signal.raise_signal(sig)
+
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        previous[sig] = signal.signal(sig, handler)
+    return previous
+
+
+async def _warm_up():
+    # Cliente Supabase + primeira carga do cache de usuários, sem segurar o startup
+    if await supabase_async.warm_up():
+        await directory.all()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Publica no SSE/WebSocket deste worker as mudanças gravadas por outros workers
+    tasks = [asyncio.create_task(changes.watch())]
+    # LOOPOS_SUPABASE_WARMUP=0 deixa o cliente para a primeira requisição de usuários
+    if os.getenv("LOOPOS_SUPABASE_WARMUP", "1").strip().lower() not in ("0", "false", "no", "off"):
+        tasks.append(asyncio.create_task(_warm_up()))
+    # Layout antigo de blobs (dentro de /files): move uma vez, antes de aceitar tráfego
+    await run_in_threadpool(migrate_legacy, UPLOAD_ROOT)
+    previous_handlers = _not_ready_on_exit()
+    _state["ready"] = True
+    yield
+    _state["ready"] = False
+    for sig, handler in previous_handlers.items():
+        signal.signal(sig, handler)
+    for task in tasks:
+        task.cancel()
+    # Fecha o pool HTTP compartilhado do Supabase
+    await close_async_supabase()
+
+
+# Logging por nível (LOOPOS_LOG_LEVEL / LOOPOS_LOG_FORMAT, ver app/core/log.py)
+log.configure()
 
 # Cria o app
-app = FastAPI(title="LoopOS Attachments API", version="1.0.0")
+app = FastAPI(title="LoopOS Attachments API", version="1.0.0", lifespan=lifespan)
+
+# gzip/brotli acima de um tamanho mínimo (ver app/core/compression.py); fica
+# por dentro das métricas e do profiling para que o custo apareça neles
+app.add_middleware(CompressionMiddleware)
+
+# Latência por rota, requisições em andamento etc. (expostas em /api/metrics)
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Profiling sob demanda: header X-Profile: 1 + Admin (ver app/core/profiling.py)
+app.add_middleware(ProfilingMiddleware, authorize=authorize_scope)
 
 # CORS amplo para desenvolvimento (restrinja em produção)
 ALLOWED_ORIGINS = [
@@ -37,20 +125,33 @@ app.add_middleware(
 )
 
 # Rotas de OS (mantém seu módulo existente na raiz de /attachments)
-from os_api import router as os_router  # os_api.py na raiz de /attachments
+from os_api import router as os_router, os_records  # os_api.py na raiz de /attachments
 app.include_router(os_router)
 
 # Novas rotas
 app.include_router(users_router)
 app.include_router(plants_router)
 
+# Sync incremental (GET /api/changes?since=)
+from app.routes.changes import router as changes_router
+app.include_router(changes_router)
+
+# Push de mudanças (SSE em /api/events, WebSocket em /api/events/ws)
+from app.routes.events import router as events_router
+app.include_router(events_router)
+
+# Perfis gravados pelo ProfilingMiddleware
+app.include_router(profiles_router)
+
 # Arquivos estáticos (anexos)
 UPLOAD_ROOT = Path(os.getenv(
     "NEXTCLOUD_ATTACHMENTS_DIR",
     r"C:\Users\leona\Nextcloud\06. OPERAÇÃO\03. Tempo Real\LoopOS\LOOPOS\attachments"
 ))
 UPLOAD_ROOT.mkdir(parents=True, exist_ok=True)
-app.mount("/files", StaticFiles(directory=UPLOAD_ROOT), name="files")
+# Blobs deduplicados ficam fora da raiz servida (LOOPOS_BLOBS_DIR, ver blob_store.py);
+# migrate_legacy roda no startup (lifespan), não a cada import
+app.mount("/files", AttachmentFiles(directory=UPLOAD_ROOT), name="files")
 
 
 @app.get("/api/health")
@@ -58,7 +159,36 @@ def health():
     return {"ok": True}
 
 
+def _storage_ready():
+    # data/ acessível para escrita e journal de OS carregado neste worker
+    data_dir = data_path("")
+    if not os.access(data_dir, os.W_OK):
+        raise RuntimeError(f"{data_dir} sem permissão de escrita")
+    os_records([])
+
+
+@app.get("/api/ready")
+async def ready():
+    """Readiness probe: 503 enquanto o worker inicia/encerra ou se o armazenamento falhar"""
+    if not _state["ready"]:
+        return JSONResponse({"ready": False, "detail": "starting or shutting down"}, status_code=503)
+    try:
+        await run_in_threadpool(_storage_ready)
+    except Exception as e:
+        return JSONResponse({"ready": False, "detail": str(e)}, status_code=503)
+    return {"ready": True, "pid": os.getpid()}
+
+
+@app.get("/api/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Métricas deste processo no formato de texto do Prometheus"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
 # Upload de anexos (gravando em /files/{os_id}/<arquivo>)
+# Cada arquivo é gravado numa thread (sem bloquear o event loop) e todos os
+# arquivos da requisição são processados em paralelo. O conteúdo é deduplicado
+# por SHA-256 fora de UPLOAD_ROOT (ver app/core/blob_store.py).
 @app.post("/api/os/{os_id}/attachments")
 async def upload_attachments(
     os_id: str,
@@ -66,41 +196,48 @@ async def upload_attachments(
     captions: List[str] = Form([])
 ):
     dest = UPLOAD_ROOT / os_id
-    dest.mkdir(parents=True, exist_ok=True)
-    saved = []
 
-    for i, uf in enumerate(files):
+    async def _save(i: int, uf: UploadFile) -> dict:
         ext = Path(uf.filename).suffix or ".bin"
         att_id = f"img-{uuid.uuid4().hex}"
         fname = f"{att_id}{ext}"
-        fpath = dest / fname
-
-        with open(fpath, "wb") as out:
-            while True:
-                chunk = await uf.read(1024 * 1024)
-                if not chunk:
-                    break
-                out.write(chunk)
-
-        caption = captions[i] if i < len(captions) else ""
-        saved.append({
+        await run_in_threadpool(save_upload, UPLOAD_ROOT, uf.file, dest / fname)
+        return {
             "id": att_id,
             "url": f"/files/{os_id}/{fname}",
-            "caption": caption,
+            "caption": captions[i] if i < len(captions) else "",
             "uploadedAt": datetime.utcnow().isoformat() + "Z",
-        })
+        }
 
-    return saved
+    return await asyncio.gather(*(_save(i, uf) for i, uf in enumerate(files)))
+
+
+# Derivados de imagem (miniatura / médio), gerados na primeira requisição.
+# Anexos nunca mudam de conteúdo (id novo a cada upload), então o cache é longo.
+_ATT_ID_RE = re.compile(r"^[A-Za-z0-9_-]+$")
+_IMMUTABLE_CACHE = {"Cache-Control": "public, max-age=31536000, immutable"}
+
+@app.get("/api/os/{os_id}/attachments/{att_id}/{variant}")
+def get_attachment_variant(os_id: str, att_id: str, variant: str):
+    if variant not in VARIANTS or not _ATT_ID_RE.match(att_id) or not _ATT_ID_RE.match(os_id):
+        raise HTTPException(404, "Attachment not found")
+    dirp = UPLOAD_ROOT / os_id
+    original = find_attachment(UPLOAD_ROOT, os_id, att_id)
+    if original is None:
+        raise HTTPException(404, "Attachment not found")
+    path = ensure_derivative(original, derived_path(dirp, att_id, variant), variant) or original
+    return FileResponse(path, headers=_IMMUTABLE_CACHE)
 
 
 # Remoção de anexo por ID (apaga qualquer extensão)
 @app.delete("/api/os/{os_id}/attachments/{att_id}")
 def delete_attachment(os_id: str, att_id: str):
     dirp = UPLOAD_ROOT / os_id
+    for name in attachment_names(UPLOAD_ROOT, os_id, att_id):
+        try:
+            release(UPLOAD_ROOT, dirp / name)
+        except:
+            pass
     if dirp.exists():
-        for p in dirp.glob(f"{att_id}.*"):
-            try:
-                p.unlink()
-            except:
-                pass
+        remove_derivatives(dirp, att_id)
     return {"ok": True}
\ No newline at end of file
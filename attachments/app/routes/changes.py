@@ -0,0 +1,87 @@
+# /attachments/app/routes/changes.py
+# Sync incremental: GET /api/changes?since=<seq> devolve só o que foi criado,
+# alterado ou removido depois de `seq` (ver app/core/changes.py). Sem `since`,
+# ou quando o histórico não cobre mais o `since` pedido, devolve tudo com
+# reset=true.
+#
+# Usuários alterados vêm direto do Supabase, não do cache do diretório (que
+# pode estar atrás da seq neste worker): a seq avança além da mudança, então
+# devolver a versão velha a perderia de vez. Remoções passam pelo RBAC como
+# as tombstones do stream de eventos.
+from fastapi import APIRouter, HTTPException, Query, Request
+from typing import Dict, List, Optional
+from starlette.concurrency import run_in_threadpool
+
+from app.core import supabase_async
+from app.core.changes import changes_since, deleted_records
+from app.core.events import can_view_tombstone
+from app.core.log import get_logger
+from app.core.rbac import can_view_user
+from app.core.schemas import ChangesOut
+from app.routes.plants import plant_records, assignment_records
+from app.routes.users import actor_for, visible_users
+from os_api import os_records
+
+router = APIRouter(prefix="/api/changes", tags=["changes"])
+log = get_logger("changes")
+
+
+def _local_records(changed: Optional[dict]):
+    """plants, os e assignments (arquivos locais) — todos, ou só os alterados"""
+    if changed is None:
+        return plant_records(), os_records(), assignment_records()
+    puts = {kind: [i for i, op in ops.items() if op == "put"] for kind, ops in changed.items()}
+    return (
+        plant_records(puts["plants"]) if puts["plants"] else [],
+        os_records(puts["os"]) if puts["os"] else [],
+        assignment_records(puts["assignments"]) if puts["assignments"] else {},
+    )
+
+
+async def _changed_users(actor: dict, ids: List[str]) -> List[dict]:
+    try:
+        users = await supabase_async.load_users_by_ids(ids)
+    except Exception:
+        # Sem os usuários, a resposta não pode avançar a seq: o cliente tenta de novo
+        log.exception("erro ao carregar usuários alterados", extra={"users": len(ids)})
+        raise HTTPException(status_code=503, detail="users unavailable")
+    return [u for u in users if can_view_user(actor, u)]
+
+
+def _visible_deletes(actor: dict, changed: dict) -> Dict[str, List[str]]:
+    deleted = {}
+    for kind, ops in changed.items():
+        ids = [i for i, op in ops.items() if op == "delete"]
+        if not ids:
+            continue
+        before = deleted_records(kind, ids)
+        visible = [i for i in ids if can_view_tombstone(actor, kind, i, before.get(i))]
+        if visible:
+            deleted[kind] = visible
+    return deleted
+
+
+@router.get("", response_model=ChangesOut)
+async def get_changes(request: Request, since: Optional[int] = Query(None, ge=0)):
+    # A seq é lida antes dos dados: uma escrita concorrente pode vir repetida
+    # na próxima chamada, mas nunca se perde.
+    seq, reset, changed = changes_since(since)
+    if reset:
+        users = await visible_users(request)
+        plants, os_items, assignments = await run_in_threadpool(_local_records, None)
+        deleted = {}
+    else:
+        actor = await actor_for(request)
+        user_ids = [i for i, op in changed["users"].items() if op == "put"]
+        users = await _changed_users(actor, user_ids) if user_ids else []
+        plants, os_items, assignments = await run_in_threadpool(_local_records, changed)
+        deleted = _visible_deletes(actor, changed)
+    return {
+        "seq": seq,
+        "reset": reset,
+        "users": users,
+        "plants": plants,
+        "os": os_items,
+        "assignments": assignments,
+        "deleted": deleted,
+    }
@@ -0,0 +1,83 @@
+# /attachments/app/routes/events.py
+# Push de mudanças (OS, usinas, atribuições, usuários) via Server-Sent Events
+# ou WebSocket, a partir do hub de app/core/events.py. Cada mensagem é um JSON:
+#   {"type": "change", "seq", "kind", "id", "op", "data"}
+#   {"type": "resync", "since"}  → cliente atrasado: GET /api/changes?since=...
+# EventSource não envia headers: o ator pode vir em ?userId=.
+import asyncio
+import json
+from typing import Optional
+
+from fastapi import APIRouter, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+
+from app.core.events import hub
+from app.routes.users import actor_for
+
+router = APIRouter(prefix="/api/events", tags=["events"])
+
+_HEARTBEAT = 15.0  # segundos entre comentários de keep-alive no SSE
+
+
+def _sse(event: dict) -> str:
+    data = json.dumps(event, ensure_ascii=False, separators=(",", ":"))
+    if event.get("type") == "change":
+        return f"id: {event['seq']}\nevent: change\ndata: {data}\n\n"
+    return f"event: {event['type']}\ndata: {data}\n\n"
+
+
+@router.get("")
+async def stream_events(request: Request, userId: Optional[str] = None):
+    actor = await actor_for(request, userId)
+    sub = hub.subscribe(actor)
+
+    async def gen():
+        try:
+            # Reconexão do EventSource: o que se perdeu vem por /api/changes
+            last_id = request.headers.get("last-event-id")
+            if last_id and last_id.isdigit():
+                yield _sse({"type": "resync", "since": int(last_id)})
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(sub.get(), timeout=_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                yield _sse(event)
+        finally:
+            hub.unsubscribe(sub)
+
+    return StreamingResponse(
+        gen(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.websocket("/ws")
+async def events_ws(websocket: WebSocket, userId: Optional[str] = None):
+    await websocket.accept()
+    sub = hub.subscribe(await actor_for(websocket, userId))
+
+    async def wait_disconnect():
+        # Mensagens do cliente são ignoradas; só importa perceber o fechamento
+        try:
+            while True:
+                await websocket.receive_text()
+        except WebSocketDisconnect:
+            pass
+
+    closed = asyncio.ensure_future(wait_disconnect())
+    try:
+        while True:
+            getter = asyncio.ensure_future(sub.get())
+            done, _ = await asyncio.wait({getter, closed}, return_when=asyncio.FIRST_COMPLETED)
+            if getter not in done:
+                getter.cancel()
+                break
+            await websocket.send_text(json.dumps(getter.result(), ensure_ascii=False))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        closed.cancel()
+        hub.unsubscribe(sub)
@@ -1,19 +1,34 @@
 # /attachments/app/routes/plants.py
 from fastapi import APIRouter, HTTPException
-from typing import List, Dict
+from typing import List, Dict, Set
 from uuid import uuid4
-from app.core.storage import load_json, save_json
-from app.core.schemas import PlantCreate, PlantUpdate, PlantOut, AssignmentsPayload
-from app.core.sync import sync_assignments_from_users
+from app.core.storage import load_json, load_json_frozen, locked, save_json
+from app.core.schemas import (
+    PlantCreate, PlantUpdate, PlantOut, AssignmentsPayload, AssignmentsBatchItem, BatchItemResult,
+)
+from app.core import changes, metrics
+from app.core.fastjson import FastJSONResponse, record_projector
+from app.core.log import get_logger
 
 router = APIRouter(prefix="/api/plants", tags=["plants"])
 _PLANTS_FILE = "plants.json"
 _ASSIGN_FILE = "assignments.json"
 _USERS_FILE  = "users.json"
 
+log = get_logger("plants")
+
+def _locked():
+    # Serializa o read-modify-write de plants.json + assignments.json + users.json
+    # entre threads e entre workers (uvicorn --workers N)
+    return locked(_PLANTS_FILE, _ASSIGN_FILE, _USERS_FILE)
+
 def _all_plants() -> List[dict]:
     return load_json(_PLANTS_FILE, [])
 
+def _plant_exists(plant_id: str) -> bool:
+    # Visão somente leitura do cache: evita copiar plants.json só para checar o id
+    return any(p["id"] == plant_id for p in load_json_frozen(_PLANTS_FILE, []))
+
 def _save_plants(plants: List[dict]):
     save_json(_PLANTS_FILE, plants)
 
@@ -29,93 +44,146 @@ def _all_users() -> List[dict]:
 def _save_users(users: List[dict]):
     save_json(_USERS_FILE, users)
 
+# Registro de plants.json -> formato PlantOut (sem revalidar com Pydantic)
+_plant_out = record_projector(PlantOut)
+
+def plant_records(ids=None) -> List[dict]:
+    """Usinas (todas, ou só as dos ids informados que existirem)"""
+    if ids is None:
+        return _all_plants()
+    wanted = set(ids)
+    return [p for p in _all_plants() if p["id"] in wanted]
+
+def assignment_records(ids=None) -> Dict[str, dict]:
+    """Atribuições por usina (todas, ou só as dos ids informados que existirem)"""
+    assignments = load_json(_ASSIGN_FILE, {})
+    if ids is None:
+        return assignments
+    return {pid: assignments[pid] for pid in ids if pid in assignments}
+
+# Eventos de usinas/atribuições gravadas por outros workers levam o registro atual
+changes.register_loader("plants", lambda ids: {p["id"]: p for p in plant_records(ids)})
+changes.register_loader("assignments", assignment_records)
+
+# Índice reverso usina -> ids de usuários, derivado de users.json. Reconstruído
+# só quando a visão em cache de users.json muda (save_json ou alteração externa).
+_members_cache = (None, {})
+
+# Métricas de _sync_user_plant_links
+_SYNC_STATS = {"syncs": 0, "users_touched": 0, "writes_skipped": 0, "last_users_touched": 0}
+
+def _plant_members() -> Dict[str, Set[str]]:
+    global _members_cache
+    users = load_json_frozen(_USERS_FILE, [])
+    cached_users, index = _members_cache
+    if cached_users is not users:
+        index = {}
+        for u in users:
+            for pid in u.get("plantIds") or ():
+                index.setdefault(pid, set()).add(u["id"])
+        _members_cache = (users, index)
+    return index
+
+def sync_stats() -> dict:
+    """Contadores de _sync_user_plant_links (para métricas)"""
+    return dict(_SYNC_STATS)
+
+metrics.collector(
+    "loopos_plant_user_sync",
+    "Sincronização users.plantIds a partir das atribuições (syncs, users_touched, writes_skipped, last_users_touched)",
+    lambda: {(k,): v for k, v in sync_stats().items()},
+    labels=("stat",),
+)
+
 def _sync_user_plant_links(plant_id: str, ap: AssignmentsPayload):
-    users = _all_users()
-    for u in users:
-        ids = set(u.get("plantIds", []))
-        in_assign = (
-            (u["id"] == (ap.coordinatorId or "")) or
-            (u["id"] in ap.supervisorIds) or
-            (u["id"] in ap.technicianIds) or
-            (u["id"] in ap.assistantIds)
-        )
-        old_ids = ids.copy()
-        if in_assign: ids.add(plant_id)
-        else: ids.discard(plant_id)
-        
-        # ✅ LOG MELHORADO
-        if ids != old_ids:
-            action = "adicionado" if plant_id in ids else "removido"
-            print(f"✅ Plant {plant_id} {action} de plantIds de {u.get('name')} (id: {u['id']})")
-        
-        u["plantIds"] = list(ids)
-    _save_users(users)
+    """Atualiza users.plantIds só para quem entrou ou saiu da usina"""
+    _sync_user_plant_links_many({plant_id: ap})
 
+def _sync_user_plant_links_many(updates: Dict[str, AssignmentsPayload]):
+    """Como _sync_user_plant_links, para várias usinas com uma única gravação de users.json"""
+    members = _plant_members()
+    to_add: Dict[str, Set[str]] = {}     # user_id -> usinas a incluir
+    to_remove: Dict[str, Set[str]] = {}  # user_id -> usinas a retirar
+    for plant_id, ap in updates.items():
+        target = set(ap.supervisorIds) | set(ap.technicianIds) | set(ap.assistantIds)
+        if ap.coordinatorId:
+            target.add(ap.coordinatorId)
+        current = members.get(plant_id, set())
+        for uid in target - current:
+            to_add.setdefault(uid, set()).add(plant_id)
+        for uid in current - target:
+            to_remove.setdefault(uid, set()).add(plant_id)
 
-@router.get("", response_model=List[PlantOut])
-def list_plants():
-    plants = _all_plants()
-    assignments = _all_assignments()
-    
-    print(f"DEBUG - plants count: {len(plants)}")
-    print(f"DEBUG - assignments: {assignments}")
-    
-    # ✅ ENRIQUECER CADA PLANTA COM ATRIBUIÇÕES
-    for plant in plants:
-        plant_id = plant.get("id")
-        plant_assigns = assignments.get(plant_id, {})
-        
-        print(f"DEBUG - plant_id: {plant_id}")
-        print(f"DEBUG - plant_assigns ANTES: {plant_assigns}")
-        
-        plant["coordinatorId"] = plant_assigns.get("coordinatorId", "")
-        plant["supervisorIds"] = plant_assigns.get("supervisorIds", [])
-        plant["technicianIds"] = plant_assigns.get("technicianIds", [])
-        plant["assistantIds"] = plant_assigns.get("assistantIds", [])
-        
-        print(f"DEBUG - plant_assigns DEPOIS: {plant}")
-    
-    print(f"DEBUG - Retornando plants: {plants}")  # ✅ ADICIONE ISTO!
-    return plants
+    _SYNC_STATS["syncs"] += 1
+    touched = 0
+    if to_add or to_remove:
+        users = _all_users()
+        for u in users:
+            adding, removing = to_add.get(u["id"], set()), to_remove.get(u["id"], set())
+            ids = u.get("plantIds") or []
+            new_ids = [pid for pid in ids if pid not in removing]
+            new_ids += sorted(pid for pid in adding if pid not in ids)
+            if new_ids == ids:
+                continue
+            u["plantIds"] = new_ids
+            touched += 1
+            log.debug("plantIds atualizado", extra={"user_id": u["id"], "added": sorted(adding), "removed": sorted(removing)})
+        if touched:
+            _save_users(users)
 
+    _SYNC_STATS["users_touched"] += touched
+    _SYNC_STATS["last_users_touched"] = touched
+    if not touched:
+        _SYNC_STATS["writes_skipped"] += 1
 
 
+@router.get("", response_model=List[PlantOut])
+def list_plants():
+    # Atribuições NÃO entram na resposta (o PlantOut nunca as expôs; o front
+    # usa /{plant_id}/assignments). Lê a visão congelada, sem cópia, e serializa
+    # direto: plants.json já foi validado na escrita.
+    plants = load_json_frozen(_PLANTS_FILE, [])
+    log.debug("plants listadas", extra={"plants": len(plants)})
+    return FastJSONResponse([_plant_out(p) for p in plants])
 
 
 @router.post("", response_model=PlantOut, status_code=201)
 def create_plant(payload: PlantCreate):
-    plants = _all_plants()
-    plant = payload.dict()
-    plant["id"] = str(uuid4())
-    plants.append(plant)
-    _save_plants(plants)
-    
-    # ✅ INICIALIZE assignments PRIMEIRO
-    assignments = _all_assignments()
-    
-    coordinatorId = getattr(payload, 'coordinatorId', None) or ""
-    supervisorIds = getattr(payload, 'supervisorIds', None) or []
-    technicianIds = getattr(payload, 'technicianIds', None) or []
-    assistantIds = getattr(payload, 'assistantIds', None) or []
-
-    ap = AssignmentsPayload(
-        coordinatorId=coordinatorId,
-        supervisorIds=supervisorIds,
-        technicianIds=technicianIds,
-        assistantIds=assistantIds,
-    )
-    assignments[plant["id"]] = ap.dict()
-    _save_assignments(assignments)  # ✅ CRÍTICO!
-    _sync_user_plant_links(plant["id"], ap)
+    with _locked():
+        plants = _all_plants()
+        plant = payload.dict()
+        plant["id"] = str(uuid4())
+        plants.append(plant)
+        _save_plants(plants)
 
-    # ✅ UM ÚNICO RETURN
-    return {
-        **plant,
-        "coordinatorId": coordinatorId,
-        "supervisorIds": supervisorIds,
-        "technicianIds": technicianIds,
-        "assistantIds": assistantIds,
-    }
+        # ✅ INICIALIZE assignments PRIMEIRO
+        assignments = _all_assignments()
+
+        coordinatorId = getattr(payload, 'coordinatorId', None) or ""
+        supervisorIds = getattr(payload, 'supervisorIds', None) or []
+        technicianIds = getattr(payload, 'technicianIds', None) or []
+        assistantIds = getattr(payload, 'assistantIds', None) or []
+
+        ap = AssignmentsPayload(
+            coordinatorId=coordinatorId,
+            supervisorIds=supervisorIds,
+            technicianIds=technicianIds,
+            assistantIds=assistantIds,
+        )
+        assignments[plant["id"]] = ap.dict()
+        _save_assignments(assignments)  # ✅ CRÍTICO!
+        _sync_user_plant_links(plant["id"], ap)
+        changes.record("plants", [plant["id"]], data={plant["id"]: plant})
+        changes.record("assignments", [plant["id"]], data={plant["id"]: ap.dict()})
+
+        # ✅ UM ÚNICO RETURN
+        return {
+            **plant,
+            "coordinatorId": coordinatorId,
+            "supervisorIds": supervisorIds,
+            "technicianIds": technicianIds,
+            "assistantIds": assistantIds,
+        }
 
 
 
@@ -142,73 +210,106 @@ def get_plant(plant_id: str):
 
 @router.put("/{plant_id}", response_model=PlantOut)
 def update_plant(plant_id: str, payload: PlantUpdate):
-    plants = _all_plants()
-    for i, p in enumerate(plants):
-        if p["id"] == plant_id:
-            # ✅ ATUALIZA A PLANTA (excluindo atribuições)
-            plants[i] = {**p, **payload.dict(exclude={'coordinatorId', 'supervisorIds', 'technicianIds', 'assistantIds'})}
-            _save_plants(plants)
-            
-            # ✅ LIDA COM ATRIBUIÇÕES DE FORMA SEGURA
-            coordinatorId = getattr(payload, 'coordinatorId', None) or ""
-            supervisorIds = getattr(payload, 'supervisorIds', None) or []
-            technicianIds = getattr(payload, 'technicianIds', None) or []
-            assistantIds = getattr(payload, 'assistantIds', None) or []
-            
-            ap = AssignmentsPayload(
-                coordinatorId=coordinatorId,
-                supervisorIds=supervisorIds,
-                technicianIds=technicianIds,
-                assistantIds=assistantIds,
-            )
-            
-            # ✅ SALVA ATRIBUIÇÕES EM assignments.json
-            assignments = _all_assignments()
-            assignments[plant_id] = ap.dict()
-            _save_assignments(assignments)
-            
-            # ✅ SINCRONIZA OS USUÁRIOS
-            _sync_user_plant_links(plant_id, ap)
-            
-            # ✅ RETORNA COM ATRIBUIÇÕES
-            return {
-                **plants[i],
-                "coordinatorId": coordinatorId,
-                "supervisorIds": supervisorIds,
-                "technicianIds": technicianIds,
-                "assistantIds": assistantIds,
-            }
-    raise HTTPException(status_code=404, detail="Plant not found")
+    with _locked():
+        plants = _all_plants()
+        for i, p in enumerate(plants):
+            if p["id"] == plant_id:
+                # ✅ ATUALIZA A PLANTA (excluindo atribuições)
+                plants[i] = {**p, **payload.dict(exclude={'coordinatorId', 'supervisorIds', 'technicianIds', 'assistantIds'})}
+                _save_plants(plants)
+
+                # ✅ LIDA COM ATRIBUIÇÕES DE FORMA SEGURA
+                coordinatorId = getattr(payload, 'coordinatorId', None) or ""
+                supervisorIds = getattr(payload, 'supervisorIds', None) or []
+                technicianIds = getattr(payload, 'technicianIds', None) or []
+                assistantIds = getattr(payload, 'assistantIds', None) or []
+
+                ap = AssignmentsPayload(
+                    coordinatorId=coordinatorId,
+                    supervisorIds=supervisorIds,
+                    technicianIds=technicianIds,
+                    assistantIds=assistantIds,
+                )
+
+                # ✅ SALVA ATRIBUIÇÕES EM assignments.json
+                assignments = _all_assignments()
+                assignments[plant_id] = ap.dict()
+                _save_assignments(assignments)
+
+                # ✅ SINCRONIZA OS USUÁRIOS
+                _sync_user_plant_links(plant_id, ap)
+                changes.record("plants", [plant_id], data={plant_id: plants[i]})
+                changes.record("assignments", [plant_id], data={plant_id: ap.dict()})
+
+                # ✅ RETORNA COM ATRIBUIÇÕES
+                return {
+                    **plants[i],
+                    "coordinatorId": coordinatorId,
+                    "supervisorIds": supervisorIds,
+                    "technicianIds": technicianIds,
+                    "assistantIds": assistantIds,
+                }
+        raise HTTPException(status_code=404, detail="Plant not found")
 
 
 
 @router.delete("/{plant_id}")
 def delete_plant(plant_id: str):
-    plants = _all_plants()
-    new_plants = [p for p in plants if p["id"] != plant_id]
-    if len(new_plants) == len(plants):
-        raise HTTPException(status_code=404, detail="Plant not found")
-    _save_plants(new_plants)
-    assignments = _all_assignments()
-    if plant_id in assignments:
-        # ✅ COM ARGUMENTOS PADRÃO
-        _sync_user_plant_links(
-            plant_id, 
-            AssignmentsPayload(
-                coordinatorId="",
-                supervisorIds=[],
-                technicianIds=[],
-                assistantIds=[]
+    with _locked():
+        plants = _all_plants()
+        new_plants = [p for p in plants if p["id"] != plant_id]
+        if len(new_plants) == len(plants):
+            raise HTTPException(status_code=404, detail="Plant not found")
+        _save_plants(new_plants)
+        assignments = _all_assignments()
+        if plant_id in assignments:
+            # ✅ COM ARGUMENTOS PADRÃO
+            _sync_user_plant_links(
+                plant_id, 
+                AssignmentsPayload(
+                    coordinatorId="",
+                    supervisorIds=[],
+                    technicianIds=[],
+                    assistantIds=[]
+                )
             )
-        )
-        del assignments[plant_id]
-        _save_assignments(assignments)
-    return {"detail": "deleted"}
+            del assignments[plant_id]
+            _save_assignments(assignments)
+            changes.record("assignments", [plant_id], op="delete")
+        changes.record("plants", [plant_id], op="delete")
+        return {"detail": "deleted"}
+
 
+@router.put("/assignments/batch", response_model=List[BatchItemResult])
+def put_assignments_batch(payload: List[AssignmentsBatchItem]):
+    """
+    Substitui as atribuições de várias usinas: assignments.json e users.json
+    são gravados uma vez cada. Usinas inexistentes voltam com status 404.
+    """
+    with _locked():
+        plant_ids = {p["id"] for p in load_json_frozen(_PLANTS_FILE, [])}
+        results: List[BatchItemResult] = []
+        updates: Dict[str, AssignmentsPayload] = {}
+        for item in payload:
+            if item.plantId not in plant_ids:
+                results.append(BatchItemResult(id=item.plantId, status=404, detail="Plant not found"))
+            elif item.plantId in updates:
+                results.append(BatchItemResult(id=item.plantId, status=400, detail="duplicate plantId in batch"))
+            else:
+                updates[item.plantId] = AssignmentsPayload(**item.dict(exclude={"plantId"}))
+                results.append(BatchItemResult(id=item.plantId, status=200))
+        if updates:
+            assignments = _all_assignments()
+            for plant_id, ap in updates.items():
+                assignments[plant_id] = ap.dict()
+            _save_assignments(assignments)
+            _sync_user_plant_links_many(updates)
+            changes.record("assignments", list(updates), data={pid: ap.dict() for pid, ap in updates.items()})
+    return results
 
 @router.get("/{plant_id}/assignments", response_model=AssignmentsPayload)
 def get_assignments(plant_id: str):
-    if not any(p["id"] == plant_id for p in _all_plants()):
+    if not _plant_exists(plant_id):
         raise HTTPException(status_code=404, detail="Plant not found")
     a = _all_assignments().get(plant_id, {})
     return AssignmentsPayload(
@@ -220,10 +321,12 @@ def get_assignments(plant_id: str):
 
 @router.put("/{plant_id}/assignments", response_model=AssignmentsPayload)
 def put_assignments(plant_id: str, payload: AssignmentsPayload):
-    if not any(p["id"] == plant_id for p in _all_plants()):
+    if not _plant_exists(plant_id):
         raise HTTPException(status_code=404, detail="Plant not found")
-    assignments = _all_assignments()
-    assignments[plant_id] = payload.dict()
-    _save_assignments(assignments)
-    _sync_user_plant_links(plant_id, payload)
+    with _locked():
+        assignments = _all_assignments()
+        assignments[plant_id] = payload.dict()
+        _save_assignments(assignments)
+        _sync_user_plant_links(plant_id, payload)
+        changes.record("assignments", [plant_id], data={plant_id: payload.dict()})
     return payload
\ No newline at end of file
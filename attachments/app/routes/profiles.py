@@ -0,0 +1,43 @@
+# /attachments/app/routes/profiles.py
+# Perfis gravados pelo ProfilingMiddleware (app/core/profiling.py).
+# Só Admin (usuário real, não o ator anônimo com X-Role) pode perfilar e ler.
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+from starlette.requests import HTTPConnection
+from typing import List, Optional
+
+from app.core.profiling import list_profiles, load_profile
+from app.routes.users import actor_for
+
+router = APIRouter(prefix="/api/profiles", tags=["profiles"])
+
+
+async def admin_actor(conn: HTTPConnection) -> Optional[dict]:
+    """Ator da requisição se for um Admin cadastrado; None caso contrário"""
+    actor = await actor_for(conn)
+    if actor.get("id") == "anon" or actor.get("role") != "Admin":
+        return None
+    return actor
+
+
+async def authorize_scope(scope: dict) -> Optional[dict]:
+    """Versão para o middleware ASGI (recebe o scope cru)"""
+    return await admin_actor(HTTPConnection(scope))
+
+
+@router.get("", response_model=List[dict])
+async def get_profiles(request: Request):
+    if await admin_actor(request) is None:
+        raise HTTPException(403, "forbidden")
+    return list_profiles()
+
+
+@router.get("/{profile_id}", response_class=PlainTextResponse)
+async def get_profile(profile_id: str, request: Request):
+    """Perfil no formato folded (flamegraph.pl / speedscope)"""
+    if await admin_actor(request) is None:
+        raise HTTPException(403, "forbidden")
+    folded = load_profile(profile_id)
+    if folded is None:
+        raise HTTPException(404, "Profile not found")
+    return PlainTextResponse(folded)
@@ -1,54 +1,88 @@
 # /attachments/app/routes/users.py
 from fastapi import APIRouter, HTTPException, Query, Request
+from starlette.requests import HTTPConnection
 from typing import List, Optional
 from uuid import uuid4
-from app.core.supabase_storage import load_users, save_user, delete_user as supabase_delete_user
+from app.core.user_directory import directory
 from app.core.schemas import UserCreate, UserUpdate, UserOut
-from app.core.rbac import can_view_user, can_edit_user
+from app.core.rbac import can_edit_user, rbac_index_for
+from app.core import changes
+from app.core.storage import load_json
+from app.core.sync import sync_user_assignments
+from app.core.fastjson import FastJSONResponse, record_projector
+from app.core.log import get_logger
+from starlette.concurrency import run_in_threadpool
 
 router = APIRouter(prefix="/api/users", tags=["users"])
+log = get_logger("users")
 
-def _all_users() -> list[dict]:
-    # Carrega usuários do Supabase
-    return load_users()
-
-def _exists_username(username: str, *, skip_id: str | None = None) -> bool:
-    """Verifica se username já existe no Supabase"""
-    users = _all_users()
-    u_lower = username.lower()
-    for u in users:
-        if skip_id and u.get("id") == skip_id:
-            continue
-        if u.get("username","").lower() == u_lower:
-            return True
-    return False
-
-def _actor_from_headers(req: Request, users: list[dict]) -> dict:
-    rid = req.headers.get("x-user-id")
+# Usuários gravados por outro worker: o diretório deste recarrega na próxima consulta
+changes.on_external_change("users", lambda ids: directory.invalidate())
+
+async def _all_users() -> list[dict]:
+    # Usuários do Supabase via cache com TTL (não alterar os dicts retornados)
+    return await directory.all()
+
+async def _exists_username(username: str, *, skip_id: str | None = None) -> bool:
+    """Verifica se username já existe (índice case-insensitive do diretório)"""
+    return await directory.username_exists(username, skip_id=skip_id)
+
+async def actor_for(req: HTTPConnection, user_id: Optional[str] = None) -> dict:
+    """Ator da requisição pelos headers X-User-Id/X-Role (ou user_id explícito, p/ EventSource/WebSocket)"""
+    rid = user_id or req.headers.get("x-user-id")
     rrole = req.headers.get("x-role")
     if rid:
-        for u in users:
-            if u["id"] == rid:
-                return u
+        u = await directory.get(rid)
+        if u:
+            return u
     return {"id":"anon","role": (rrole or "Auxiliar"), "plantIds": []}
 
+async def _actor_from_headers(req: Request) -> dict:
+    return await actor_for(req)
+
+async def _record_user(user: dict):
+    # Registra na sequência de mudanças e publica o usuário (sem senha) aos clientes conectados
+    out = {k: user.get(k) for k in UserOut.model_fields}
+    await run_in_threadpool(changes.record, "users", [out["id"]], "put", {out["id"]: out})
+
+def _sync_assignments(user_id: str, before: Optional[dict], after: Optional[dict], users: List[dict]):
+    # assignments.json local acompanha role/plantIds: só as usinas afetadas por este usuário.
+    # users: lista do Supabase já com a escrita (users.json local não é atualizado)
+    try:
+        changed = sync_user_assignments(user_id, before, after, users)
+        if changed:
+            assignments = load_json("assignments.json", {})
+            changes.record("assignments", changed, data={pid: assignments.get(pid) for pid in changed})
+    except Exception:
+        # O usuário já foi gravado no Supabase; `python -m app.core.sync check --repair` corrige
+        log.exception("erro ao sincronizar assignments do usuário", extra={"user_id": user_id})
+
+async def visible_users(request: Request, ids=None) -> List[dict]:
+    """Usuários que o ator da requisição pode ver (todos, ou só os dos ids informados)"""
+    users = await _all_users()
+    actor = await _actor_from_headers(request)
+    # Filtra usuários baseado em permissões RBAC (índice pré-computado, uma passada)
+    filtered = rbac_index_for(users).visible_users(actor)
+    if ids is None:
+        return filtered
+    wanted = set(ids)
+    return [u for u in filtered if u["id"] in wanted]
+
+# Usuário do diretório -> formato UserOut (descarta senha e colunas extras)
+_user_out = record_projector(UserOut)
+
 @router.get("", response_model=List[UserOut])
-def list_users(request: Request):
-    users = _all_users()
-    actor = _actor_from_headers(request, users)
-    # Filtra usuários baseado em permissões RBAC
-    filtered = [u for u in users if can_view_user(actor, u)]
-    return filtered
+async def list_users(request: Request):
+    # Serializa direto (orjson), sem a revalidação item a item do response_model
+    return FastJSONResponse([_user_out(u) for u in await visible_users(request)])
     
     
 @router.post("", response_model=UserOut, status_code=201)
-def create_user(request: Request, payload: UserCreate):
+async def create_user(request: Request, payload: UserCreate):
     try:
-        users = _all_users()
-        actor = _actor_from_headers(request, users)
+        actor = await _actor_from_headers(request)
         
-        # ✅ LOG para debug
-        print(f"📥 CREATE USER - Payload recebido: {payload.dict()}")
+        log.debug("create user recebido", extra={"username": payload.username, "role": payload.role, "plants": len(payload.plantIds)})
         
         # ✅ Usa plantIds do payload diretamente (sempre será uma lista devido ao default_factory)
         plant_ids = payload.plantIds or []
@@ -57,7 +91,7 @@ def create_user(request: Request, payload: UserCreate):
         if not can_edit_user(actor, dummy):
             raise HTTPException(403, "forbidden")
         
-        if _exists_username(payload.username):
+        if await _exists_username(payload.username):
             raise HTTPException(status_code=409, detail="username already exists")
         
         # ✅ Normalize supervisorId: "" → None
@@ -87,15 +121,12 @@ def create_user(request: Request, payload: UserCreate):
             "plantIds": plant_ids,  # save_user salva nas atribuições
         }
         
-        print(f"✅ CREATE USER - Novo usuário criado: {new_user}")
-        
         # Salva no Supabase (save_user faz a conversão camelCase -> snake_case)
-        saved_user = save_user(new_user)
-        print(f"✅ CREATE USER - Usuário salvo no Supabase: {saved_user.get('id')}")
+        saved_user = await directory.save_user(new_user)
+        log.info("usuário criado", extra={"user_id": saved_user.get("id"), "username": payload.username})
         
         # Recarrega o usuário para ter plantIds atualizado
-        users = _all_users()
-        result = next((u for u in users if u["id"] == saved_user["id"]), None)
+        result = await directory.get(saved_user["id"])
         
         if not result:
             # Fallback se não encontrar
@@ -111,24 +142,23 @@ def create_user(request: Request, payload: UserCreate):
                 "plantIds": plant_ids,
             }
         
+        await _record_user(result)
+        await run_in_threadpool(_sync_assignments, result["id"], None, result, await _all_users())
         return result
     except HTTPException:
         raise
     except Exception as e:
-        print(f"❌ ERRO ao criar usuário: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("erro ao criar usuário")
         raise HTTPException(status_code=500, detail=f"Erro interno ao criar usuário: {str(e)}")
 
 
 
 
 @router.put("/{user_id}", response_model=UserOut)
-def update_user(user_id: str, payload: UserUpdate, request: Request):
-    users = _all_users()
-    actor = _actor_from_headers(request, users)
+async def update_user(user_id: str, payload: UserUpdate, request: Request):
+    actor = await _actor_from_headers(request)
     
-    current_user = next((u for u in users if u["id"] == user_id), None)
+    current_user = await directory.get(user_id)
     if not current_user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -147,16 +177,15 @@ def update_user(user_id: str, payload: UserUpdate, request: Request):
             update_data["supervisorId"] = None
     
     if "username" in update_data and update_data["username"] != current_user.get("username"):
-        if _exists_username(update_data["username"], skip_id=user_id):
+        if await _exists_username(update_data["username"], skip_id=user_id):
             raise HTTPException(status_code=409, detail="username already exists")
     
     # Atualiza no Supabase (save_user faz a conversão camelCase -> snake_case)
     updated_user = {**current_user, **update_data}
-    saved = save_user(updated_user)
+    saved = await directory.save_user(updated_user)
     
     # Recarrega o usuário para ter plantIds atualizado
-    users = _all_users()
-    result = next((u for u in users if u["id"] == saved["id"]), None)
+    result = await directory.get(saved["id"])
     
     if not result:
         # Fallback se não encontrar
@@ -172,18 +201,22 @@ def update_user(user_id: str, payload: UserUpdate, request: Request):
             "plantIds": update_data.get("plantIds", current_user.get("plantIds", [])),
         }
     
+    await _record_user(result)
+    await run_in_threadpool(_sync_assignments, user_id, current_user, result, await _all_users())
     return result
 
 
 
 @router.delete("/{user_id}")
-def delete_user(user_id: str):
-    users = _all_users()
-    user_exists = any(u["id"] == user_id for u in users)
-    if not user_exists:
+async def delete_user(user_id: str):
+    current_user = await directory.get(user_id)
+    if current_user is None:
         raise HTTPException(status_code=404, detail="User not found")
     
-    if supabase_delete_user(user_id):
+    if await directory.delete_user(user_id):
+        # Registro anterior: só filtra (RBAC) quem recebe a tombstone; não é enviado
+        await run_in_threadpool(changes.record, "users", [user_id], "delete", {user_id: _user_out(current_user)})
+        await run_in_threadpool(_sync_assignments, user_id, current_user, None, await _all_users())
         return {"detail": "deleted"}
     else:
         raise HTTPException(status_code=500, detail="Failed to delete user")
\ No newline at end of file
@@ -0,0 +1 @@
+# Benchmarks da API (executar a partir de /attachments: python -m benchmarks.<módulo>)
@@ -0,0 +1,245 @@
+# /attachments/benchmarks/api_bench.py
+# Benchmark de carga da API, em processo (httpx + ASGITransport, sem rede):
+# gera uma base sintética (benchmarks/dataset.py) num diretório temporário,
+# serve os usuários por um PostgrestStub e mede cada cenário.
+#
+#   cd attachments
+#   python -m benchmarks.api_bench run --users 10000 --plants 1000 --os 100000
+#   python -m benchmarks.api_bench run --scenarios list_os_page,create_os --requests 500 --concurrency 16
+#   python -m benchmarks.api_bench compare benchmarks/results/A.json benchmarks/results/B.json
+#
+# Cada execução grava benchmarks/results/<data>-<commit>.json com vazão e
+# latência p50/p95/p99 por cenário, para comparar entre commits.
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from benchmarks.dataset import generate, supabase_tables, write_data_dir
+from benchmarks.postgrest_stub import PostgrestStub
+from benchmarks.supabase_roundtrips import _FAKE_KEY
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+# cenário -> (fração do --requests usada, função que monta a requisição)
+# A função recebe (ctx, i) e retorna (método, caminho, corpo JSON ou None).
+Request = Tuple[str, str, Optional[object]]
+
+
+def _os_item(ctx: dict, os_id: str) -> dict:
+    return {**ctx["os_template"], "id": os_id, "title": f"{os_id} - bench"}
+
+
+SCENARIOS: Dict[str, Tuple[float, Callable[[dict, int], Request]]] = {
+    "list_os_page": (1.0, lambda ctx, i: ("GET", "/api/os?limit=100", None)),
+    "list_os_by_plant": (1.0, lambda ctx, i: ("GET", f"/api/os?plantId={ctx['rng'].choice(ctx['plant_ids'])}&limit=100", None)),
+    "list_os_full": (0.05, lambda ctx, i: ("GET", "/api/os", None)),
+    "list_plants": (1.0, lambda ctx, i: ("GET", "/api/plants", None)),
+    "list_users": (1.0, lambda ctx, i: ("GET", "/api/users", None)),
+    "get_assignments": (1.0, lambda ctx, i: ("GET", f"/api/plants/{ctx['rng'].choice(ctx['plant_ids'])}/assignments", None)),
+    "changes_since": (1.0, lambda ctx, i: ("GET", f"/api/changes?since={ctx['seq0']}", None)),
+    "create_os": (1.0, lambda ctx, i: ("POST", "/api/os", _os_item(ctx, f"BENCH-C{i:07d}"))),
+    "create_os_batch50": (0.2, lambda ctx, i: ("POST", "/api/os/batch", [_os_item(ctx, f"BENCH-B{i:05d}-{k:02d}") for k in range(50)])),
+    "update_os": (1.0, lambda ctx, i: ("PUT", f"/api/os/{ctx['rng'].choice(ctx['os_ids'])}", None)),
+    "put_assignments": (0.5, lambda ctx, i: ("PUT", f"/api/plants/{ctx['rng'].choice(ctx['plant_ids'])}/assignments", None)),
+}
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    """Percentil por posto mais próximo (q em 0..100)"""
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, int(round(q / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
+
+
+def _summary(latencies: List[float], errors: int, elapsed: float) -> dict:
+    lat = sorted(latencies)
+    ms = lambda v: round(v * 1000, 3)
+    return {
+        "requests": len(lat),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 4),
+        "throughput_rps": round(len(lat) / elapsed, 2) if elapsed > 0 else 0.0,
+        "latency_ms": {
+            "mean": ms(sum(lat) / len(lat)) if lat else 0.0,
+            "p50": ms(_percentile(lat, 50)),
+            "p95": ms(_percentile(lat, 95)),
+            "p99": ms(_percentile(lat, 99)),
+            "max": ms(lat[-1]) if lat else 0.0,
+        },
+    }
+
+
+async def _resolve(client, ctx: dict, method: str, path: str, body):
+    # PUTs sem corpo reenviam o estado atual (escrita real, sem mudar os dados)
+    if body is None and method == "PUT":
+        if path.startswith("/api/os/"):
+            body = ctx["os_by_id"][path.rsplit("/", 1)[1]]
+        else:
+            body = (await client.get(path)).json()
+    return body
+
+
+async def _run_scenario(client, ctx: dict, name: str, total: int, concurrency: int) -> dict:
+    build = SCENARIOS[name][1]
+    # Aquecimento (carga do OSStore, caches) fora da medição
+    method, path, body = build(ctx, -1 - ctx["warm"])
+    ctx["warm"] += 1
+    await client.request(method, path, json=await _resolve(client, ctx, method, path, body))
+
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            method, path, body = build(ctx, i)
+            body = await _resolve(client, ctx, method, path, body)
+            t0 = time.perf_counter()
+            r = await client.request(method, path, json=body)
+            latencies.append(time.perf_counter() - t0)
+            if r.status_code >= 400:
+                errors += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return _summary(latencies, errors, time.perf_counter() - t0)
+
+
+async def _run_all(app, dataset: dict, scenarios: List[str], requests: int, concurrency: int) -> Dict[str, dict]:
+    import httpx
+
+    ctx = {
+        "rng": random.Random(7),
+        "plant_ids": [p["id"] for p in dataset["plants"]],
+        "os_ids": [o["id"] for o in dataset["os"][:1000]],
+        "os_by_id": {o["id"]: o for o in dataset["os"][:1000]},
+        "os_template": dataset["os"][0],
+        "warm": 0,
+    }
+    from app.core.changes import current_seq
+    ctx["seq0"] = current_seq()
+
+    headers = {"x-user-id": dataset["users"][0]["id"]}  # Admin
+    results: Dict[str, dict] = {}
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=headers, timeout=None) as client:
+            for name in scenarios:
+                total = max(5, int(requests * SCENARIOS[name][0]))
+                results[name] = await _run_scenario(client, ctx, name, total, concurrency)
+                r = results[name]
+                print(f"{name:>18} | {r['requests']:>6} req | {r['throughput_rps']:>9.1f} req/s | "
+                      f"p50 {r['latency_ms']['p50']:>8.2f} ms | p95 {r['latency_ms']['p95']:>8.2f} ms | "
+                      f"p99 {r['latency_ms']['p99']:>8.2f} ms | erros {r['errors']}")
+    return results
+
+
+def _git(*args: str) -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", *args], cwd=Path(__file__).parent, stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args) -> Path:
+    scenarios = args.scenarios.split(",") if args.scenarios else list(SCENARIOS)
+    unknown = [s for s in scenarios if s not in SCENARIOS]
+    if unknown:
+        sys.exit(f"cenários desconhecidos: {', '.join(unknown)} (disponíveis: {', '.join(SCENARIOS)})")
+
+    work = Path(tempfile.mkdtemp(prefix="loopos-bench-"))
+    t0 = time.perf_counter()
+    dataset = generate(args.users, args.plants, args.os, args.seed)
+    write_data_dir(dataset, work / "data")
+    print(f"📦 Dataset: {args.users} usuários, {args.plants} usinas, {args.os} OS em {work} ({time.perf_counter() - t0:.1f}s)")
+
+    # Configuração lida na importação do app: precisa vir antes do import
+    os.environ["LOOPOS_DATA_DIR"] = str(work / "data")
+    os.environ["NEXTCLOUD_ATTACHMENTS_DIR"] = str(work / "uploads")
+    os.environ.setdefault("LOOPOS_LOG_LEVEL", "WARNING")
+
+    with PostgrestStub(supabase_tables(dataset)) as stub:
+        os.environ["SUPABASE_URL"] = stub.url
+        os.environ["SUPABASE_KEY"] = _FAKE_KEY
+        from app.main import app
+        results = asyncio.run(_run_all(app, dataset, scenarios, args.requests, args.concurrency))
+
+    commit = _git("rev-parse", "--short", "HEAD") or "unknown"
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": commit,
+            "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "storage": os.getenv("LOOPOS_STORAGE", "json"),
+            "dataset": {"users": args.users, "plants": args.plants, "os": args.os, "seed": args.seed},
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+        },
+        "results": results,
+    }
+    out_dir = Path(args.out)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    out = out_dir / f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{commit}.json"
+    out.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"✅ Resultados em {out}")
+    return out
+
+
+def compare(old_path: Path, new_path: Path):
+    old = json.loads(Path(old_path).read_text(encoding="utf-8"))
+    new = json.loads(Path(new_path).read_text(encoding="utf-8"))
+    print(f"{'cenário':>18} | {'req/s':>21} | {'p50 ms':>21} | {'p95 ms':>21} | {'p99 ms':>21}")
+    print(f"{'':>18} | {old['meta']['commit'] + ' → ' + new['meta']['commit']:>21} |")
+
+    def cell(a: float, b: float) -> str:
+        delta = f"{(b - a) / a * 100:+.0f}%" if a else "n/a"
+        return f"{a:>7.1f} → {b:>7.1f} {delta:>5}"
+
+    for name in new["results"]:
+        if name not in old["results"]:
+            continue
+        a, b = old["results"][name], new["results"][name]
+        print(f"{name:>18} | {cell(a['throughput_rps'], b['throughput_rps'])} | "
+              + " | ".join(cell(a["latency_ms"][q], b["latency_ms"][q]) for q in ("p50", "p95", "p99")))
+    if old["meta"]["dataset"] != new["meta"]["dataset"]:
+        print(f"⚠️ datasets diferentes: {old['meta']['dataset']} vs {new['meta']['dataset']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de carga da API LoopOS (em processo)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_run = sub.add_parser("run", help="gera o dataset e mede os cenários")
+    p_run.add_argument("--users", type=int, default=1000)
+    p_run.add_argument("--plants", type=int, default=100)
+    p_run.add_argument("--os", type=int, default=10000)
+    p_run.add_argument("--seed", type=int, default=42)
+    p_run.add_argument("--requests", type=int, default=200, help="requisições por cenário (alguns usam uma fração)")
+    p_run.add_argument("--concurrency", type=int, default=8)
+    p_run.add_argument("--scenarios", help=f"lista separada por vírgula (padrão: todos): {','.join(SCENARIOS)}")
+    p_run.add_argument("--out", default=str(RESULTS_DIR))
+
+    p_cmp = sub.add_parser("compare", help="compara dois arquivos de resultados")
+    p_cmp.add_argument("old", type=Path)
+    p_cmp.add_argument("new", type=Path)
+
+    args = parser.parse_args()
+    if args.command == "run":
+        run(args)
+    else:
+        compare(args.old, args.new)
@@ -0,0 +1,150 @@
+# /attachments/benchmarks/dataset.py
+# Base sintética e reproduzível (mesma semente → mesmos dados) no formato de
+# attachments/data (users.json, plants.json, assignments.json, os.json) e das
+# tabelas do Supabase (users, plant_assignments) servidas pelo PostgrestStub.
+#
+#   cd attachments && python -m benchmarks.dataset --users 10000 --plants 1000 --os 100000 --out /tmp/loopos-data
+
+import argparse
+import json
+import random
+import uuid
+from pathlib import Path
+from typing import Dict, List
+
+# Papel -> fração dos usuários (o resto vira Técnico)
+_ROLE_MIX = (("Admin", 0.005), ("Coordenador", 0.02), ("Supervisor", 0.08), ("Auxiliar", 0.15), ("Operador", 0.02))
+
+# Papel -> campo de assignments (mesmo mapeamento de app/core/sync.py)
+_ROLE_FIELD = {"Admin": "coordinatorId", "Coordenador": None, "Supervisor": "supervisorIds",
+               "Técnico": "technicianIds", "Auxiliar": "assistantIds", "Operador": None}
+_ROLE_TYPE = {"coordinatorId": "coordinator", "supervisorIds": "supervisor",
+              "technicianIds": "technician", "assistantIds": "assistant"}
+
+_STATUS = ("Pendente", "Em Progresso", "Em Revisão", "Concluída")
+_PRIORITY = ("Baixa", "Média", "Alta", "Urgente")
+_ASSETS = ("CFTV", "Inversor", "String", "Stringbox", "Tracker", "Transformador", "Módulo", "Relé")
+
+
+def _uuid(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def _role(rng: random.Random) -> str:
+    x = rng.random()
+    for role, share in _ROLE_MIX:
+        if x < share:
+            return role
+        x -= share
+    return "Técnico"
+
+
+def generate(users: int, plants: int, os_count: int, seed: int = 42) -> Dict[str, object]:
+    """Dataset completo: {"users", "plants", "assignments", "os"} no formato dos JSON de data/"""
+    rng = random.Random(seed)
+
+    plant_list = [{
+        "id": _uuid(rng),
+        "client": f"Cliente {i % 37}",
+        "name": f"Usina {i:05d}",
+        "stringCount": rng.randint(10, 400),
+        "trackerCount": rng.randint(0, 200),
+        "subPlants": [{"id": k + 1, "inverterCount": rng.randint(1, 12)} for k in range(rng.randint(1, 4))],
+        "assets": rng.sample(_ASSETS, 4),
+    } for i in range(plants)]
+    plant_ids = [p["id"] for p in plant_list]
+
+    user_list: List[dict] = []
+    for i in range(users):
+        role = "Admin" if i == 0 else _role(rng)
+        n_plants = 0 if role in ("Admin", "Operador") or not plant_ids else rng.randint(1, min(3, len(plant_ids)))
+        user_list.append({
+            "id": _uuid(rng),
+            "name": f"Usuário {i:05d}",
+            "username": f"user{i:05d}",
+            "email": f"user{i:05d}@example.com",
+            "phone": None,
+            "role": role,
+            "can_login": True,
+            "supervisorId": None,
+            "plantIds": rng.sample(plant_ids, n_plants),
+        })
+    supervisors = [u["id"] for u in user_list if u["role"] == "Supervisor"]
+    for u in user_list:
+        if u["role"] == "Técnico" and supervisors:
+            u["supervisorId"] = rng.choice(supervisors)
+
+    assignments = {pid: {"coordinatorId": "", "supervisorIds": [], "technicianIds": [], "assistantIds": []} for pid in plant_ids}
+    for u in user_list:
+        field = _ROLE_FIELD[u["role"]]
+        for pid in u["plantIds"] if field else ():
+            if field == "coordinatorId":
+                assignments[pid]["coordinatorId"] = u["id"]
+            else:
+                assignments[pid][field].append(u["id"])
+
+    technicians = [u["id"] for u in user_list if u["role"] == "Técnico"] or [user_list[0]["id"]]
+    os_list = []
+    for i in range(os_count, 0, -1):  # os.json: mais nova primeiro
+        created = f"2025-{1 + i % 12:02d}-{1 + i % 28:02d}T{i % 24:02d}:00:00.000Z"
+        os_list.append({
+            "id": f"OS{i:06d}",
+            "title": f"OS{i:06d} - Inspeção",
+            "description": "Inspeção preventiva",
+            "status": rng.choice(_STATUS),
+            "priority": rng.choice(_PRIORITY),
+            "plantId": rng.choice(plant_ids) if plant_ids else "",
+            "technicianId": rng.choice(technicians),
+            "supervisorId": rng.choice(supervisors) if supervisors else None,
+            "startDate": created,
+            "activity": "Inspeção",
+            "assets": rng.sample(_ASSETS, 2),
+            "attachmentsEnabled": True,
+            "createdAt": created,
+            "updatedAt": created,
+            "logs": [],
+            "imageAttachments": [],
+        })
+
+    return {"users": user_list, "plants": plant_list, "assignments": assignments, "os": os_list}
+
+
+def write_data_dir(dataset: Dict[str, object], out: Path):
+    """Grava o dataset como users.json/plants.json/assignments.json/os.json em `out`"""
+    out.mkdir(parents=True, exist_ok=True)
+    for name in ("users", "plants", "assignments", "os"):
+        with (out / f"{name}.json").open("w", encoding="utf-8") as f:
+            json.dump(dataset[name], f, ensure_ascii=False)
+        journal = out / f"{name}.json.journal"
+        if journal.exists():
+            journal.unlink()
+    for stale in ("changes.journal",):
+        if (out / stale).exists():
+            (out / stale).unlink()
+
+
+def supabase_tables(dataset: Dict[str, object]) -> Dict[str, List[dict]]:
+    """Tabelas users/plant_assignments (snake_case) para o PostgrestStub"""
+    users, assignments = [], []
+    for u in dataset["users"]:
+        users.append({
+            "id": u["id"], "name": u["name"], "username": u["username"], "email": u["email"],
+            "phone": u["phone"], "role": u["role"], "can_login": u["can_login"],
+            "supervisor_id": u["supervisorId"],
+        })
+        field = _ROLE_FIELD[u["role"]]
+        for pid in u["plantIds"] if field else ():
+            assignments.append({"id": f"{u['id']}:{pid}", "plant_id": pid, "user_id": u["id"], "role_type": _ROLE_TYPE[field]})
+    return {"users": users, "plant_assignments": assignments}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gera uma base sintética no formato de attachments/data")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--plants", type=int, default=100)
+    parser.add_argument("--os", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", type=Path, required=True, help="diretório de saída (não use o data/ de produção)")
+    args = parser.parse_args()
+    write_data_dir(generate(args.users, args.plants, args.os, args.seed), args.out)
+    print(f"✅ Dataset gravado em {args.out}")
@@ -0,0 +1,103 @@
+# /attachments/benchmarks/import_budget.py
+# Orçamento de tempo de import do app: cada worker (e cada restart) paga o
+# `import app.main` antes de aceitar conexões.
+#
+# Mede em processos novos com `python -X importtime` (mediana de --runs) e
+# falha (exit 1) se passar de --budget-ms ou se algum módulo que deve ser
+# carregado só no primeiro uso (supabase-py) entrar no import. Roda sem
+# SUPABASE_URL/SUPABASE_KEY: o app tem que subir mesmo sem o Supabase.
+#
+#   cd attachments
+#   python -m benchmarks.import_budget
+#   python -m benchmarks.import_budget --budget-ms 600 --runs 7 --top 15
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# Carregados sob demanda (app/core/supabase_client.py, supabase_async.py)
+LAZY_MODULES = ("supabase", "postgrest", "supabase_auth", "storage3", "realtime", "supabase_functions")
+
+_PROBE = (
+    "import json, sys; import app.main; "
+    f"print(json.dumps(sorted(m for m in {LAZY_MODULES!r} if m in sys.modules)))"
+)
+
+
+def _env(work: Path) -> dict:
+    env = {k: v for k, v in os.environ.items() if not k.startswith("SUPABASE_")}
+    env.update({
+        "PYTHONPATH": str(ROOT),
+        "LOOPOS_DATA_DIR": str(work / "data"),
+        "NEXTCLOUD_ATTACHMENTS_DIR": str(work / "uploads"),
+        "LOOPOS_LOG_LEVEL": "WARNING",
+    })
+    return env
+
+
+def _parse_importtime(stderr: str) -> list:
+    """[(self_us, cumulative_us, módulo)] da saída de -X importtime"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative, name = line[len("import time:"):].split("|", 2)
+        rows.append((int(self_us), int(cumulative), name.strip()))
+    return rows
+
+
+def measure(runs: int) -> tuple:
+    """(tempos em ms do `import app.main`, módulos lazy importados, linhas da última execução)"""
+    times, lazy, rows = [], set(), []
+    with tempfile.TemporaryDirectory(prefix="loopos-import-") as tmp:
+        env = _env(Path(tmp))
+        for _ in range(runs):
+            proc = subprocess.run(
+                [sys.executable, "-X", "importtime", "-c", _PROBE],
+                cwd=ROOT, env=env, capture_output=True, text=True,
+            )
+            if proc.returncode != 0:
+                sys.exit(f"❌ import app.main falhou:\n{proc.stderr[-2000:]}")
+            rows = _parse_importtime(proc.stderr)
+            total = next(c for _, c, name in reversed(rows) if name == "app.main")
+            times.append(total / 1000)
+            lazy.update(json.loads(proc.stdout.strip().splitlines()[-1]))
+    return times, sorted(lazy), rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tempo de `import app.main` contra um orçamento")
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("LOOPOS_IMPORT_BUDGET_MS", 900)))
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="módulos com maior tempo próprio (0 = não mostra)")
+    args = parser.parse_args()
+
+    times, lazy, rows = measure(args.runs)
+    median = statistics.median(times)
+    print(f"⏱️  import app.main: mediana {median:.0f} ms (min {min(times):.0f}, max {max(times):.0f}, {args.runs} execuções)")
+    if args.top:
+        print("   maiores tempos próprios (última execução):")
+        for self_us, cumulative, name in sorted(rows, reverse=True)[:args.top]:
+            print(f"   {self_us / 1000:8.1f} ms  {cumulative / 1000:8.1f} ms acum.  {name}")
+
+    failed = False
+    if lazy:
+        print(f"❌ módulos que deviam carregar só no primeiro uso: {', '.join(lazy)}")
+        failed = True
+    if median > args.budget_ms:
+        print(f"❌ acima do orçamento de {args.budget_ms:.0f} ms")
+        failed = True
+    if failed:
+        sys.exit(1)
+    print(f"✅ dentro do orçamento de {args.budget_ms:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+# /attachments/benchmarks/multiproc_stress.py
+# Teste de concorrência entre processos: N processos, cada um com o app
+# completo (como os workers de `uvicorn --workers N`), gravam ao mesmo tempo no
+# mesmo data/ e no fim conferimos que nada se perdeu:
+#
+#   - todas as OS criadas estão no os.json + journal (com compactações no meio);
+#   - todas as usinas criadas estão em plants.json e em assignments.json;
+#   - changes.journal tem seqs únicas e uma entrada para cada registro gravado;
+#   - cada processo, depois que todos terminam, enxerga as escritas dos outros.
+#
+#   cd attachments
+#   python -m benchmarks.multiproc_stress --procs 4 --writes 100
+#   python -m benchmarks.multiproc_stress --no-locks   # mostra o que se perde sem os locks
+#
+# O diretório temporário é apagado no sucesso; numa falha (ou com --keep) fica
+# para inspeção.
+
+import argparse
+import asyncio
+import json
+import multiprocessing as mp
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.dataset import generate, supabase_tables, write_data_dir
+from benchmarks.postgrest_stub import PostgrestStub
+from benchmarks.supabase_roundtrips import _FAKE_KEY
+
+
+async def _worker_run(worker: int, writes: int, barrier, dataset_os: dict, admin_id: str) -> dict:
+    import httpx
+    from app.main import app
+
+    created_os, created_plants, errors = [], [], []
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://stress",
+                                     headers={"x-user-id": admin_id}, timeout=None) as client:
+            await asyncio.get_running_loop().run_in_executor(None, barrier.wait)
+            for i in range(writes):
+                os_id = f"W{worker:02d}-{i:05d}"
+                r = await client.post("/api/os", json={**dataset_os, "id": os_id, "title": f"{os_id} - stress"})
+                (created_os.append(os_id) if r.status_code == 200 else errors.append(f"POST /api/os {r.status_code}"))
+                if i % 5 == 0:
+                    r = await client.post("/api/plants", json={"client": f"W{worker}", "name": f"Usina {os_id}"})
+                    if r.status_code != 201:
+                        errors.append(f"POST /api/plants {r.status_code}")
+                        continue
+                    plant_id = r.json()["id"]
+                    created_plants.append(plant_id)
+                    r = await client.put(f"/api/plants/{plant_id}/assignments",
+                                         json={"coordinatorId": admin_id, "supervisorIds": [], "technicianIds": [], "assistantIds": []})
+                    if r.status_code != 200:
+                        errors.append(f"PUT assignments {r.status_code}")
+            # Todos terminaram: cada processo deve ver as OS dos outros
+            await asyncio.get_running_loop().run_in_executor(None, barrier.wait)
+            seen_os = {o["id"] for o in (await client.get("/api/os", params={"fields": "id"})).json()}
+            seen_plants = {p["id"] for p in (await client.get("/api/plants")).json()}
+    return {"worker": worker, "os": created_os, "plants": created_plants, "errors": errors,
+            "seen_os": sorted(seen_os), "seen_plants": sorted(seen_plants)}
+
+
+def _worker(worker: int, writes: int, env: dict, barrier, results, dataset_os: dict, admin_id: str):
+    os.environ.update(env)
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+    try:
+        results.put(asyncio.run(_worker_run(worker, writes, barrier, dataset_os, admin_id)))
+    except Exception as e:  # o pai reporta
+        barrier.abort()
+        results.put({"worker": worker, "fatal": repr(e)})
+
+
+def _check(data_dir: Path, results: list) -> list:
+    """Lê o data/ de um processo novo (este) e lista os problemas encontrados"""
+    from app.core.os_store import OSStore
+    from app.core.storage import load_json
+
+    problems = []
+    created_os = {i for r in results for i in r["os"]}
+    created_plants = {i for r in results for i in r["plants"]}
+
+    store = OSStore("os.json")
+    lost_os = created_os - {o["id"] for o in store.all()}
+    if lost_os:
+        problems.append(f"{len(lost_os)} OS perdidas (ex.: {sorted(lost_os)[:3]})")
+
+    plants = {p["id"] for p in load_json("plants.json", [])}
+    assignments = load_json("assignments.json", {})
+    if created_plants - plants:
+        problems.append(f"{len(created_plants - plants)} usinas perdidas em plants.json")
+    if created_plants - set(assignments):
+        problems.append(f"{len(created_plants - set(assignments))} usinas sem entrada em assignments.json")
+
+    seqs, logged = [], set()
+    for raw in (data_dir / "changes.journal").read_bytes().splitlines():
+        e = json.loads(raw)
+        if "seq" in e:
+            seqs.append(e["seq"])
+            logged.add((e["kind"], e["id"]))
+    if len(seqs) != len(set(seqs)):
+        problems.append(f"{len(seqs) - len(set(seqs))} seqs repetidas em changes.journal")
+    missing = ({("os", i) for i in created_os} | {("plants", i) for i in created_plants}) - logged
+    if missing:
+        problems.append(f"{len(missing)} registros sem entrada em changes.journal")
+
+    for r in results:
+        stale_os = created_os - set(r["seen_os"])
+        stale_plants = created_plants - set(r["seen_plants"])
+        if stale_os or stale_plants:
+            problems.append(f"processo {r['worker']} não viu {len(stale_os)} OS / {len(stale_plants)} usinas dos outros")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Escritas concorrentes de vários processos no mesmo data/")
+    parser.add_argument("--procs", type=int, default=4)
+    parser.add_argument("--writes", type=int, default=100, help="OS criadas por processo (1 usina a cada 5)")
+    parser.add_argument("--compact-every", type=int, default=50, help="LOOPOS_OS_COMPACT_EVERY (força compactações no meio)")
+    parser.add_argument("--no-locks", action="store_true", help="LOOPOS_FILE_LOCKS=0 (só locks de thread)")
+    parser.add_argument("--keep", action="store_true", help="mantém o diretório de trabalho mesmo sem falhas")
+    args = parser.parse_args()
+
+    work = Path(tempfile.mkdtemp(prefix="loopos-stress-"))
+    dataset = generate(20, 5, 200, seed=1)
+    write_data_dir(dataset, work / "data")
+    env = {
+        "LOOPOS_DATA_DIR": str(work / "data"),
+        "NEXTCLOUD_ATTACHMENTS_DIR": str(work / "uploads"),
+        "LOOPOS_LOG_LEVEL": "WARNING",
+        "LOOPOS_OS_COMPACT_EVERY": str(args.compact_every),
+        "LOOPOS_FILE_LOCKS": "0" if args.no_locks else "1",
+        "SUPABASE_KEY": _FAKE_KEY,
+    }
+
+    ctx = mp.get_context("spawn")
+    with PostgrestStub(supabase_tables(dataset)) as stub:
+        env["SUPABASE_URL"] = stub.url
+        barrier, results_q = ctx.Barrier(args.procs), ctx.Queue()
+        t0 = time.perf_counter()
+        procs = [
+            ctx.Process(target=_worker, args=(w, args.writes, env, barrier, results_q, dataset["os"][0], dataset["users"][0]["id"]))
+            for w in range(args.procs)
+        ]
+        for p in procs:
+            p.start()
+        results = [results_q.get() for _ in procs]
+        for p in procs:
+            p.join()
+        elapsed = time.perf_counter() - t0
+
+    fatal = [r for r in results if "fatal" in r]
+    if fatal:
+        sys.exit(f"❌ processos falharam: {fatal} (dados mantidos em {work})")
+    errors = [e for r in results for e in r["errors"]]
+    writes = sum(len(r["os"]) + 2 * len(r["plants"]) for r in results)
+    print(f"📦 {args.procs} processos, {writes} escritas em {elapsed:.1f}s ({work / 'data'})")
+    if errors:
+        print(f"⚠️ {len(errors)} requisições com erro (ex.: {errors[:3]})")
+
+    os.environ.update(env)
+    problems = _check(work / "data", results)
+    for p in problems:
+        print(f"❌ {p}")
+    if problems or errors:
+        sys.exit(f"dados mantidos em {work}")
+    print("✅ nenhuma escrita perdida; todos os processos viram as escritas dos outros")
+    if not args.keep:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
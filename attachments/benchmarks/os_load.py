@@ -0,0 +1,88 @@
+# /attachments/benchmarks/os_load.py
+# Compara o custo por requisição de GET /api/os com validação dupla
+# (OSModel(**o) + response_model) contra o caminho confiável de os_api.
+#
+#   cd attachments && python -m benchmarks.os_load --sizes 10000 100000
+
+import argparse
+import statistics
+import time
+from typing import List
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+
+from os_api import OSModel, _trusted
+
+
+def synthetic_os(n: int) -> List[dict]:
+    """Gera n OS no formato do os.json (mais nova primeiro)"""
+    items = []
+    for i in range(n, 0, -1):
+        items.append({
+            "id": f"OS{i:06d}",
+            "title": f"OS{i:06d} - Inspeção",
+            "description": "Inspeção preventiva de inversores e string boxes",
+            "status": ("Pendente", "Em Progresso", "Concluída")[i % 3],
+            "priority": ("Baixa", "Média", "Alta")[i % 3],
+            "plantId": f"plant-{i % 50}",
+            "technicianId": f"user-{i % 200}",
+            "supervisorId": f"user-{i % 20}",
+            "startDate": "2025-11-13T00:00:00.000Z",
+            "activity": "Inspeção",
+            "assets": ["CFTV", "Inversor"],
+            "attachmentsEnabled": True,
+            "createdAt": "2025-11-13T15:10:47.200Z",
+            "updatedAt": "2025-11-14T14:40:27.322Z",
+            "logs": [{"id": f"log-{i}", "timestamp": "2025-11-14T14:40:27.322Z", "authorId": "user-1", "comment": "ok"}],
+            "imageAttachments": [],
+        })
+    return items
+
+
+def _app(items: List[dict]) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/legacy", response_model=List[OSModel])
+    def legacy():
+        # Caminho antigo: valida ao carregar e de novo no response_model
+        return [OSModel(**o) for o in items]
+
+    @app.get("/trusted", response_model=List[OSModel])
+    def trusted():
+        return JSONResponse([_trusted(o) for o in items])
+
+    return app
+
+
+def _measure(client: TestClient, path: str, repeat: int) -> List[float]:
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        r = client.get(path)
+        r.raise_for_status()
+        timings.append(time.perf_counter() - t0)
+    return timings
+
+
+def run(sizes: List[int], repeat: int):
+    for n in sizes:
+        items = synthetic_os(n)
+        client = TestClient(_app(items))
+        assert client.get("/legacy").json() == client.get("/trusted").json()
+        legacy = statistics.median(_measure(client, "/legacy", repeat))
+        trusted = statistics.median(_measure(client, "/trusted", repeat))
+        print(
+            f"{n:>7} OS | validação dupla: {legacy * 1000:8.1f} ms"
+            f" | confiável: {trusted * 1000:8.1f} ms"
+            f" | economia: {(legacy - trusted) * 1000:8.1f} ms ({legacy / trusted:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run(args.sizes, args.repeat)
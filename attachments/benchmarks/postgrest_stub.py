@@ -0,0 +1,169 @@
+# /attachments/benchmarks/postgrest_stub.py
+# Servidor HTTP mínimo compatível com o subconjunto do PostgREST usado pelo
+# supabase-py em app/core/supabase_storage.py (select/eq/in/order/offset/limit,
+# insert, update, delete). Conta as requisições recebidas para medir round-trips
+# sem depender de um projeto Supabase real.
+
+import json
+import random
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qsl, urlsplit
+import uuid
+
+_RESERVED = {"select", "order", "offset", "limit", "on_conflict", "columns"}
+
+
+def _parse_in(raw: str) -> List[str]:
+    """in.(a,"b,c",d) -> ["a", "b,c", "d"]"""
+    inner = raw[1:-1]
+    values, cur, quoted = [], "", False
+    for ch in inner:
+        if ch == '"':
+            quoted = not quoted
+        elif ch == "," and not quoted:
+            values.append(cur)
+            cur = ""
+        else:
+            cur += ch
+    if inner:
+        values.append(cur)
+    return values
+
+
+def _matches(row: dict, filters: List[tuple]) -> bool:
+    for column, op, value in filters:
+        cell = row.get(column)
+        cell_s = None if cell is None else str(cell)
+        if op == "eq" and cell_s != value:
+            return False
+        if op == "neq" and cell_s == value:
+            return False
+        if op == "in" and cell_s not in value:
+            return False
+        if op == "is" and not (value == "null" and cell is None):
+            return False
+    return True
+
+
+class PostgrestStub:
+    """
+    Tabelas em memória servidas em http://127.0.0.1:<porta>/rest/v1/<tabela>
+
+    max_rows: corta cada resposta como o max-rows do PostgREST (Supabase: 1000).
+    shuffle: embaralha a cada requisição as linhas empatadas na ordenação pedida,
+    como o Postgres pode fazer sem um ORDER BY total.
+    """
+
+    def __init__(self, tables: Optional[Dict[str, List[dict]]] = None, max_rows: Optional[int] = None,
+                 shuffle: bool = False):
+        self.tables: Dict[str, List[dict]] = {k: list(v) for k, v in (tables or {}).items()}
+        self.max_rows = max_rows
+        self.shuffle = shuffle
+        self.requests = Counter()  # (método, tabela) -> quantidade
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def total_requests(self) -> int:
+        return sum(self.requests.values())
+
+    def reset_counts(self):
+        self.requests.clear()
+
+    def start(self) -> "PostgrestStub":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # ---------- execução das consultas ----------
+
+    def _query(self, method: str, table: str, params: List[tuple], body) -> List[dict]:
+        filters, select, order, offset, limit = [], "*", None, 0, None
+        for key, value in params:
+            if key == "select":
+                select = value
+            elif key == "order":
+                order = value
+            elif key == "offset":
+                offset = int(value)
+            elif key == "limit":
+                limit = int(value)
+            elif key not in _RESERVED and "." in value:
+                op, _, arg = value.partition(".")
+                filters.append((key, op, set(_parse_in(arg)) if op == "in" else arg))
+
+        with self._lock:
+            rows = self.tables.setdefault(table, [])
+            if method == "POST":
+                new = body if isinstance(body, list) else [body]
+                for r in new:
+                    r.setdefault("id", str(uuid.uuid4()))
+                rows.extend(new)
+                return new
+            matched = [r for r in rows if _matches(r, filters)]
+            if method == "PATCH":
+                for r in matched:
+                    r.update(body)
+                return matched
+            if method == "DELETE":
+                self.tables[table] = [r for r in rows if not _matches(r, filters)]
+                return matched
+
+        if self.shuffle:
+            random.shuffle(matched)  # sort() é estável: só os empates ficam fora de ordem
+        if order:
+            for part in reversed(order.split(",")):
+                column, _, direction = part.partition(".")
+                desc = direction.startswith("desc")
+                matched.sort(key=lambda r: (r.get(column) is None, r.get(column) or ""), reverse=desc)
+        if self.max_rows is not None:
+            limit = self.max_rows if limit is None else min(limit, self.max_rows)
+        matched = matched[offset:offset + limit if limit is not None else None]
+        if select.replace(" ", "") != "*":
+            columns = [c.strip() for c in select.split(",")]
+            matched = [{c: r.get(c) for c in columns} for r in matched]
+        return matched
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _serve(self):
+                parts = urlsplit(self.path)
+                table = parts.path.rsplit("/", 1)[-1]
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length)) if length else None
+                with stub._lock:
+                    stub.requests[(self.command, table)] += 1
+                rows = stub._query(self.command, table, parse_qsl(parts.query), body)
+                payload = json.dumps(rows).encode()
+                self.send_response(200 if self.command != "POST" else 201)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = do_POST = do_PATCH = do_DELETE = _serve
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,72 @@
+# /attachments/benchmarks/supabase_roundtrips.py
+# Conta quantas requisições HTTP load_plants() e load_os() fazem contra o
+# stub PostgREST local, para vários tamanhos de base.
+#
+#   cd attachments && python -m benchmarks.supabase_roundtrips --sizes 10 100 500
+
+import argparse
+import os
+import time
+import uuid
+
+from benchmarks.postgrest_stub import PostgrestStub
+
+# Chave em formato JWT só para passar na validação do supabase-py
+_FAKE_KEY = "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.stub"
+
+
+def seed(n: int) -> dict:
+    """n usinas (2 sub-usinas, 3 ativos, 3 atribuições cada) e n OS (1 ativo, 2 logs, 1 anexo)"""
+    tables = {k: [] for k in (
+        "users", "plants", "sub_plants", "plant_assets", "plant_assignments",
+        "os", "os_assets", "os_logs", "os_image_attachments",
+    )}
+    user_id = str(uuid.uuid4())
+    tables["users"].append({"id": user_id, "name": "Admin", "username": "admin", "role": "Admin"})
+    for i in range(n):
+        pid = str(uuid.uuid4())
+        tables["plants"].append({"id": pid, "client": "C", "name": f"Usina {i}", "string_count": 0, "tracker_count": 0})
+        for k in (1, 2):
+            tables["sub_plants"].append({"id": str(uuid.uuid4()), "plant_id": pid, "sub_plant_number": k, "inverter_count": 4})
+        for a in ("CFTV", "Inversor", "Tracker"):
+            tables["plant_assets"].append({"id": str(uuid.uuid4()), "plant_id": pid, "asset_name": a})
+        for role in ("coordinator", "supervisor", "technician"):
+            tables["plant_assignments"].append({"id": str(uuid.uuid4()), "plant_id": pid, "user_id": user_id, "role_type": role})
+
+        os_id = f"OS{i:05d}"
+        tables["os"].append({"id": os_id, "title": os_id, "plant_id": pid, "created_at": f"2025-01-01T00:00:{i % 60:02d}Z"})
+        tables["os_assets"].append({"id": str(uuid.uuid4()), "os_id": os_id, "asset_name": "CFTV"})
+        for t in range(2):
+            tables["os_logs"].append({
+                "id": str(uuid.uuid4()), "os_id": os_id, "timestamp": f"2025-01-0{t + 1}T00:00:00Z",
+                "author_id": user_id, "comment": "ok", "status_from": None, "status_to": None,
+            })
+        tables["os_image_attachments"].append({
+            "id": str(uuid.uuid4()), "os_id": os_id, "url": f"/files/{os_id}/a.jpg",
+            "caption": "", "uploaded_by": user_id, "uploaded_at": "2025-01-01T00:00:00Z",
+        })
+    return tables
+
+
+def run(sizes):
+    for n in sizes:
+        with PostgrestStub(seed(n)) as stub:
+            os.environ["SUPABASE_URL"] = stub.url
+            os.environ["SUPABASE_KEY"] = _FAKE_KEY
+            from app.core import supabase_client, supabase_storage
+            supabase_client.reset_supabase()  # cliente novo apontando para este stub
+
+            for name, loader in (("load_plants", supabase_storage.load_plants), ("load_os", supabase_storage.load_os)):
+                stub.reset_counts()
+                t0 = time.perf_counter()
+                rows = loader()
+                elapsed = time.perf_counter() - t0
+                assert len(rows) == n, (name, len(rows))
+                print(f"{name:>12} | {n:>5} registros | {stub.total_requests:>4} requisições | {elapsed * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 500])
+    args = parser.parse_args()
+    run(args.sizes)
@@ -1,9 +1,12 @@
 # File: attachments/os_api.py
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel
 from typing import List, Optional
-from pathlib import Path
-import json, threading
+import base64
+from app.core.os_store import OSStore
+from app.core import changes
+from app.core.schemas import BatchItemResult
+from app.core.fastjson import FastJSONResponse
 
 class OSModel(BaseModel):
     id: str
@@ -25,44 +28,156 @@ class OSModel(BaseModel):
 
 router = APIRouter(prefix="/api/os", tags=["os"])
 
-BASE = Path(__file__).parent
-DATA_FILE = BASE / "data" / "os.json"
-DATA_FILE.parent.mkdir(parents=True, exist_ok=True)
+# os.json + os.json.journal em /attachments/data
+_store = OSStore("os.json")
 
-_lock = threading.Lock()
+# Dados do store já foram validados na escrita (payload: OSModel), então a
+# leitura não reconstrói OSModel: só completa defaults e descarta chaves extras.
+_FIELDS = tuple(OSModel.model_fields)
+_DEFAULTS = {
+    name: f.get_default(call_default_factory=True)
+    for name, f in OSModel.model_fields.items()
+    if not f.is_required()
+}
 
-def _load() -> List[OSModel]:
-    if DATA_FILE.exists():
-        with DATA_FILE.open("r", encoding="utf-8") as f:
-            raw = json.load(f)
-        return [OSModel(**o) for o in raw]
-    return []
+def _trusted(o: dict) -> dict:
+    """Forma de resposta de uma OS armazenada, sem revalidar com Pydantic"""
+    return {k: o[k] if k in o else _DEFAULTS.get(k) for k in _FIELDS}
 
-def _save(items: List[OSModel]):
-    with DATA_FILE.open("w", encoding="utf-8") as f:
-        json.dump([o.dict() for o in items], f, ensure_ascii=False, indent=2)
+def os_records(ids=None) -> List[dict]:
+    """OS no formato de resposta (todas, ou só as dos ids informados que existirem)"""
+    if ids is None:
+        return [_trusted(o) for o in _store.all()]
+    return [_trusted(o) for o in _store.get_many(ids)]
+
+# Eventos de OS gravadas por outros workers levam o registro atual
+changes.register_loader("os", lambda ids: {o["id"]: o for o in os_records(ids)})
+
+def _encode_cursor(seq: int) -> str:
+    return base64.urlsafe_b64encode(f"os:{seq}".encode()).decode().rstrip("=")
+
+def _decode_cursor(cursor: str) -> int:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        prefix, seq = raw.split(":", 1)
+        if prefix != "os":
+            raise ValueError(raw)
+        return int(seq)
+    except ValueError:
+        raise HTTPException(400, "invalid cursor")
+
+def _projector(fields: str):
+    """
+    fields=id,title,status  → mantém só esses campos (id sempre incluído)
+    fields=-logs,-imageAttachments → remove esses campos
+    """
+    names = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [n.lstrip("-") for n in names if n.lstrip("-") not in OSModel.model_fields]
+    if unknown:
+        raise HTTPException(400, f"unknown fields: {', '.join(unknown)}")
+    exclude = {n[1:] for n in names if n.startswith("-")}
+    include = {n for n in names if not n.startswith("-")}
+    if include:
+        include.add("id")
+        keep = [k for k in OSModel.model_fields if k in include and k not in exclude]
+    else:
+        keep = [k for k in OSModel.model_fields if k not in exclude]
+    return lambda o: {k: o[k] if k in o else _DEFAULTS.get(k) for k in keep}
 
 @router.get("", response_model=List[OSModel])
-def list_os():
-    return _load()
+def list_os(
+    status: Optional[str] = None,
+    priority: Optional[str] = None,
+    plantId: Optional[str] = None,
+    technicianId: Optional[str] = None,
+    startFrom: Optional[str] = Query(None, description="startDate >= (ISO 8601)"),
+    startTo: Optional[str] = Query(None, description="startDate <= (ISO 8601)"),
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="ex.: id,title,status ou -logs,-imageAttachments"),
+):
+    """
+    Lista OS (mais nova primeiro). Sem parâmetros devolve todas, como antes.
+    Com `limit`, o cursor da próxima página vem no header X-Next-Cursor.
+    """
+    project = _projector(fields) if fields else _trusted
+
+    predicate = None
+    if priority is not None or startFrom or startTo:
+        # startDate é ISO 8601 (UTC), então a comparação de strings respeita a ordem
+        def predicate(o: dict) -> bool:
+            if priority is not None and o.get("priority") != priority:
+                return False
+            start = o.get("startDate") or ""
+            if startFrom and start < startFrom:
+                return False
+            if startTo and start[:len(startTo)] > startTo:
+                return False
+            return True
+
+    items, next_seq = _store.scan(
+        before=_decode_cursor(cursor) if cursor else None,
+        limit=limit,
+        predicate=predicate,
+        status=status,
+        plantId=plantId,
+        technicianId=technicianId,
+    )
+    headers = {"X-Next-Cursor": _encode_cursor(next_seq)} if next_seq is not None else {}
+
+    # Resposta serializada direto (orjson): response_model fica só para a
+    # documentação, sem a segunda validação que o FastAPI faria em cada item.
+    return FastJSONResponse([project(o) for o in items], headers=headers)
+
+# Lotes: o corpo inteiro é validado pelo Pydantic antes de qualquer escrita;
+# os itens aceitos são gravados juntos (uma única escrita no journal).
+
+def _apply_batch(payloads: List[OSModel], create: bool) -> List[BatchItemResult]:
+    results: List[BatchItemResult] = []
+    items: List[dict] = []
+    seen = set()
+    with _store.locked():  # entre threads e workers
+        for p in payloads:
+            if p.id in seen:
+                results.append(BatchItemResult(id=p.id, status=400, detail="duplicate id in batch"))
+            elif create and p.id in _store:
+                results.append(BatchItemResult(id=p.id, status=400, detail="OS id already exists"))
+            elif not create and p.id not in _store:
+                results.append(BatchItemResult(id=p.id, status=404, detail="OS not found"))
+            else:
+                items.append(p.dict())
+                results.append(BatchItemResult(id=p.id, status=201 if create else 200))
+            seen.add(p.id)
+        _store.put_many(items)
+        changes.record("os", [o["id"] for o in items], data={o["id"]: _trusted(o) for o in items})
+    return results
+
+@router.post("/batch", response_model=List[BatchItemResult])
+def create_os_batch(payload: List[OSModel]):
+    """Cria várias OS; ids repetidos ou já existentes voltam com status 400"""
+    return _apply_batch(payload, create=True)
+
+@router.put("/batch", response_model=List[BatchItemResult])
+def update_os_batch(payload: List[OSModel]):
+    """Atualiza várias OS (pelo id de cada item); ids inexistentes voltam com status 404"""
+    return _apply_batch(payload, create=False)
 
 @router.post("", response_model=OSModel)
 def create_os(payload: OSModel):
-    with _lock:
-        data = _load()
-        if any(o.id == payload.id for o in data):
+    with _store.locked():  # entre threads e workers
+        if payload.id in _store:
             raise HTTPException(400, "OS id already exists")
-        data.insert(0, payload)
-        _save(data)
+        item = payload.dict()
+        _store.put(item)
+        changes.record("os", [payload.id], data={payload.id: item})
         return payload
 
 @router.put("/{os_id}", response_model=OSModel)
 def update_os(os_id: str, payload: OSModel):
-    with _lock:
-        data = _load()
-        for i, o in enumerate(data):
-            if o.id == os_id:
-                data[i] = payload
-                _save(data)
-                return payload
-    raise HTTPException(404, "OS not found")
\ No newline at end of file
+    with _store.locked():  # entre threads e workers
+        if os_id in _store:
+            item = {**payload.dict(), "id": os_id}  # o id da URL prevalece sobre o do corpo
+            _store.put(item)
+            changes.record("os", [os_id], data={os_id: item})
+            return item
+    raise HTTPException(404, "OS not found")
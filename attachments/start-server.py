@@ -1,8 +1,19 @@
 #!/usr/bin/env python
 """
 Script para iniciar o servidor FastAPI
-Usado pelo npm run dev:backend
+Usado pelo npm run dev:backend (desenvolvimento) e npm run prod:backend
+
+Produção: `python start-server.py --prod` ou LOOPOS_ENV=production
+  LOOPOS_HOST / LOOPOS_PORT        padrão 0.0.0.0:8000
+  LOOPOS_WORKERS                   padrão: nº de CPUs disponíveis ao processo (affinity/cpuset)
+  LOOPOS_KEEPALIVE                 segundos de keep-alive ocioso (padrão 5)
+  LOOPOS_BACKLOG                   fila de conexões pendentes (padrão 2048)
+  LOOPOS_LIMIT_CONCURRENCY         máx. de conexões por worker antes de 503 (padrão sem limite)
+  LOOPOS_GRACEFUL_TIMEOUT          segundos para encerrar requisições em andamento (padrão 30)
+  LOOPOS_UVICORN_LOG_LEVEL         log do uvicorn (padrão warning; logs do app: LOOPOS_LOG_LEVEL)
+Prontidão para o balanceador/orquestrador: GET /api/ready
 """
+import importlib.util
 import sys
 import subprocess
 import os
@@ -12,16 +23,67 @@ from pathlib import Path
 script_dir = Path(__file__).parent
 os.chdir(script_dir)
 
-# Comando uvicorn
-cmd = [
-    sys.executable, "-m", "uvicorn",
-    "app.main:app",
-    "--host", "127.0.0.1",
-    "--port", "8000",
-    "--timeout-keep-alive", "10",
-    "--log-level", "debug",
-    "--reload"
-]
+
+def _is_prod() -> bool:
+    return "--prod" in sys.argv[1:] or os.getenv("LOOPOS_ENV", "").strip().lower() in ("prod", "production")
+
+
+def _has(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def _cpus() -> int:
+    # Em contêiner (cpuset) ou com taskset, cpu_count() conta CPUs que o processo não pode usar
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0)) or 1
+    return os.cpu_count() or 1
+
+
+def _prod_cmd() -> list:
+    workers = os.getenv("LOOPOS_WORKERS") or str(_cpus())
+    cmd = [
+        sys.executable, "-m", "uvicorn",
+        "app.main:app",
+        "--host", os.getenv("LOOPOS_HOST", "0.0.0.0"),
+        "--port", os.getenv("LOOPOS_PORT", "8000"),
+        "--workers", workers,
+        # uvloop/httptools só existem fora do Windows (uvicorn[standard])
+        "--loop", "uvloop" if _has("uvloop") else "asyncio",
+        "--http", "httptools" if _has("httptools") else "h11",
+        "--timeout-keep-alive", os.getenv("LOOPOS_KEEPALIVE", "5"),
+        "--backlog", os.getenv("LOOPOS_BACKLOG", "2048"),
+        "--timeout-graceful-shutdown", os.getenv("LOOPOS_GRACEFUL_TIMEOUT", "30"),
+        "--log-level", os.getenv("LOOPOS_UVICORN_LOG_LEVEL", "warning"),
+        "--no-access-log",  # latência e contagem por rota ficam em /api/metrics
+        "--no-server-header",
+    ]
+    if os.getenv("LOOPOS_LIMIT_CONCURRENCY"):
+        cmd += ["--limit-concurrency", os.environ["LOOPOS_LIMIT_CONCURRENCY"]]
+    return cmd
+
+
+if _is_prod():
+    cmd = _prod_cmd()
+    os.environ.setdefault("LOOPOS_LOG_LEVEL", "INFO")
+    print(f"🚀 Produção: {cmd[cmd.index('--workers') + 1]} workers em "
+          f"{cmd[cmd.index('--host') + 1]}:{cmd[cmd.index('--port') + 1]} "
+          f"(loop {cmd[cmd.index('--loop') + 1]}, http {cmd[cmd.index('--http') + 1]})")
+    if os.name == "posix":
+        # Substitui este processo pelo uvicorn: o SIGTERM do systemd/docker chega
+        # direto ao master, que encerra os workers de forma graciosa
+        sys.stdout.flush()
+        os.execv(sys.executable, cmd)
+else:
+    # Comando uvicorn
+    cmd = [
+        sys.executable, "-m", "uvicorn",
+        "app.main:app",
+        "--host", "127.0.0.1",
+        "--port", "8000",
+        "--timeout-keep-alive", "10",
+        "--log-level", "debug",
+        "--reload"
+    ]
 
 try:
     subprocess.run(cmd, check=True)
@@ -31,4 +93,3 @@ except KeyboardInterrupt:
 except Exception as e:
     print(f"❌ Erro ao iniciar servidor: {e}")
     sys.exit(1)
-
@@ -0,0 +1,25 @@
+# /attachments/tests/conftest.py
+# Executar a partir de attachments/:  python -m pytest -q
+#
+# data/ e uploads descartáveis: storage.py lê LOOPOS_DATA_DIR no import, então
+# o ambiente é definido aqui, antes de qualquer `import app...` dos testes.
+
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+_WORK = Path(tempfile.mkdtemp(prefix="loopos-tests-"))
+os.environ["LOOPOS_DATA_DIR"] = str(_WORK / "data")
+os.environ["NEXTCLOUD_ATTACHMENTS_DIR"] = str(_WORK / "uploads")
+os.environ.setdefault("LOOPOS_LOG_LEVEL", "WARNING")
+os.environ["LOOPOS_SUPABASE_WARMUP"] = "0"
+for _name in ("SUPABASE_URL", "SUPABASE_KEY"):
+    os.environ.pop(_name, None)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(_WORK, ignore_errors=True)
@@ -0,0 +1,194 @@
+# /attachments/tests/test_blob_store.py
+# Deduplicação de anexos com vários workers gravando e apagando o mesmo
+# conteúdo ao mesmo tempo (uvicorn --workers N).
+
+import io
+import multiprocessing as mp
+import os
+import uuid
+from pathlib import Path
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core import blob_store
+from app.core.blob_store import (
+    AttachmentFiles, attachment_names, blob_path, blobs_dir, find_attachment, migrate_legacy, release, save_upload,
+)
+
+CONTENT = b"mesma foto " * 4096
+
+
+def _churn(root: str, worker: int, rounds: int, barrier, errors):
+    root = Path(root)
+    try:
+        barrier.wait()
+        for i in range(rounds):
+            dest = root / f"OS{worker}" / f"img-{uuid.uuid4().hex}.jpg"
+            save_upload(root, io.BytesIO(CONTENT), dest)
+            assert dest.read_bytes() == CONTENT
+            if i % 2 == 0:
+                release(root, dest)
+    except Exception as e:  # o pai reporta
+        errors.put(f"worker {worker}: {e!r}")
+
+
+def test_concurrent_upload_and_release_across_processes(tmp_path):
+    ctx = mp.get_context("spawn")
+    errors, barrier = ctx.Queue(), ctx.Barrier(4)
+    procs = [ctx.Process(target=_churn, args=(str(tmp_path), w, 200, barrier, errors)) for w in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(60)
+    reported = []
+    while not errors.empty():
+        reported.append(errors.get())
+    assert reported == []
+    assert all(p.exitcode == 0 for p in procs)
+
+    kept = [f for f in tmp_path.glob("OS*/*.jpg")]
+    assert len(kept) == 4 * 100
+    assert all(f.read_bytes() == CONTENT for f in kept)
+
+
+def _release_one(root: str, dest: str):
+    release(Path(root), Path(dest))
+
+
+def test_release_waits_for_the_lock_held_by_another_process(tmp_path):
+    from app.core.storage import locked
+
+    dest = tmp_path / "OS1" / "img-a.jpg"
+    save_upload(tmp_path, io.BytesIO(CONTENT), dest)
+
+    ctx = mp.get_context("spawn")
+    with locked("_blobs"):
+        p = ctx.Process(target=_release_one, args=(str(tmp_path), str(dest)))
+        p.start()
+        p.join(2)
+        # Outro worker no meio de um save_upload: o release espera
+        assert p.is_alive()
+        assert dest.exists()
+    p.join(30)
+    assert p.exitcode == 0
+    assert not dest.exists()
+    assert not list(blobs_dir(tmp_path).glob("??/*"))
+
+
+@pytest.fixture
+def root(tmp_path):
+    root = tmp_path / "attachments"
+    root.mkdir()
+    return root
+
+
+def _upload(root: Path, os_id: str, name: str, content: bytes = CONTENT) -> Path:
+    dest = root / os_id / name
+    save_upload(root, io.BytesIO(content), dest)
+    return dest
+
+
+def test_blobs_live_outside_the_served_root(root):
+    _upload(root, "OS1", "img-a.jpg")
+    assert root not in blobs_dir(root).parents
+    client = TestClient(_files_app(root))
+    digest = blob_path(root, blob_store._file_digest(root / "OS1" / "img-a.jpg")).name
+    assert client.get(f"/files/{blob_store.BLOBS_DIRNAME}/{digest[:2]}/{digest}").status_code == 404
+    assert client.get("/files/OS1/img-a.jpg").content == CONTENT
+
+
+def test_hardlinks_share_one_blob_and_count_references(root):
+    a = _upload(root, "OS1", "img-a.jpg")
+    b = _upload(root, "OS2", "img-b.jpg")
+    blob = blob_path(root, blob_store._file_digest(a))
+    assert a.stat().st_ino == b.stat().st_ino == blob.stat().st_ino
+    assert blob_store._refcount(blob) == 2
+
+    release(root, a)
+    assert blob.exists() and blob_store._refcount(blob) == 1
+    release(root, b)
+    assert not blob.exists()
+    assert not blob_store._counter(blob).exists()
+
+
+def test_release_does_not_rehash_the_attachment(root, monkeypatch):
+    a = _upload(root, "OS1", "img-a.jpg")
+
+    def no_hash(path):
+        raise AssertionError("release não deve reler o anexo")
+
+    monkeypatch.setattr(blob_store, "_file_digest", no_hash)
+    release(root, a)
+    assert not a.exists()
+
+
+def _files_app(root: Path) -> FastAPI:
+    app = FastAPI()
+    app.mount("/files", AttachmentFiles(directory=root), name="files")
+    return app
+
+
+def test_without_hardlinks_the_blob_is_served_instead_of_copied(root, monkeypatch):
+    def no_link(src, dst):
+        raise OSError("hardlinks não suportados")
+
+    monkeypatch.setattr(blob_store.os, "link", no_link)
+    a = _upload(root, "OS1", "img-a.jpg")
+    b = _upload(root, "OS2", "img-b.jpg")
+    assert not a.exists() and not b.exists()  # nenhuma cópia do conteúdo
+    blob = blob_path(root, blob_store.hashlib.sha256(CONTENT).hexdigest())
+    assert blob_store._refcount(blob) == 2
+
+    client = TestClient(_files_app(root))
+    assert client.get("/files/OS1/img-a.jpg").content == CONTENT
+    assert client.get("/files/OS1/../../attachments_blobs/refs/OS1/img-a.jpg").status_code == 404
+    assert attachment_names(root, "OS1", "img-a") == ["img-a.jpg"]
+    assert find_attachment(root, "OS1", "img-a") == blob
+
+    release(root, a)
+    assert client.get("/files/OS1/img-a.jpg").status_code == 404
+    assert client.get("/files/OS2/img-b.jpg").content == CONTENT
+    release(root, b)
+    assert not blob.exists()
+
+
+def test_legacy_blobs_are_moved_out_of_the_root(root):
+    # Layout anterior: <raiz>/_blobs/ab/<sha256> com o anexo como hardlink
+    digest = blob_store.hashlib.sha256(CONTENT).hexdigest()
+    legacy = root / blob_store.BLOBS_DIRNAME / digest[:2] / digest
+    legacy.parent.mkdir(parents=True)
+    legacy.write_bytes(CONTENT)
+    attachment = root / "OS1" / "img-old.jpg"
+    attachment.parent.mkdir()
+    os.link(legacy, attachment)
+
+    migrate_legacy(root)
+    assert not (root / blob_store.BLOBS_DIRNAME).exists()
+    blob = blob_path(root, digest)
+    assert blob.exists()
+
+    # O anexo antigo ganhou referência na migração e desconta o blob
+    new = _upload(root, "OS2", "img-new.jpg")
+    assert blob_store._refcount(blob) == 2
+    release(root, attachment)
+    assert blob.exists()
+    release(root, new)
+    assert not blob.exists()
+
+
+def test_releasing_a_pre_dedupe_file_keeps_the_blob(root, monkeypatch):
+    # Arquivo gravado antes da deduplicação: nunca contado em blob nenhum
+    old = root / "OS1" / "img-old.jpg"
+    old.parent.mkdir()
+    old.write_bytes(CONTENT)
+    new = _upload(root, "OS2", "img-new.jpg")
+    blob = blob_path(root, blob_store.hashlib.sha256(CONTENT).hexdigest())
+    assert blob_store._refcount(blob) == 1
+
+    monkeypatch.setattr(blob_store, "_file_digest", lambda path: pytest.fail("release não deve reler o anexo"))
+    release(root, old)
+    assert not old.exists()
+    assert blob.exists() and blob_store._refcount(blob) == 1
+    assert TestClient(_files_app(root)).get("/files/OS2/img-new.jpg").content == CONTENT
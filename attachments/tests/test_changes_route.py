@@ -0,0 +1,80 @@
+# /attachments/tests/test_changes_route.py
+# GET /api/changes: usuários alterados vêm do Supabase (não do cache do
+# diretório, que pode estar atrás da seq) e remoções passam pelo RBAC.
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core import changes, supabase_async, supabase_client
+from app.core.user_directory import directory
+from benchmarks.postgrest_stub import PostgrestStub
+from benchmarks.supabase_roundtrips import _FAKE_KEY
+
+
+def _user(user_id: str, role: str, plant_id: str) -> tuple:
+    row = {"id": user_id, "name": user_id, "username": f"user-{user_id}", "role": role, "can_login": True}
+    assignment = {"id": f"a-{user_id}", "plant_id": plant_id, "user_id": user_id, "role_type": "technician"}
+    return row, assignment
+
+
+@pytest.fixture
+def client(monkeypatch):
+    rows = [_user("adm", "Admin", "P0"), _user("s1", "Supervisor", "P1"),
+            _user("t1", "Técnico", "P1"), _user("t2", "Técnico", "P2")]
+    tables = {"users": [r for r, _ in rows], "plant_assignments": [a for _, a in rows]}
+    with PostgrestStub(tables) as stub:
+        monkeypatch.setenv("SUPABASE_URL", stub.url)
+        monkeypatch.setenv("SUPABASE_KEY", _FAKE_KEY)
+        supabase_client.reset_supabase()
+        directory.invalidate()
+        from app.main import app
+
+        with TestClient(app) as c:
+            c.stub = stub
+            yield c
+        supabase_client.reset_supabase()
+        directory.invalidate()
+
+
+def _changes(client, actor: str, since: int) -> dict:
+    r = client.get("/api/changes", params={"since": since}, headers={"x-user-id": actor})
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+def test_changed_user_comes_from_supabase_not_the_directory_cache(client):
+    assert client.get("/api/users", headers={"x-user-id": "adm"}).status_code == 200  # aquece o cache
+    since = changes.current_seq()
+    # Outro worker renomeou t1: este diretório continua com o nome antigo no TTL
+    next(u for u in client.stub.tables["users"] if u["id"] == "t1")["name"] = "Renomeado"
+    changes.record("users", ["t1"], "put")
+
+    body = _changes(client, "s1", since)
+    assert [(u["id"], u["name"]) for u in body["users"]] == [("t1", "Renomeado")]
+    assert _changes(client, "t2", since)["users"] == []  # técnico não vê outro técnico
+
+
+def test_user_tombstones_are_filtered_by_rbac(client):
+    since = changes.current_seq()
+    changes.record("users", ["t1"], "delete", {"t1": {"id": "t1", "role": "Técnico", "plantIds": ["P1"]}})
+    changes.record("users", ["t2"], "delete", {"t2": {"id": "t2", "role": "Técnico", "plantIds": ["P2"]}})
+    changes.record("users", ["old"], "delete")  # sem registro: só Admin
+
+    assert sorted(_changes(client, "adm", since)["deleted"]["users"]) == ["old", "t1", "t2"]
+    assert _changes(client, "s1", since)["deleted"] == {"users": ["t1"]}
+    # Outro worker lê os campos da tombstone do arquivo
+    assert changes.ChangeLog().deleted_records("users", ["t1", "old"]) == {
+        "t1": {"role": "Técnico", "plantIds": ["P1"]}
+    }
+
+
+def test_supabase_failure_does_not_advance_past_user_changes(client, monkeypatch):
+    since = changes.current_seq()
+    changes.record("users", ["t1"], "put")
+
+    async def down(ids):
+        raise ConnectionError("supabase fora")
+
+    monkeypatch.setattr(supabase_async, "load_users_by_ids", down)
+    r = client.get("/api/changes", params={"since": since}, headers={"x-user-id": "adm"})
+    assert r.status_code == 503
@@ -0,0 +1,52 @@
+# /attachments/tests/test_compression.py
+# Só respostas 200 completas são comprimidas; intervalos (Content-Range) e
+# demais status passam intactos, e um ETag forte vira fraco ao comprimir.
+
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import Response
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from app.core.compression import CompressionMiddleware
+
+BODY = b'{"items": "' + b"x" * 4096 + b'"}'
+
+
+def _app(status: int = 200, headers: dict = None):
+    async def endpoint(request):
+        return Response(BODY, status_code=status, media_type="application/json", headers=headers)
+
+    app = Starlette(routes=[Route("/", endpoint)])
+    app.add_middleware(CompressionMiddleware)
+    return TestClient(app)
+
+
+def _get(client):
+    return client.get("/", headers={"Accept-Encoding": "gzip"})
+
+
+def test_compresses_ok_response_and_weakens_etag():
+    r = _get(_app(headers={"ETag": '"abc"'}))
+    assert r.headers["content-encoding"] == "gzip"
+    assert r.headers["etag"] == 'W/"abc"'
+    assert r.content == BODY
+
+
+def test_weak_etag_kept():
+    r = _get(_app(headers={"ETag": 'W/"abc"'}))
+    assert r.headers["etag"] == 'W/"abc"'
+
+
+@pytest.mark.parametrize("status", [206, 404, 500])
+def test_non_200_passes_through(status):
+    r = _get(_app(status=status, headers={"ETag": '"abc"'}))
+    assert "content-encoding" not in r.headers
+    assert r.headers["etag"] == '"abc"'
+    assert r.content == BODY
+
+
+def test_content_range_passes_through():
+    r = _get(_app(headers={"Content-Range": f"bytes 0-{len(BODY) - 1}/{len(BODY)}"}))
+    assert "content-encoding" not in r.headers
+    assert r.content == BODY
@@ -0,0 +1,96 @@
+# /attachments/tests/test_events.py
+# Filtro do stream de eventos: sem o registro não há RBAC, então só Admin
+# recebe (falha fechada); tombstones só chegam a quem via o registro.
+
+import asyncio
+
+from app.core.events import EventHub
+
+ADMIN = {"id": "a1", "role": "Admin", "plantIds": []}
+TECH = {"id": "t1", "role": "Técnico", "plantIds": ["P1"]}
+SUPERVISOR = {"id": "s1", "role": "Supervisor", "plantIds": ["P1"]}
+
+
+def _event(kind: str, item_id: str, op: str = "put", data=None, seq: int = 1) -> dict:
+    return {"type": "change", "seq": seq, "kind": kind, "id": item_id, "op": op, "data": data}
+
+
+def _received(actor: dict, offers: list) -> list:
+    """(kind, id, op) entregues a um assinante de actor, na ordem dos _offer"""
+    async def run():
+        hub = EventHub(queue_size=100)
+        sub = hub.subscribe(actor)
+        for event, *before in offers:
+            hub._offer(sub, event, *before)
+        out = []
+        while not sub.queue.empty():
+            e = await sub.get()
+            out.append((e["kind"], e["id"], e["op"]))
+        return out
+
+    return asyncio.run(run())
+
+
+def test_events_without_record_only_reach_admin():
+    offers = [(_event("os", "o1"),), (_event("users", "u9"),)]
+    assert _received(ADMIN, offers) == [("os", "o1", "put"), ("users", "u9", "put")]
+    assert _received(SUPERVISOR, offers) == []
+    assert _received(TECH, offers) == []
+
+
+def test_unknown_tombstones_are_not_delivered():
+    offers = [(_event("os", "o1", "delete"),), (_event("users", "u9", "delete"),)]
+    assert _received(ADMIN, offers) == [("os", "o1", "delete"), ("users", "u9", "delete")]
+    assert _received(SUPERVISOR, offers) == []
+
+
+def test_tombstone_after_visible_put():
+    os_item = {"id": "o1", "plantId": "P1", "technicianId": "t9"}
+    offers = [
+        (_event("os", "o1", data=os_item, seq=1),),
+        (_event("os", "o1", "delete", seq=2),),
+        (_event("os", "o1", "delete", seq=3),),  # já removido: não repete
+    ]
+    assert _received(SUPERVISOR, offers) == [("os", "o1", "put"), ("os", "o1", "delete")]
+    assert _received(TECH, offers) == []
+
+
+def test_tombstone_after_record_leaves_view():
+    offers = [
+        (_event("os", "o1", data={"id": "o1", "plantId": "P1"}, seq=1),),
+        (_event("os", "o1", data={"id": "o1", "plantId": "P2"}, seq=2),),
+        (_event("os", "o1", "delete", seq=3),),
+    ]
+    assert _received(SUPERVISOR, offers) == [("os", "o1", "put")]
+
+
+def test_tombstone_filtered_by_deleted_record():
+    tech = {"id": "t2", "role": "Técnico", "plantIds": ["P1"]}
+    admin = {"id": "a2", "role": "Admin", "plantIds": []}
+    assert _received(SUPERVISOR, [(_event("users", "t2", "delete"), tech)]) == [("users", "t2", "delete")]
+    assert _received(SUPERVISOR, [(_event("users", "a2", "delete"), admin)]) == []
+
+
+def test_own_tombstone_always_delivered():
+    assert _received(TECH, [(_event("users", "t1", "delete"),)]) == [("users", "t1", "delete")]
+
+
+def test_plant_events_use_plant_id():
+    offers = [(_event("plants", "P1", "delete"),), (_event("plants", "P2", "delete"),),
+              (_event("assignments", "P2"),)]
+    assert _received(SUPERVISOR, offers) == [("plants", "P1", "delete")]
+
+
+def test_publish_strips_deleted_record():
+    from app.core import events
+
+    async def run():
+        sub = events.hub.subscribe(SUPERVISOR)
+        try:
+            events.publish("users", "t2", "delete", 7, {"id": "t2", "role": "Técnico", "plantIds": ["P1"]})
+            return await asyncio.wait_for(sub.get(), 1)
+        finally:
+            events.hub.unsubscribe(sub)
+
+    event = asyncio.run(run())
+    assert (event["id"], event["op"], event["data"]) == ("t2", "delete", None)
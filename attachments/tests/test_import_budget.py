@@ -0,0 +1,16 @@
+# /attachments/tests/test_import_budget.py
+# `import app.main` (pago por cada worker antes de aceitar conexões) dentro do
+# orçamento e sem carregar o supabase-py. Mede em processos novos, como
+# benchmarks/import_budget.py (LOOPOS_IMPORT_BUDGET_MS, padrão 900 ms).
+
+import os
+import statistics
+
+from benchmarks.import_budget import LAZY_MODULES, measure
+
+
+def test_import_app_main_within_budget():
+    budget_ms = float(os.getenv("LOOPOS_IMPORT_BUDGET_MS", 900))
+    times, lazy, _ = measure(3)
+    assert not set(lazy) & set(LAZY_MODULES), f"carregados no import (deviam ser sob demanda): {lazy}"
+    assert statistics.median(times) <= budget_ms, f"import app.main: {times} ms (orçamento {budget_ms:.0f} ms)"
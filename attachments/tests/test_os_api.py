@@ -0,0 +1,35 @@
+# /attachments/tests/test_os_api.py
+# PUT /api/os/{id}: o id da URL prevalece; a resposta, o journal e o evento
+# publicado trazem o mesmo registro.
+
+from fastapi.testclient import TestClient
+
+from app.core import changes
+from os_api import os_records
+
+
+def _os(os_id: str) -> dict:
+    return {
+        "id": os_id, "title": "Limpeza", "description": "", "status": "open", "priority": "low",
+        "plantId": "P1", "startDate": "2025-01-01", "activity": "limpeza",
+        "createdAt": "2025-01-01T00:00:00Z", "updatedAt": "2025-01-01T00:00:00Z",
+    }
+
+
+def test_update_returns_the_stored_record(monkeypatch):
+    from app.main import app
+
+    published = []
+    record = changes.record
+    monkeypatch.setattr(changes, "record", lambda kind, ids, op="put", data=None: (
+        published.append(data), record(kind, ids, op, data))[1])
+
+    with TestClient(app) as client:
+        assert client.post("/api/os", json=_os("OS-PUT-1")).status_code == 200
+        r = client.put("/api/os/OS-PUT-1", json={**_os("OUTRO-ID"), "title": "Troca"})
+
+    assert r.status_code == 200
+    assert r.json()["id"] == "OS-PUT-1" and r.json()["title"] == "Troca"
+    assert r.json() == published[-1]["OS-PUT-1"]
+    assert os_records(["OS-PUT-1"])[0]["title"] == "Troca"
+    assert os_records(["OUTRO-ID"]) == []
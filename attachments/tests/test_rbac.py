@@ -0,0 +1,114 @@
+# /attachments/tests/test_rbac.py
+# RBACIndex (avaliação em lote) deve decidir exatamente como as funções
+# escalares can_view_user/can_edit_user, para qualquer ator e alvo.
+
+import random
+
+import pytest
+
+from app.core import rbac
+from app.core.rbac import RBACIndex, can_edit_user, can_view_user, rbac_index_for
+
+ROLES = ("Admin", "Operador", "Coordenador", "Supervisor", "Técnico", "Auxiliar", "Desconhecido")
+PLANTS = [f"P{i}" for i in range(6)]
+
+
+def _edge_users() -> list:
+    """Um usuário por papel para cada forma de plantIds (lista vazia, ausente, None, 1 ou várias usinas)"""
+    users = []
+    shapes = ({"plantIds": []}, {}, {"plantIds": None}, {"plantIds": ["P0"]}, {"plantIds": ["P0", "P1"]},
+              {"plantIds": ["P5"]}, {"plantIds": ["P1", "P1"]})
+    for role in ROLES:
+        for i, shape in enumerate(shapes):
+            users.append({"id": f"{role}-{i}", "role": role, **shape})
+    # Cadeia de supervisorId (não interfere nas regras, mas precisa ser ignorada)
+    chain = [u for u in users if u["role"] in ("Supervisor", "Técnico", "Auxiliar")]
+    for boss, sub in zip(chain, chain[1:]):
+        sub["supervisorId"] = boss["id"]
+    return users
+
+
+def _random_users(rng: random.Random, n: int) -> list:
+    users = []
+    for i in range(n):
+        u = {"id": f"u{i}", "role": rng.choice(ROLES)}
+        kind = rng.random()
+        if kind < 0.1:
+            pass  # sem plantIds
+        elif kind < 0.2:
+            u["plantIds"] = []
+        else:
+            u["plantIds"] = rng.sample(PLANTS, rng.randint(1, 3))
+        if i and rng.random() < 0.5:
+            u["supervisorId"] = f"u{rng.randrange(i)}"
+        users.append(u)
+    return users
+
+
+def _outsiders() -> list:
+    """Atores que não estão na lista (anônimo do actor_for e usuários desatualizados)"""
+    return [{"id": "anon", "role": role, "plantIds": plants}
+            for role in ROLES for plants in ([], ["P0"], ["P2", "P3"])]
+
+
+def _assert_matches(users: list, actors: list):
+    index = RBACIndex(users)
+    for actor in actors:
+        assert index.visible_users(actor) == [u for u in users if can_view_user(actor, u)], actor
+        assert index.editable_users(actor) == [u for u in users if can_edit_user(actor, u)], actor
+
+
+def test_edge_cases_match_scalar_rules():
+    users = _edge_users()
+    _assert_matches(users, users + _outsiders())
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_random_users_match_scalar_rules(seed):
+    rng = random.Random(seed)
+    users = _random_users(rng, rng.randint(1, 60))
+    _assert_matches(users, users + _outsiders())
+
+
+def test_actor_sees_and_edits_itself():
+    users = _edge_users()
+    index = RBACIndex(users)
+    for actor in users:
+        assert actor in index.visible_users(actor)
+        assert actor in index.editable_users(actor)
+
+
+def test_actor_with_stale_plants_uses_its_own_plant_ids():
+    # O ator vem do diretório, mas pode ter usinas diferentes da versão na lista
+    users = [{"id": "s", "role": "Supervisor", "plantIds": ["P0"]},
+             {"id": "t", "role": "Técnico", "plantIds": ["P1"]}]
+    actor = {"id": "s", "role": "Supervisor", "plantIds": ["P1"]}
+    _assert_matches(users, [actor])
+
+
+def test_empty_list():
+    _assert_matches([], _outsiders())
+
+
+def test_index_for_reuses_index_for_the_same_list(monkeypatch):
+    monkeypatch.setattr(rbac, "_index_cache", (None, None))
+    users = _edge_users()
+    first = rbac_index_for(users)
+    assert rbac_index_for(users) is first
+
+
+def test_index_for_rebuilds_when_list_changes(monkeypatch):
+    monkeypatch.setattr(rbac, "_index_cache", (None, None))
+    users = [{"id": "c", "role": "Coordenador", "plantIds": ["P0"]},
+             {"id": "t", "role": "Técnico", "plantIds": ["P1"]}]
+    coordinator = users[0]
+    assert [u["id"] for u in rbac_index_for(users).visible_users(coordinator)] == ["c"]
+
+    # O diretório cria uma lista nova a cada recarga: mesma igualdade, outro objeto
+    reloaded = [dict(users[0]), {"id": "t", "role": "Técnico", "plantIds": ["P0"]}]
+    index = rbac_index_for(reloaded)
+    assert index.users is reloaded
+    assert [u["id"] for u in index.visible_users(coordinator)] == ["c", "t"]
+
+    copy = list(reloaded)
+    assert rbac_index_for(copy) is not index
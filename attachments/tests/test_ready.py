@@ -0,0 +1,23 @@
+# /attachments/tests/test_ready.py
+# /api/ready deve cair para 503 já no SIGTERM (antes de as conexões
+# terminarem), sem impedir o handler do servidor de encerrar o worker.
+
+import signal
+
+from app import main
+
+
+def test_sigterm_marks_not_ready_and_chains_server_handler():
+    received = []
+    original = signal.signal(signal.SIGTERM, lambda sig, frame: received.append(sig))
+    try:
+        previous = main._not_ready_on_exit()
+        main._state["ready"] = True
+        signal.raise_signal(signal.SIGTERM)
+        assert main._state["ready"] is False
+        assert received == [signal.SIGTERM]
+        for sig, handler in previous.items():
+            signal.signal(sig, handler)
+    finally:
+        main._state["ready"] = False
+        signal.signal(signal.SIGTERM, original)
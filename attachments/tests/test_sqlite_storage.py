@@ -0,0 +1,126 @@
+# /attachments/tests/test_sqlite_storage.py
+# Backend SQLite: mesmo documento que o JSON, cache invalidado por versão
+# (inclusive por outra conexão/processo) e gravação incremental pelo id.
+
+import json
+import sqlite3
+import threading
+
+import pytest
+
+from app.core import sqlite_storage
+from app.core.sqlite_storage import _positions, load_doc, load_doc_frozen, save_doc
+
+
+@pytest.fixture(autouse=True)
+def db(tmp_path, monkeypatch):
+    monkeypatch.setenv("LOOPOS_SQLITE_PATH", str(tmp_path / "loopos.db"))
+    return tmp_path / "loopos.db"
+
+
+def _users(n):
+    return [{"id": f"u{i}", "username": f"user{i}", "role": "Técnico", "plantIds": [f"P{i % 3}"]} for i in range(n)]
+
+
+def _other_connection_update(db, user_id, name):
+    """Grava como outro worker faria (outra conexão, sem passar por este processo)"""
+    conn = sqlite3.connect(db, isolation_level=None)
+    conn.execute("BEGIN IMMEDIATE")
+    row = conn.execute("SELECT doc FROM users WHERE id = ?", (user_id,)).fetchone()
+    doc = {**json.loads(row[0]), "name": name}
+    conn.execute("UPDATE users SET doc = ? WHERE id = ?", (json.dumps(doc), user_id))
+    conn.execute("UPDATE doc_versions SET version = version + 1 WHERE name = 'users.json'")
+    conn.execute("COMMIT")
+    conn.close()
+
+
+def test_roundtrip_keeps_document_order_and_shape():
+    users = _users(5)
+    save_doc("users.json", users)
+    assert load_doc("users.json", []) == users
+    assignments = {"P2": {"coordinatorId": "u1", "supervisorIds": []}, "P0": {"coordinatorId": "", "supervisorIds": ["u2"]}}
+    save_doc("assignments.json", assignments)
+    assert list(load_doc("assignments.json", {}).items()) == list(assignments.items())
+    assert load_doc("plants.json", []) == []
+
+
+def test_load_is_cached_until_the_version_changes(db, monkeypatch):
+    save_doc("users.json", _users(3))
+    load_doc("users.json", [])
+    reads = []
+    original = sqlite_storage._read_doc
+    monkeypatch.setattr(sqlite_storage, "_read_doc", lambda conn, name: reads.append(name) or original(conn, name))
+
+    first = load_doc("users.json", [])
+    first[0]["role"] = "Admin"  # cópia privada
+    assert load_doc("users.json", [])[0]["role"] == "Técnico"
+    assert load_doc_frozen("users.json", []) is load_doc_frozen("users.json", [])
+    assert reads == []
+
+    _other_connection_update(db, "u1", "Renomeado")
+    assert load_doc("users.json", [])[1]["name"] == "Renomeado"
+    assert reads == ["users.json"]
+
+
+def test_cache_is_shared_across_threads():
+    save_doc("users.json", _users(2))
+    results = []
+    t = threading.Thread(target=lambda: results.append(load_doc("users.json", [])))
+    t.start()
+    t.join()
+    assert results == [_users(2)]
+
+
+def test_save_writes_only_changed_rows_and_deleting_does_not_renumber(db):
+    users = _users(6)
+    save_doc("users.json", users)
+    conn = sqlite3.connect(db)
+    before = dict(conn.execute("SELECT id, position FROM users"))
+
+    statements = []
+    sqlite_storage._connect().set_trace_callback(statements.append)
+    del users[1]
+    users[3] = {**users[3], "role": "Supervisor"}
+    save_doc("users.json", users)
+    sqlite_storage._connect().set_trace_callback(None)
+
+    # Diff contra a última gravação deste processo: nada de reler a tabela
+    assert not any(s.startswith("SELECT id, position, doc") for s in statements)
+    assert len({s for s in statements if s.startswith("INSERT OR REPLACE INTO users")}) == 1
+    assert len({s for s in statements if s.startswith("DELETE FROM users")}) == 1
+
+    after = dict(conn.execute("SELECT id, position FROM users"))
+    assert "u1" not in after
+    assert all(after[k] == before[k] for k in after)
+    assert load_doc("users.json", []) == users
+    conn.close()
+
+
+def test_save_after_another_writer_diffs_against_the_database(db):
+    users = _users(3)
+    save_doc("users.json", users)
+    _other_connection_update(db, "u2", "Outro worker")
+    users = load_doc("users.json", [])
+    users.append({"id": "u9", "username": "user9", "role": "Auxiliar", "plantIds": []})
+    save_doc("users.json", users)
+    assert load_doc("users.json", []) == users
+    assert users[2]["name"] == "Outro worker"
+
+
+def test_new_and_moved_rows_go_between_neighbours():
+    assert _positions(["a", "b", "c"], {}) == [0, 1, 2]
+    assert _positions(["a", "x", "b", "c"], {"a": 0, "b": 1, "c": 2}) == [0, 0.5, 1, 2]
+    assert _positions(["x", "a", "c"], {"a": 0, "b": 1, "c": 2}) == [-1, 0, 2]
+    assert _positions(["c", "a", "b"], {"a": 0, "b": 1, "c": 2}) == [2, 3, 4]
+    # Sem espaço entre vizinhos: renumera
+    assert _positions(["a", "x", "b"], {"a": 0, "b": 1e-9}) == [0, 1, 2]
+
+
+def test_storage_load_json_uses_the_sqlite_cache(monkeypatch):
+    from app.core import storage
+
+    monkeypatch.setattr(storage, "_BACKEND", "sqlite")
+    storage.save_json("plants.json", [{"id": "P1", "client": "C", "name": "Usina"}])
+    frozen = storage.load_json_frozen("plants.json", [])
+    assert frozen is storage.load_json_frozen("plants.json", [])
+    assert storage.load_json("plants.json", []) == [{"id": "P1", "client": "C", "name": "Usina"}]
@@ -0,0 +1,104 @@
+# /attachments/tests/test_supabase_pagination.py
+# Leituras do Supabase contra o stub PostgREST com max-rows de 1000 e ordem
+# instável entre requisições: nenhuma linha pode faltar nem repetir. E o
+# número de requisições não depende do tamanho da base além de uma página a
+# cada 1000 linhas de cada tabela.
+
+import asyncio
+import uuid
+
+import pytest
+
+from app.core import supabase_async, supabase_client, supabase_storage
+from benchmarks.postgrest_stub import PostgrestStub
+from benchmarks.supabase_roundtrips import _FAKE_KEY, seed
+
+N_USERS = 1200
+N_PLANTS = 1100
+
+
+def _tables() -> dict:
+    users = [{"id": str(uuid.uuid4()), "name": f"U{i}", "username": f"user{i}", "role": "Técnico",
+              "can_login": True} for i in range(N_USERS)]
+    plants = [{"id": str(uuid.uuid4()), "client": "C", "name": f"P{i}"} for i in range(N_PLANTS)]
+    # 2 atribuições por usuário: 2400 linhas, bem acima do max-rows
+    assignments = [{"id": str(uuid.uuid4()), "plant_id": plants[(i + k) % N_PLANTS]["id"], "user_id": u["id"],
+                    "role_type": "technician"} for i, u in enumerate(users) for k in (0, 1)]
+    assets = [{"id": str(uuid.uuid4()), "plant_id": p["id"], "asset_name": f"A{i}"} for i, p in enumerate(plants)]
+    return {"users": users, "plants": plants, "plant_assignments": assignments, "plant_assets": assets,
+            "sub_plants": []}
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    with PostgrestStub(_tables(), max_rows=1000, shuffle=True) as stub:
+        monkeypatch.setenv("SUPABASE_URL", stub.url)
+        monkeypatch.setenv("SUPABASE_KEY", _FAKE_KEY)
+        supabase_client.reset_supabase()
+        yield stub
+        supabase_client.reset_supabase()
+
+
+def _expected_plant_ids(stub) -> dict:
+    expected = {}
+    for a in stub.tables["plant_assignments"]:
+        expected.setdefault(a["user_id"], set()).add(a["plant_id"])
+    return expected
+
+
+def test_load_users_reads_every_page(stub):
+    users = supabase_storage.load_users()
+    assert len(users) == N_USERS
+    assert len({u["id"] for u in users}) == N_USERS
+    expected = _expected_plant_ids(stub)
+    assert all(sorted(u["plantIds"]) == sorted(expected[u["id"]]) for u in users)
+
+
+def test_async_load_users_reads_every_page(stub):
+    async def run():
+        try:
+            return await supabase_async.load_users()
+        finally:
+            await supabase_async.close_async_supabase()
+
+    users = asyncio.run(run())
+    assert len({u["id"] for u in users}) == N_USERS
+    expected = _expected_plant_ids(stub)
+    assert all(sorted(u["plantIds"]) == sorted(expected[u["id"]]) for u in users)
+
+
+def test_load_plants_has_no_missing_or_repeated_children(stub):
+    plants = supabase_storage.load_plants()
+    assert len({p["id"] for p in plants}) == N_PLANTS
+    assets = [a for p in plants for a in p.get("assets", [])]
+    assert len(assets) == N_PLANTS
+
+
+def _requests_per_table(n: int, monkeypatch) -> dict:
+    """{carga: {tabela: requisições}} de load_plants/load_os para uma base de n usinas e n OS"""
+    counts = {}
+    with PostgrestStub(seed(n), max_rows=1000) as stub:
+        monkeypatch.setenv("SUPABASE_URL", stub.url)
+        monkeypatch.setenv("SUPABASE_KEY", _FAKE_KEY)
+        supabase_client.reset_supabase()
+        for name, loader in (("plants", supabase_storage.load_plants), ("os", supabase_storage.load_os)):
+            stub.reset_counts()
+            assert len(loader()) == n
+            counts[name] = {table: c for (_, table), c in stub.requests.items()}
+        sizes = {table: len(rows) for table, rows in stub.tables.items()}
+    supabase_client.reset_supabase()
+    return counts, sizes
+
+
+def test_round_trips_do_not_grow_with_the_dataset(monkeypatch):
+    small, _ = _requests_per_table(10, monkeypatch)
+    medium, _ = _requests_per_table(300, monkeypatch)  # acima de um lote in_, abaixo de uma página
+    assert small == medium == {
+        "plants": {"plants": 1, "sub_plants": 1, "plant_assets": 1, "plant_assignments": 1},
+        "os": {"os": 1, "os_assets": 1, "os_logs": 1, "os_image_attachments": 1},
+    }
+
+    large, sizes = _requests_per_table(2500, monkeypatch)
+    for tables in large.values():
+        for table, requests in tables.items():
+            assert requests == sizes[table] // 1000 + 1, (table, requests, sizes[table])
@@ -0,0 +1,166 @@
+# /attachments/tests/test_sync.py
+# sync_user_assignments (incremental) deve tocar só as usinas afetadas e chegar
+# ao mesmo assignments.json que a reconstrução completa (_derive_assignments).
+# Os usuários vêm do Supabase (lista passada às funções); users.json local fica
+# de propósito desatualizado para garantir que não é lido.
+
+import copy
+
+import pytest
+
+from app.core.storage import load_json, save_json
+from app.core.sync import _derive_assignments, check_assignments_consistency, sync_user_assignments
+
+PLANTS = [{"id": f"P{i}", "name": f"Usina {i}"} for i in range(5)]
+
+
+def _users() -> list:
+    return [
+        {"id": "c1", "role": "coordinator", "plantIds": ["P0", "P1"]},
+        {"id": "c2", "role": "COORDINATOR", "plantIds": ["P1"]},
+        {"id": "s1", "role": "Supervisor", "plantIds": ["P0", "P2"]},
+        {"id": "t1", "role": "Técnico", "plantIds": ["P0", "P1"]},
+        {"id": "t2", "role": "Técnico", "plantIds": ["P1", "P3"]},
+        {"id": "a1", "role": "Auxiliar", "plantIds": ["P2"]},
+        {"id": "o1", "role": "Operador", "plantIds": ["P4"]},
+    ]
+
+
+def _normalized(assignments: dict) -> dict:
+    # A ordem das listas não é significativa (como em check_assignments_consistency)
+    return {
+        pid: {k: (sorted(v) if isinstance(v, list) else (v or "")) for k, v in entry.items()}
+        for pid, entry in assignments.items()
+    }
+
+
+@pytest.fixture
+def data():
+    users = _users()
+    save_json("plants.json", PLANTS)
+    save_json("users.json", [{"id": "c1", "role": "Técnico", "plantIds": ["P3"]}])  # cópia local velha
+    save_json("assignments.json", _derive_assignments(users, PLANTS))
+    return users
+
+
+def _apply(users: list, user_id: str, after):
+    """Novo estado do usuário na lista (o "Supabase") e sync incremental"""
+    before = next((u for u in users if u["id"] == user_id), None)
+    new_users = [u for u in users if u["id"] != user_id] + ([after] if after else [])
+    if before is not None and after is not None:
+        new_users = [after if u["id"] == user_id else u for u in users]
+    old = copy.deepcopy(load_json("assignments.json", {}))
+    changed = sync_user_assignments(user_id, copy.deepcopy(before), copy.deepcopy(after), new_users)
+    return new_users, old, changed
+
+
+def _assert_only(old: dict, changed: list, expected_changed: set, users: list):
+    new = load_json("assignments.json", {})
+    assert set(changed) == expected_changed
+    for pid in set(new) - expected_changed:
+        assert new[pid] == old[pid], pid
+    assert _normalized(new) == _normalized(_derive_assignments(users, PLANTS))
+    assert check_assignments_consistency(users) == {}
+
+
+def test_role_change_touches_only_the_user_plants(data):
+    users, old, changed = _apply(data, "t1", {"id": "t1", "role": "Supervisor", "plantIds": ["P0", "P1"]})
+    _assert_only(old, changed, {"P0", "P1"}, users)
+    assert "t1" in load_json("assignments.json", {})["P1"]["supervisorIds"]
+
+
+def test_plant_ids_change_touches_only_added_and_removed(data):
+    users, old, changed = _apply(data, "t2", {"id": "t2", "role": "Técnico", "plantIds": ["P3", "P4"]})
+    _assert_only(old, changed, {"P1", "P4"}, users)
+
+
+def test_role_and_plants_change_together(data):
+    users, old, changed = _apply(data, "a1", {"id": "a1", "role": "Técnico", "plantIds": ["P2", "P3"]})
+    _assert_only(old, changed, {"P2", "P3"}, users)
+
+
+def test_unrelated_change_writes_nothing(data):
+    users, old, changed = _apply(data, "s1", {**data[2], "name": "Novo nome"})
+    _assert_only(old, changed, set(), users)
+
+
+def test_role_without_field_is_removed_from_plants(data):
+    users, old, changed = _apply(data, "s1", {"id": "s1", "role": "Operador", "plantIds": ["P0", "P2"]})
+    _assert_only(old, changed, {"P0", "P2"}, users)
+
+
+def test_coordinator_leaving_falls_back_to_other_coordinator(data):
+    # P1 tinha c1 e c2 (a reconstrução completa fica com o último: c2); sai c2.
+    # O mapeamento de papéis só reconhece COORDINATOR/ADMIN para coordinatorId
+    users, old, changed = _apply(data, "c2", {"id": "c2", "role": "COORDINATOR", "plantIds": []})
+    _assert_only(old, changed, {"P1"}, users)
+    assert load_json("assignments.json", {})["P1"]["coordinatorId"] == "c1"
+
+
+def test_create_and_delete(data):
+    users, old, changed = _apply(data, "t9", {"id": "t9", "role": "Técnico", "plantIds": ["P2", "P4"]})
+    _assert_only(old, changed, {"P2", "P4"}, users)
+
+    users, old, changed = _apply(users, "t1", None)
+    _assert_only(old, changed, {"P0", "P1"}, users)
+
+
+def test_unknown_plant_is_ignored(data):
+    users, old, changed = _apply(data, "t1", {"id": "t1", "role": "Técnico", "plantIds": ["P0", "P1", "NOPE"]})
+    _assert_only(old, changed, set(), users)
+
+
+def test_user_routes_run_the_incremental_sync(data, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from app.core.user_directory import directory
+    from app.main import app
+
+    users = {u["id"]: dict(u, name=u["id"], username=f"user-{u['id']}") for u in data}
+    users["adm"] = {"id": "adm", "role": "Admin", "plantIds": [], "name": "adm", "username": "admin"}
+
+    async def get(user_id):
+        return users.get(user_id)
+
+    async def all_users():
+        return list(users.values())
+
+    async def save_user(user):
+        users[user["id"]] = dict(user)
+        return users[user["id"]]
+
+    async def delete_user(user_id):
+        users.pop(user_id)
+        return True
+
+    local_users = load_json("users.json", [])
+    monkeypatch.setattr(directory, "get", get)
+    monkeypatch.setattr(directory, "all", all_users)
+    monkeypatch.setattr(directory, "save_user", save_user)
+    monkeypatch.setattr(directory, "delete_user", delete_user)
+
+    with TestClient(app, headers={"x-user-id": "adm"}) as client:
+        assert client.put("/api/users/t2", json={"plantIds": ["P3", "P4"]}).status_code == 200
+        assignments = load_json("assignments.json", {})
+        assert "t2" not in assignments["P1"]["technicianIds"]
+        assert "t2" in assignments["P4"]["technicianIds"]
+
+        assert client.delete("/api/users/s1").status_code == 200
+        assignments = load_json("assignments.json", {})
+        assert "s1" not in assignments["P0"]["supervisorIds"] + assignments["P2"]["supervisorIds"]
+
+    remaining = [u for u in users.values() if u["id"] != "adm"]
+    assert _normalized(load_json("assignments.json", {})) == _normalized(_derive_assignments(remaining, PLANTS))
+    # As rotas não gravam users.json, e a verificação com a lista do Supabase
+    # não tem o que reparar (antes, --repair desfazia o que as rotas gravaram)
+    assert load_json("users.json", []) == local_users
+    assert check_assignments_consistency(list(users.values()), repair=True) == {}
+    assert _normalized(load_json("assignments.json", {})) == _normalized(_derive_assignments(remaining, PLANTS))
+
+
+def test_repair_uses_the_given_users(data):
+    save_json("assignments.json", {})
+    report = check_assignments_consistency(data, repair=True)
+    assert set(report) == {p["id"] for p in PLANTS}
+    assert check_assignments_consistency(data) == {}
+    assert load_json("assignments.json", {})["P0"]["coordinatorId"] == "c1"
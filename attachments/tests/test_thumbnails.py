@@ -0,0 +1,66 @@
+# /attachments/tests/test_thumbnails.py
+# Derivados de imagem: falhas (não-imagem, bomba de descompressão) servem o
+# original e ficam marcadas para não serem tentadas a cada requisição.
+
+import pytest
+
+PIL = pytest.importorskip("PIL")
+from PIL import Image
+
+from app.core import thumbnails
+from app.core.thumbnails import derived_path, ensure_derivative, remove_derivatives
+
+
+@pytest.fixture
+def os_dir(tmp_path):
+    return tmp_path / "OS1"
+
+
+def _count_opens(monkeypatch):
+    calls = []
+    original = Image.open
+
+    def counting_open(*args, **kwargs):
+        calls.append(args[0])
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(thumbnails.Image, "open", counting_open)
+    return calls
+
+
+def test_image_gets_a_derivative(os_dir):
+    os_dir.mkdir()
+    original = os_dir / "img-a.png"
+    Image.new("RGB", (2000, 1000), "red").save(original)
+    target = derived_path(os_dir, "img-a", "thumb")
+    assert ensure_derivative(original, target, "thumb") == target
+    with Image.open(target) as im:
+        assert max(im.size) == thumbnails.VARIANTS["thumb"]
+
+
+def test_non_image_fails_once(os_dir, monkeypatch):
+    os_dir.mkdir()
+    original = os_dir / "img-b.txt"
+    original.write_text("não é imagem")
+    target = derived_path(os_dir, "img-b", "thumb")
+    opens = _count_opens(monkeypatch)
+
+    assert ensure_derivative(original, target, "thumb") is None
+    assert ensure_derivative(original, target, "thumb") is None
+    assert len(opens) == 1
+
+    remove_derivatives(os_dir, "img-b")
+    assert not list((os_dir / thumbnails.DERIVED_DIRNAME).glob("img-b-*"))
+
+
+def test_decompression_bomb_is_not_a_500(os_dir, monkeypatch):
+    os_dir.mkdir()
+    original = os_dir / "img-c.png"
+    Image.new("L", (400, 400)).save(original)
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 100)  # > 2x o limite: DecompressionBombError
+    target = derived_path(os_dir, "img-c", "medium")
+    opens = _count_opens(monkeypatch)
+
+    assert ensure_derivative(original, target, "medium") is None
+    assert ensure_derivative(original, target, "medium") is None
+    assert len(opens) == 1
@@ -0,0 +1,61 @@
+# /attachments/tests/test_user_directory.py
+# Cache do diretório de usuários: uma escrita durante uma carga em andamento ou
+# feita por outro worker não pode deixar a lista antiga valer pelo TTL.
+
+import asyncio
+
+from app.core import changes, supabase_async
+from app.core.user_directory import UserDirectory
+
+
+def test_invalidate_during_load_keeps_the_cache_stale(monkeypatch):
+    loads = []
+
+    async def run():
+        directory = UserDirectory(ttl=60)
+        started, release = asyncio.Event(), asyncio.Event()
+
+        async def load_users():
+            loads.append(len(loads))
+            if len(loads) == 1:
+                started.set()
+                await release.wait()
+                return [{"id": "u1", "username": "antigo"}]
+            return [{"id": "u1", "username": "antigo"}, {"id": "u2", "username": "novo"}]
+
+        monkeypatch.setattr(supabase_async, "load_users", load_users)
+        first = asyncio.create_task(directory.all())
+        await started.wait()
+        directory.invalidate()  # escrita concluída enquanto a carga lia o estado anterior
+        release.set()
+        assert [u["id"] for u in await first] == ["u1"]
+        assert await directory.username_exists("NOVO")
+        assert await directory.get("u2") is not None
+        await directory.all()  # agora sim fica em cache
+
+    asyncio.run(run())
+    assert len(loads) == 2
+
+
+def test_external_user_write_invalidates_the_directory(monkeypatch):
+    import app.routes.users  # noqa: F401 - registra o callback de usuários
+    from app.core.user_directory import directory
+
+    calls = []
+
+    async def load_users():
+        calls.append(1)
+        return [{"id": "u1", "username": "um"}]
+
+    monkeypatch.setattr(supabase_async, "load_users", load_users)
+    changes.current_seq()
+    asyncio.run(directory.all())
+    asyncio.run(directory.all())
+    assert len(calls) == 1
+
+    # Outro worker: outra instância do log no mesmo arquivo
+    changes.ChangeLog().record("users", ["u2"], "put")
+    changes._log.refresh()
+    asyncio.run(directory.all())
+    assert len(calls) == 2
+    directory.invalidate()